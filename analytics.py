@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+analytics.py
+
+Typing statistics over recorded keystroke sessions (see keystroke_log.py).
+Sessions are concatenated into flat NumPy arrays and every statistic is a
+handful of vectorized passes (bincount, unique, cumsum) over the whole
+batch, so thousands of sessions are summarized in a fraction of a second.
+
+Reported per expected character and per bigram (two consecutive prompt
+characters typed in a row): mean latency, error rate and sample count.
+Per session: WPM, start time and consistency, the variance of the
+inter-key intervals.
+
+Requires NumPy.
+"""
+
+import sys
+import struct
+
+import numpy as np
+
+from keystroke_log import load_session, BACKSPACE
+
+# Pauses longer than this are breaks, not typing, and skew latencies
+MAX_INTERVAL_MS = 2000.0
+
+# In weak_bigrams(), an error rate of 10% weighs as much as being 50% slower
+# than the typical bigram
+ERROR_WEIGHT = 5.0
+
+BACKSPACE_CODE = ord(BACKSPACE)
+
+class SessionBatch:
+    """Keystrokes of many sessions as flat arrays, tagged with their session index."""
+
+    def __init__(self, sessions):
+        sessions = list(sessions)
+        counts = np.array([len(s) for s in sessions], dtype=np.int64)
+        self.size = len(sessions)
+        self.session = np.repeat(np.arange(self.size), counts)
+        self.intervals = _concat([s.intervals for s in sessions], np.uint32).astype(np.float64) / 1000.0
+        self.positions = _concat([s.positions for s in sessions], np.uint32).astype(np.int64)
+        self.chars = _concat([s.chars for s in sessions], np.uint32)
+        self.correct = _concat([s.correct for s in sessions], np.uint8).astype(bool)
+        self.started = np.array([s.started for s in sessions], dtype=np.float64)
+        self.wpm = np.array([s.wpm for s in sessions], dtype=np.float64)
+
+        # What each keystroke should have typed: look its position up in
+        # all the prompts laid end to end
+        lengths = np.array([len(s.prompt) for s in sessions], dtype=np.int64)
+        base = np.cumsum(lengths) - lengths
+        codes = np.frombuffer("".join(s.prompt for s in sessions).encode("utf-32-le"), dtype="<u4")
+        in_prompt = self.positions < np.repeat(lengths, counts)
+        index = np.repeat(base, counts) + self.positions
+        self.expected = np.zeros(len(self.chars), dtype=np.uint32)
+        self.expected[in_prompt] = codes[index[in_prompt]]
+
+    def __len__(self):
+        return len(self.chars)
+
+def _concat(arrays, dtype):
+    # bytes.join takes any buffer, so this is one C-level copy for the lot
+    return np.frombuffer(b"".join(arrays), dtype=dtype)
+
+def load_batch(paths) -> SessionBatch:
+    """The sessions at `paths`; any that cannot be read are skipped, with a warning."""
+    sessions = []
+    for path in paths:
+        try:
+            session = load_session(path)
+            session.prompt      # a handle into a book that is gone cannot be resolved
+            sessions.append(session)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"skipping session {path}: {e}", file=sys.stderr)
+    return SessionBatch(sessions)
+
+class GroupStats:
+    """Mean latency (ms), error rate and count for each key of a grouping."""
+
+    def __init__(self, keys, latency, error_rate, count):
+        self.keys = keys
+        self.latency = latency
+        self.error_rate = error_rate
+        self.count = count
+
+    def top(self, by: str, n: int = 5, min_count: int = 3):
+        """The n keys with the highest `by` ('latency' or 'error_rate')."""
+        values = getattr(self, by)
+        eligible = np.flatnonzero(self.count >= min_count)
+        order = eligible[np.argsort(-values[eligible], kind="stable")][:n]
+        return [(self.keys[i], float(values[i]), int(self.count[i])) for i in order]
+
+def _group(ids, size, latency, timed, errors):
+    """
+    Aggregate per id in [0, size) with weighted bincounts over the whole
+    batch (ids >= size are ignored). `latency` is 0 where `timed` is 0.
+    Returns the ids that occur with their mean latency, error rate and count.
+    """
+    count = np.bincount(ids, minlength=size + 1)[:size]
+    lat_sum = np.bincount(ids, weights=latency, minlength=size + 1)[:size]
+    lat_n = np.bincount(ids, weights=timed, minlength=size + 1)[:size]
+    err = np.bincount(ids, weights=errors, minlength=size + 1)[:size]
+    present = np.flatnonzero(count)
+    count, lat_sum, lat_n, err = count[present], lat_sum[present], lat_n[present], err[present]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_latency = np.where(lat_n > 0, lat_sum / np.maximum(lat_n, 1), np.nan)
+    return present, mean_latency, err / count, count
+
+class TypingStats:
+    """Everything computed from one SessionBatch."""
+
+    def __init__(self, batch: SessionBatch):
+        self.sessions = batch.size
+        self.keystrokes = len(batch)
+
+        # Boolean masks are applied as bincount weights (or by sending rows to
+        # a spare bin) rather than by indexing, which would copy the batch
+        typed = batch.chars != BACKSPACE_CODE
+        first = np.ones(len(batch), dtype=bool)
+        first[1:] = batch.session[1:] != batch.session[:-1]
+        # The first key of a session and long pauses have no meaningful latency
+        timed = ~first & (batch.intervals <= MAX_INTERVAL_MS)
+        timed_w = timed.astype(np.float64)
+        latency = batch.intervals * timed_w
+        errors = (~batch.correct).astype(np.float64)
+
+        # ── Per character (by the character the prompt asked for) ──
+        # Code points are mapped to dense ids so every grouping is a bincount
+        sel = typed & (batch.expected != 0)
+        vocab = np.flatnonzero(np.bincount(batch.expected, weights=sel, minlength=1))
+        k = len(vocab)
+        lookup = np.full(int(batch.expected.max(initial=0)) + 1, k, dtype=np.int64)
+        lookup[vocab] = np.arange(k)
+        ids = np.where(sel, lookup[batch.expected], k)
+
+        present, lat, err, cnt = _group(ids, k, latency, timed_w, errors)
+        self.chars = GroupStats([chr(c) for c in vocab[present]], lat, err, cnt)
+
+        # ── Per bigram: a key typed straight after the previous position ──
+        pairs = np.full(len(batch), k * k, dtype=np.int64)
+        follows = (~first[1:] & sel[1:] & sel[:-1]
+                   & (batch.positions[1:] == batch.positions[:-1] + 1))
+        pairs[1:] = np.where(follows, ids[:-1] * k + ids[1:], k * k)
+        present, lat, err, cnt = _group(pairs, k * k, latency, timed_w, errors)
+        self.bigrams = GroupStats([chr(vocab[p // k]) + chr(vocab[p % k]) for p in present],
+                                  lat, err, cnt)
+
+        # ── Per session ──
+        order = np.argsort(batch.started, kind="stable")
+        self.started = batch.started[order]
+        self.wpm = batch.wpm[order]
+        n = np.bincount(batch.session, weights=timed_w, minlength=batch.size)
+        s1 = np.bincount(batch.session, weights=latency, minlength=batch.size)
+        s2 = np.bincount(batch.session, weights=latency * latency, minlength=batch.size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s1 / np.maximum(n, 1)
+            variance = np.where(n > 1, s2 / np.maximum(n, 1) - mean ** 2, np.nan)
+        self.consistency = variance[order]
+        typed_count = np.count_nonzero(typed)
+        self.error_rate = float(np.dot(errors, typed) / typed_count) if typed_count else 0.0
+
+    def weak_bigrams(self, n: int = 8, min_count: int = 5) -> dict:
+        """
+        The n bigrams the user struggles with most, as {bigram: weight}:
+        latency relative to the median bigram plus ERROR_WEIGHT × error rate.
+        Meant for prompt_generator.get_training_prompt().
+        """
+        g = self.bigrams
+        eligible = np.flatnonzero((g.count >= min_count) & ~np.isnan(g.latency))
+        if not len(eligible):
+            return {}
+        weakness = (g.latency[eligible] / np.median(g.latency[eligible])
+                    + ERROR_WEIGHT * g.error_rate[eligible])
+        order = np.argsort(-weakness, kind="stable")[:n]
+        return {g.keys[eligible[i]]: float(weakness[i]) for i in order}
+
+    def wpm_trend(self, window: int = 10):
+        """Rolling mean of WPM over sessions in the order they were typed."""
+        if not len(self.wpm):
+            return self.wpm
+        window = max(1, min(window, len(self.wpm)))
+        sums = np.cumsum(np.concatenate(([0.0], self.wpm)))
+        return (sums[window:] - sums[:-window]) / window
+
+def compute_stats(paths) -> TypingStats:
+    return TypingStats(load_batch(paths))
@@ -3,23 +3,172 @@
 
 import os
 import sys
+import glob
 import random
-from prompt_generator import get_random_prompt
+import threading
+from prompt_pool import PromptPool
+from keystroke_log import session_filename
 
-# Directory where files/ lives
+# Directory where files/ lives. Bundled files are read from BASE_DIR
+# (PyInstaller's _MEIPASS when frozen); the leaderboard and sessions are
+# written to DATA_DIR, which for a frozen app is next to the executable
+# since _MEIPASS is a temporary folder removed on exit.
 BASE_DIR  = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
 FILES_DIR = os.path.join(BASE_DIR, "files")
+DATA_DIR  = (os.path.join(os.path.dirname(sys.executable), "files")
+             if getattr(sys, "frozen", False) else FILES_DIR)
+LEADERBOARD_DB     = os.path.join(DATA_DIR, "leaderboard.db")
+LEGACY_LEADERBOARD = os.path.join(DATA_DIR, "leaderboard.txt")
+SESSIONS_DIR       = os.path.join(DATA_DIR, "sessions")
+# A shared scoring_service.py server to use instead of the local leaderboard
+SCORING_URL        = os.environ.get("TYPING_SCORING_URL")
+# A score_log.py file to share instead, e.g. on a lab's network drive
+SHARED_LEADERBOARD = os.environ.get("TYPING_SHARED_LEADERBOARD")
+
+_service = None
+_sessions_saved = 0
+_weak_bigrams = (-1, {})    # (_sessions_saved when computed, weights)
+_marathon_sentences = 0     # 0 for a whole chapter
+
+def service():
+    # created on first use; the local one imports the old leaderboard.txt
+    # the first time it opens the database. scoring_service (and with it
+    # SQLite and the corpus) is imported here so that starting the app
+    # doesn't wait on it.
+    global _service
+    if _service is None:
+        from scoring_service import ScoringService, RemoteScoringService
+        if SCORING_URL:
+            _service = RemoteScoringService(SCORING_URL)
+        elif SHARED_LEADERBOARD:
+            try:
+                _service = ScoringService(":memory:", log_path=SHARED_LEADERBOARD)
+            except OSError as e:
+                # no locking (Windows): sharing would lose scores, so don't
+                print(f"TYPING_SHARED_LEADERBOARD ignored: {e}", file=sys.stderr)
+        if _service is None:
+            _service = ScoringService(LEADERBOARD_DB, LEGACY_LEADERBOARD)
+    return _service
 
 def load_prompts(difficulty):
     # simply returns a one-element list so frontend.load_prompt still works
+    from prompt_generator import get_random_prompt
     return [ get_random_prompt(difficulty) ]
 
 def get_random_prompt_wrapper(difficulty):
     # keep naming consistent
+    from prompt_generator import get_random_prompt
     return get_random_prompt(difficulty)
 
-def save_to_leaderboard(name: str, wpm: int, mistakes: int, difficulty: str) -> None:
-    os.makedirs(FILES_DIR, exist_ok=True)
-    lb = os.path.join(FILES_DIR, "leaderboard.txt")
-    with open(lb, "a", encoding="utf-8") as f:
-        f.write(f"{difficulty.capitalize()} - {name} - WPM: {wpm}, Mistakes: {mistakes}\n")
+def generate_prompt(difficulty: str) -> 'PromptHandle':
+    # 'training' drills the user's weakest key pairs; until there is enough
+    # history (or without NumPy) it is an ordinary prompt of any kind
+    weights = weak_bigrams() if difficulty == "training" else None
+    return service().issue_prompt(difficulty, weights, _marathon_sentences)
+
+_prompts = PromptPool(generate_prompt)
+
+def prefetch(difficulty: str) -> None:
+    # keep a few prompts of this difficulty ready on a background thread;
+    # the first ones also load the corpus
+    _prompts.prefer(difficulty)
+
+def set_marathon_length(sentences: int) -> None:
+    # marathon prompts are a whole chapter (0) or this many sentences;
+    # queued ones were drawn at the old length
+    global _marathon_sentences
+    if sentences != _marathon_sentences:
+        _marathon_sentences = sentences
+        _prompts.discard("marathon")
+
+def prompt_ready(difficulty: str) -> bool:
+    return _prompts.ready(difficulty)
+
+def next_prompt(difficulty: str) -> 'PromptHandle':
+    # a handle; its .text is sliced from the corpus when the prompt is shown
+    return _prompts.get(difficulty)
+
+def weak_bigrams() -> dict:
+    # runs on the prefetch thread; a session saved meanwhile bumps
+    # _sessions_saved, so the result is recomputed on the next call
+    global _weak_bigrams
+    version, weights = _weak_bigrams
+    if version != _sessions_saved:
+        version = _sessions_saved
+        try:
+            weights = typing_stats().weak_bigrams()
+        except (ImportError, OSError, ValueError):
+            # no NumPy, or unreadable history: an ordinary prompt instead
+            weights = {}
+        _weak_bigrams = (version, weights)
+    return weights
+
+def save_to_leaderboard(name: str, wpm: int, mistakes: int, difficulty: str,
+                        prompt: 'PromptHandle' = None) -> None:
+    # queued, not written yet; raises ScoreRejected if the score is invalid
+    service().submit(name, wpm, mistakes, difficulty, prompt)
+
+def top_scores(difficulty: str, limit: int = 10):
+    # (name, wpm, mistakes, created_at) rows, best first
+    return service().top(difficulty, limit)
+
+def passage_scores(prompt: 'PromptHandle', limit: int = 10):
+    # best results on this exact passage, as in top_scores
+    return service().passage_top(prompt, limit)
+
+def leaderboard_page(difficulty: str, sort: str = "wpm", descending: bool = None,
+                     after=None, limit: int = 100):
+    # one keyset page of (id, name, wpm, mistakes, created_at) rows plus the
+    # key of the next page; descending=None keeps the column's natural order
+    return service().page(difficulty, sort, descending, after, limit)
+
+def user_stats(name: str, difficulty: str):
+    # (count, mean wpm, best wpm) of the player's saved results, or None
+    return service().user_stats(name, difficulty)
+
+def percentile_rank(difficulty: str, wpm: int):
+    # percentage of saved results at this difficulty slower than wpm, or
+    # None before the first; the same cost however many there are
+    return service().percentile(difficulty, wpm)
+
+def leaderboard_version():
+    # changes whenever the scores do, other copies' included when the
+    # leaderboard is shared; None if that is not known
+    return service().version()
+
+def close_service(timeout: float = 3.0) -> int:
+    # on quit: commit or send the scores still queued, waiting at most
+    # `timeout` seconds (a scoring server may be unreachable); returns how
+    # many are left, which are lost when the app exits
+    if _service is None:
+        return 0
+    closer = threading.Thread(target=_service.close, name="scoring-close", daemon=True)
+    closer.start()
+    closer.join(timeout)
+    return _service.unsent()
+
+def clear_leaderboard() -> None:
+    service().clear()
+
+def save_session(recorder, wpm: int, mistakes: int):
+    # keystroke logs are a nice-to-have; never let a failed write end a test
+    global _sessions_saved
+    path = os.path.join(SESSIONS_DIR, session_filename(recorder.started))
+    try:
+        path = recorder.save(path, wpm, mistakes)
+    except (OSError, ValueError, OverflowError) as e:
+        print(f"session not saved: {e}", file=sys.stderr)
+        return None
+    # queued training prompts were picked for the old weaknesses
+    _sessions_saved += 1
+    _prompts.discard("training")
+    return path
+
+def session_paths():
+    return sorted(glob.glob(os.path.join(SESSIONS_DIR, "*.kss")))
+
+def typing_stats():
+    # NumPy is only needed for statistics and training, so import it on demand;
+    # raises ImportError when it is not installed
+    from analytics import compute_stats
+    return compute_stats(session_paths())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+bench_analytics.py
+
+Times the analytics engine on synthetic sessions: building the batched
+arrays and computing every statistic. Sessions are generated in memory
+(about 230 keystrokes each, with typos and backspaces) so the numbers
+exclude disk reads.
+
+Usage:
+  python benchmarks/bench_analytics.py [--sessions 10000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keystroke_log import Session, BACKSPACE
+from analytics import SessionBatch, TypingStats
+
+TEXT = ("Call me Ishmael. Some years ago, never mind how long precisely, having "
+        "little or no money in my purse, and nothing particular to interest me on "
+        "shore, I thought I would sail about a little and see the watery part of "
+        "the world. It is a way I have of driving off the spleen.")
+
+def synthetic_session(rng, started):
+    prompt = TEXT[:rng.randint(190, 210)]
+    intervals, positions, chars, correct = array("I"), array("I"), array("I"), bytearray()
+    pos = 0
+    while pos < len(prompt):
+        intervals.append(int(rng.lognormvariate(11.8, 0.4)))
+        if rng.random() < 0.04:
+            positions.append(pos); chars.append(ord("#")); correct.append(0)
+            intervals.append(int(rng.lognormvariate(12.2, 0.3)))
+            positions.append(pos); chars.append(ord(BACKSPACE)); correct.append(1)
+            continue
+        positions.append(pos); chars.append(ord(prompt[pos])); correct.append(1)
+        pos += 1
+    return Session(started, sum(intervals) / 1e6, rng.randint(30, 110), 0, "easy", prompt,
+                   intervals, positions, chars, correct)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark typing analytics.')
+    parser.add_argument('--sessions', type=int, default=10_000, help='Sessions to analyze')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sessions = [synthetic_session(rng, 1.7e9 + i * 600) for i in range(args.sessions)]
+
+    start = time.perf_counter()
+    batch = SessionBatch(sessions)
+    built = time.perf_counter()
+    stats = TypingStats(batch)
+    done = time.perf_counter()
+
+    print(f"sessions:    {stats.sessions:,} ({stats.keystrokes:,} keystrokes)")
+    print(f"batch build: {(built - start) * 1000:8.1f} ms")
+    print(f"statistics:  {(done - built) * 1000:8.1f} ms")
+    print(f"total:       {(done - start) * 1000:8.1f} ms")
+    print("slowest keys:", ", ".join(f"{k!r} {v:.0f} ms" for k, v, _ in stats.chars.top("latency", 3)))
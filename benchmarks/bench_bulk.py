@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+bench_bulk.py
+
+Times bulk JSONL prompt generation (prompt_generator.generate_prompts)
+with 1, 2, 4, ... workers up to the core count, and checks that every
+worker count produces byte-identical output for the same seed.
+
+Usage:
+  python benchmarks/bench_bulk.py [--count 200000] [--seed 0]
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_generator as pg
+
+def run(count, seed, workers):
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+    for chunk in pg.generate_prompts(count, seed, workers=workers):
+        digest.update(chunk.encode("utf-8"))
+    return time.perf_counter() - start, digest.hexdigest()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark bulk prompt generation.')
+    parser.add_argument('--count', type=int, default=200_000, help='Prompts per run')
+    parser.add_argument('--seed', type=int, default=0, help='Seed shared by all runs')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, cores} | {n for n in (2, 4, 8, 16) if n < cores})
+    digests = set()
+    base = None
+    print(f"{'workers':>8} {'prompts/s':>12} {'speedup':>8}")
+    for workers in counts:
+        elapsed, digest = run(args.count, args.seed, workers)
+        digests.add(digest)
+        base = base or elapsed
+        print(f"{workers:>8} {args.count / elapsed:>12,.0f} {base / elapsed:>7.2f}x")
+    if len(digests) != 1:
+        sys.exit("output differs between worker counts")
+    print("output identical for every worker count")
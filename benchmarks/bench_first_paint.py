@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+bench_first_paint.py
+
+Measures the app's time to first paint: from launching frontend.py in a
+fresh interpreter to the first paint event of its window. The child
+runs frontend.py as __main__ with an application-wide event filter that
+reports the first paint of a top-level window and quits.
+
+Runs with QT_QPA_PLATFORM=offscreen unless another platform is set, so
+it works without a display.
+
+Usage:
+  python benchmarks/bench_first_paint.py [--runs 9]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import os, sys, runpy
+from PyQt5.QtCore import QObject, QEvent
+from PyQt5.QtWidgets import QApplication
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and getattr(obj, "isWindow", lambda: False)():
+            print("painted", flush=True)
+            os._exit(0)     # skip teardown; only the first paint matters
+        return False
+
+exec_ = QApplication.exec_
+def patched(*args):
+    app = QApplication.instance()
+    app._first_paint = FirstPaint()
+    app.installEventFilter(app._first_paint)
+    return exec_()
+QApplication.exec_ = patched
+
+root = sys.argv[1]
+sys.path.insert(0, root)
+sys.argv = [os.path.join(root, "frontend.py")]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+def time_first_paint() -> float:
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", CHILD, ROOT], cwd=ROOT, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    line = child.stdout.readline()
+    elapsed = time.perf_counter() - start
+    child.wait()
+    if line.strip() != "painted":
+        sys.exit("frontend.py exited without painting")
+    return elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure frontend.py's time to first paint.")
+    parser.add_argument('--runs', type=int, default=9, help='Launches to time')
+    args = parser.parse_args()
+
+    time_first_paint()  # warm the OS file cache and .pyc files
+    samples = [time_first_paint() for _ in range(args.runs)]
+    print(f"time to first paint: median {statistics.median(samples) * 1000:.0f} ms, "
+          f"best {min(samples) * 1000:.0f} ms over {args.runs} runs")
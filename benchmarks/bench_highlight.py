@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+bench_highlight.py
+
+Drives a real TypingScreen under offscreen Qt and reports microseconds per
+keystroke (evaluation plus mistake highlighting) at several prompt lengths.
+The textbox is pre-filled to just short of the prompt length, so each
+measured key is typed with the whole prompt already on screen.
+
+Pass --legacy to also time the original per-character update_highlight
+for comparison; it is skipped at 20k, where one run takes minutes.
+
+Usage:
+  python benchmarks/bench_highlight.py [--keys 150] [--legacy]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtWidgets import QApplication, QStackedWidget
+from PyQt5.QtGui import QTextCursor, QTextCharFormat, QColor
+
+import frontend
+
+LENGTHS = (200, 2000, 20000)
+
+def legacy_update_highlight(screen, lo=None, hi=None):
+    """The original whole-text, one-character-at-a-time repaint."""
+    screen.textbox.blockSignals(True)
+    screen.highlighting = True
+    cursor = screen.textbox.textCursor()
+    cursor.beginEditBlock()
+    text = screen.textbox.toPlainText()
+    fmt_correct = QTextCharFormat()
+    fmt_correct.setForeground(QColor("black"))
+    fmt_wrong = QTextCharFormat()
+    fmt_wrong.setForeground(QColor("red"))
+    for i in range(len(text)):
+        cursor.setPosition(i)
+        cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor)
+        cursor.mergeCharFormat(fmt_wrong if i in screen.error_indices else fmt_correct)
+    cursor.endEditBlock()
+    screen.highlighting = False
+    screen.textbox.blockSignals(False)
+
+def make_prompt(length):
+    words = "the whale rose slowly from the grey sea and Ahab watched it. "
+    return (words * (length // len(words) + 1))[:length]
+
+def us_per_key(screen, length, keys, legacy=False):
+    prompt = make_prompt(length)
+    screen.update_highlight = (lambda lo, hi: legacy_update_highlight(screen)) if legacy \
+        else frontend.TypingScreen.update_highlight.__get__(screen)
+    screen.prompt_text = prompt
+    screen.segment_start, screen.segment_end = 0, len(screen.prompt_text)
+    screen.start_time = None
+    screen.textbox.clear()
+    screen.evaluator.reset(prompt)
+    screen.painter.reset()
+    screen.start_time = time.time()
+
+    # Pre-fill with a typo every 40 characters so there is something to paint
+    prefix = length - keys - 1
+    filled = "".join("#" if i % 40 == 0 else prompt[i] for i in range(prefix))
+    cursor = QTextCursor(screen.document)
+    cursor.insertText(filled)
+
+    start = time.perf_counter()
+    for i in range(prefix, prefix + keys):
+        cursor.insertText("#" if i % 10 == 0 else prompt[i])
+    elapsed = time.perf_counter() - start
+    screen.timer.stop()
+    return elapsed / keys * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark per-keystroke highlighting.')
+    parser.add_argument('--keys', type=int, default=150, help='Keystrokes timed per length')
+    parser.add_argument('--legacy', action='store_true',
+                        help='Also time the original per-character highlighter')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    stacked = QStackedWidget()
+    screen = frontend.TypingScreen(stacked)
+    screen.resize(700, 480)
+    screen.show()
+
+    header = f"{'prompt':>8} {'us/key':>10}"
+    if args.legacy:
+        header += f" {'legacy us/key':>14}"
+    print(header)
+    for length in LENGTHS:
+        row = f"{length:>8} {us_per_key(screen, length, args.keys):>10.1f}"
+        if args.legacy and length <= 2000:
+            row += f" {us_per_key(screen, length, 10, legacy=True):>14.1f}"
+        elif args.legacy:
+            row += f" {'-':>14}"
+        print(row)
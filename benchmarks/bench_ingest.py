@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+bench_ingest.py
+
+Compares streaming corpus ingestion (corpus_ingest.ingest) with building
+the same index in memory (load_body_text, find_sentence_bounds and
+build_span_index) on a synthetic book made of repeated copies of
+Moby-Dick. Each run is a fresh interpreter, so the peak resident memory
+it reports belongs to that approach alone.
+
+Before timing anything it checks, on Moby-Dick itself and with a few
+chunk sizes, that streaming produces exactly the text, sentence
+boundaries and spans of the in-memory build.
+
+Usage:
+  python benchmarks/bench_ingest.py [--mb 100] [--skip-memory]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import corpus_cache
+import corpus_ingest
+import prompt_generator as pg
+
+KEY = bytes(32)     # any key will do; these caches are read back once
+
+def legacy_clean(path):
+    """The cleanup load_body_text did before ingestion was streamed."""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = f.read()
+    m = re.search(corpus_ingest.START_RE.pattern.decode(), raw)
+    if m:
+        raw = raw[raw.find("\n", m.start()) + 1:]
+    m = re.search(corpus_ingest.END_RE.pattern.decode(), raw)
+    if m:
+        raw = raw[:m.start()]
+    text = raw.replace("\r\n", " ").replace("\n", " ")
+    return re.sub(r"\s+", " ", text).strip()
+
+def verify(path, folder):
+    text = legacy_clean(path)
+    starts, ends = pg.find_sentence_bounds(text)
+    spans = pg.build_span_index(text, starts, ends)
+    for chunk_bytes in (97, 1 << 16, corpus_ingest.CHUNK_BYTES):
+        cache_path = os.path.join(folder, f"verify-{chunk_bytes}.cache")
+        corpus_ingest.ingest(path, cache_path, KEY, pg.MIN_LEN, pg.MAX_LEN,
+                             chunk_bytes=chunk_bytes)
+        cached = corpus_cache.load(cache_path, KEY)
+        arrays = cached.arrays
+        same = (cached.text() == text
+                and list(arrays['sentence_starts']) == list(starts)
+                and list(arrays['sentence_ends']) == list(ends))
+        for name in pg.BUCKETS:
+            streamed = list(zip(arrays[f'{name}_starts'], arrays[f'{name}_ends']))
+            # streaming emits spans by end, the in-memory build by start
+            same = same and sorted(streamed) == sorted(zip(*spans.bucket(name)))
+        if not same:
+            sys.exit(f"streamed index differs from the in-memory one (chunk {chunk_bytes})")
+    print(f"streamed index identical to the in-memory one "
+          f"({len(spans):,} spans, {len(text):,} chars)")
+
+def make_book(path, mb):
+    """Moby-Dick's body repeated to about `mb` megabytes, with one header and footer."""
+    with open(pg.TXT_PATH, 'rb') as f:
+        body = f.read()
+    body = body[:corpus_ingest.body_range(body)[1]]
+    with open(path, 'wb') as f:
+        f.write(b"*** START OF THE PROJECT GUTENBERG EBOOK SYNTHETIC ***\n")
+        while f.tell() < mb << 20:
+            f.write(body)
+        f.write(b"*** END OF THE PROJECT GUTENBERG EBOOK SYNTHETIC ***\n")
+
+def measure(mode, path, folder):
+    """Seconds, peak RSS in MB and span count of one approach, in a child process."""
+    out = subprocess.run([sys.executable, __file__, "--child", mode, path, folder],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout)
+
+def child(mode, path, folder):
+    start = time.perf_counter()
+    if mode == "stream":
+        cache_path = os.path.join(folder, "stream.cache")
+        corpus_ingest.ingest(path, cache_path, KEY, pg.MIN_LEN, pg.MAX_LEN)
+        spans = len(corpus_cache.load(cache_path, KEY).arrays['clean_starts'])
+    else:
+        text = legacy_clean(path)
+        starts, ends = pg.find_sentence_bounds(text)
+        spans = len(pg.build_span_index(text, starts, ends))
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak /= (1 << 20) if sys.platform == "darwin" else (1 << 10)
+    print(json.dumps({'seconds': seconds, 'peak_mb': peak, 'spans': spans}))
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        child(*sys.argv[2:])
+        sys.exit()
+
+    parser = argparse.ArgumentParser(description='Benchmark streaming corpus ingestion.')
+    parser.add_argument('--mb', type=int, default=100, help='Size of the synthetic book')
+    parser.add_argument('--skip-memory', action='store_true',
+                        help='Only run streaming ingestion (the in-memory build needs '
+                             'several times the book size in RAM)')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench-ingest-")
+    try:
+        verify(pg.TXT_PATH, folder)
+        book = os.path.join(folder, "synthetic.txt")
+        make_book(book, args.mb)
+        size = os.path.getsize(book) / (1 << 20)
+        modes = ["stream"] if args.skip_memory else ["stream", "memory"]
+        print(f"\n{size:.0f} MB book")
+        print(f"{'approach':<10} {'MB/s':>8} {'peak RSS':>10} {'spans':>12}")
+        results = {}
+        for mode in modes:
+            results[mode] = r = measure(mode, book, folder)
+            print(f"{mode:<10} {size / r['seconds']:>8.1f} {r['peak_mb']:>7.0f} MB "
+                  f"{r['spans']:>12,}")
+        if len(results) == 2 and results['stream']['spans'] != results['memory']['spans']:
+            sys.exit("span counts differ")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
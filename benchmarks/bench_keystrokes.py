@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+bench_keystrokes.py
+
+Checks the incremental KeystrokeEvaluator against the original full scan
+of on_text_changed, then compares their cost per keystroke.
+
+The check replays random edit sessions (typing, backspace, mid-text
+inserts, pastes and selection replaces) and asserts that after every edit
+both produce the same error_indices. It exits non-zero on any mismatch.
+
+Usage:
+  python benchmarks/bench_keystrokes.py [--sessions 300]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing_engine import KeystrokeEvaluator
+
+ALPHABET = "abcde .,"
+
+def full_scan(prompt, typed, error_indices):
+    """The per-keystroke loop on_text_changed used to run."""
+    for i in range(len(typed)):
+        if typed[i] != prompt[i] and i not in error_indices:
+            error_indices.add(i)
+
+def random_edit(rng, typed, prompt_len):
+    """Return (position, removed, inserted_text) for one plausible edit."""
+    n = len(typed)
+    roll = rng.random()
+    if roll < 0.55 or n == 0:
+        return n, 0, rng.choice(ALPHABET)                      # type at the end
+    if roll < 0.75:
+        return n - 1, 1, ""                                    # backspace
+    pos = rng.randrange(n + 1)
+    if roll < 0.85:
+        return pos, 0, rng.choice(ALPHABET)                    # insert mid-text
+    if roll < 0.92:
+        room = max(prompt_len - n, 1)
+        return pos, 0, "".join(rng.choices(ALPHABET, k=rng.randint(1, room)))  # paste
+    removed = rng.randint(0, n - pos)
+    return pos, removed, "".join(rng.choices(ALPHABET, k=rng.randint(0, 4)))   # replace selection
+
+def check_equivalence(sessions, seed=0):
+    rng = random.Random(seed)
+    edits = 0
+    for _ in range(sessions):
+        prompt = "".join(rng.choices(ALPHABET, k=rng.randint(1, 80)))
+        evaluator = KeystrokeEvaluator(prompt)
+        reference = set()
+        typed = ""
+        while len(typed) < len(prompt):
+            pos, removed, text = random_edit(rng, typed, len(prompt))
+            typed = (typed[:pos] + text + typed[pos + removed:])[:len(prompt)]
+            evaluator.mark(pos, removed, len(text))
+            evaluator.apply(len(typed), typed.__getitem__)
+            full_scan(prompt, typed, reference)
+            edits += 1
+            if evaluator.error_indices != reference:
+                raise AssertionError(f"mismatch after {edits} edits on prompt {prompt!r}")
+            if rng.random() < 0.02:
+                break
+    return edits
+
+def time_per_key(prompt_len, incremental):
+    """Microseconds per keystroke when steadily typing a whole prompt."""
+    prompt = "x" * prompt_len
+    typed = []
+    evaluator = KeystrokeEvaluator(prompt)
+    errors = set()
+    start = time.perf_counter()
+    for i in range(prompt_len):
+        typed.append("x" if i % 7 else "y")
+        if incremental:
+            evaluator.mark(i, 0, 1)
+            evaluator.apply(i + 1, typed.__getitem__)
+        else:
+            full_scan(prompt, "".join(typed), errors)
+    return (time.perf_counter() - start) / prompt_len * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Verify and benchmark keystroke evaluation.')
+    parser.add_argument('--sessions', type=int, default=300,
+                        help='Random edit sessions to replay in the check')
+    args = parser.parse_args()
+
+    edits = check_equivalence(args.sessions)
+    print(f"equivalence: {edits} edits over {args.sessions} sessions match the full scan")
+
+    print(f"{'prompt':>8} {'full scan us/key':>18} {'incremental us/key':>20}")
+    for n in (200, 2000, 10000):
+        print(f"{n:>8} {time_per_key(n, False):>18.2f} {time_per_key(n, True):>20.2f}")
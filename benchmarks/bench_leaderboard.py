@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+bench_leaderboard.py
+
+Times opening the leaderboard (top 10 per difficulty) with a large number
+of stored results, for the SQLite store and for the old approach of
+re-reading and prefix-filtering leaderboard.txt, then compares fetching
+the first page of the table view with a page deep into the results.
+Last, it times a player's stats and a percentile rank from the rollups
+the store keeps as results are added, against aggregating the results
+table for each. Everything is written to a temporary directory.
+
+Usage:
+  python benchmarks/bench_leaderboard.py [--rows 1000000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard_store import LeaderboardStore
+
+def fake_results(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield (f"user{rng.randrange(5000)}", rng.randint(10, 160), rng.randint(0, 30),
+               rng.choice(("easy", "hard")), 1.7e9 + i)
+
+def legacy_load(path):
+    """What LeaderboardScreen.load_scores did with the text file."""
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    easy = [line for line in lines if line.lower().startswith("easy")]
+    hard = [line for line in lines if line.lower().startswith("hard")]
+    return "\n".join(easy) + "\n\n" + "\n".join(hard)
+
+def best_of(fn, runs=5):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark leaderboard loading.')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Stored results')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        txt = os.path.join(tmp, "leaderboard.txt")
+        with open(txt, "w", encoding="utf-8") as f:
+            for name, wpm, mistakes, difficulty, _ in fake_results(args.rows):
+                f.write(f"{difficulty.capitalize()} - {name} - WPM: {wpm}, Mistakes: {mistakes}\n")
+
+        db = os.path.join(tmp, "leaderboard.db")
+        store = LeaderboardStore(db)
+        start = time.perf_counter()
+        for offset in range(0, args.rows, 50_000):
+            store.add_many(fake_results(min(50_000, args.rows - offset), seed=offset))
+        insert = time.perf_counter() - start
+        store.close()
+
+        def open_store():
+            s = LeaderboardStore(db)
+            s.top("easy")
+            s.top("hard")
+            s.close()
+
+        print(f"rows:               {args.rows:,}")
+        print(f"batched insert:     {args.rows / insert:,.0f} rows/s")
+        print(f"legacy text load:   {best_of(lambda: legacy_load(txt), 3) * 1000:9.2f} ms")
+        print(f"sqlite open + top:  {best_of(open_store) * 1000:9.2f} ms")
+
+        store = LeaderboardStore(db)
+        depth = store.count("easy") // 2
+        for sort in ("wpm", "mistakes", "created_at"):
+            first = best_of(lambda: store.page("easy", sort, limit=100))
+            _, deep_key = store.page("easy", sort, limit=depth)
+            deep = best_of(lambda: store.page("easy", sort, after=deep_key, limit=100))
+            print(f"page by {sort:<10}  first {first * 1000:6.2f} ms, "
+                  f"at row {depth:,}: {deep * 1000:6.2f} ms")
+
+        def scan_stats():
+            store.conn.execute("SELECT COUNT(*), AVG(wpm), MAX(wpm) FROM results "
+                               "WHERE name = ? AND difficulty = ?", ("user42", "easy")).fetchone()
+            store.conn.execute("SELECT TOTAL(wpm < ?), COUNT(*) FROM results "
+                               "WHERE difficulty = ?", (85, "easy")).fetchone()
+
+        def rollup_stats():
+            store.user_stats("user42", "easy")
+            store.percentile("easy", 85)
+
+        print(f"stats + percentile: rollups {best_of(rollup_stats) * 1000:6.2f} ms, "
+              f"scanning results {best_of(scan_stats, 3) * 1000:6.2f} ms")
+        store.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+bench_log_writers.py
+
+Stress test for score_log.py: writer processes append scores to one
+shared log at once, one score per append (each fsync'd, as the app
+does), while this process tails the log as a leaderboard would and
+compacts it a few times mid-run. Before they start, a torn record is
+left in the log as if a writer had been killed mid-append.
+
+For each number of writers it reports:
+
+  throughput      scores appended per second, all writers together
+  latency         of one append, lock wait and fsync included
+  tail            mean time to read what was appended since the last
+                  poll, against re-reading the whole log once at the end
+
+and checks that every score is in the log exactly once and in the order
+its writer appended them, both as the tail reader saw them and as a
+fresh read of the final log finds them.
+
+Usage:
+  python benchmarks/bench_log_writers.py [--writers 1,4,16] [--scores 500] [--compactions 3]
+"""
+
+import os
+import sys
+import time
+import queue
+import argparse
+import tempfile
+import statistics
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from score_log import ScoreLog, RECORD, SYNC
+
+def quantiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return f"p50 {statistics.median(samples) * 1000:6.2f} ms   p99 {cuts[98] * 1000:6.2f} ms"
+
+def writer(n, path, scores, start, results):
+    log = ScoreLog(path)
+    latencies = []
+    start.wait()
+    for i in range(scores):
+        row = (f"writer{n}", 40 + i % 80, i, "easy", time.time(), None)
+        began = time.perf_counter()
+        log.append([row])
+        latencies.append(time.perf_counter() - began)
+    log.close()
+    results.put(latencies)
+
+def check(rows, writers, scores, source):
+    seen = {}
+    for name, _, i, *_ in rows:
+        seen.setdefault(name, []).append(i)
+    expected = list(range(scores))
+    bad = [f"writer{n}" for n in range(writers) if seen.pop(f"writer{n}", []) != expected]
+    if bad or seen:
+        sys.exit(f"{source}: lost, repeated or reordered scores from {', '.join(bad + list(seen))}")
+
+def run(writers, scores, compactions):
+    folder = tempfile.mkdtemp(prefix="bench_log_")
+    path = os.path.join(folder, "leaderboard.log")
+    ScoreLog(path).clear()
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(SYNC, 200, 0) + b'["torn",')
+
+    start, results = multiprocessing.Event(), multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=writer, args=(n, path, scores, start, results))
+             for n in range(writers)]
+    for proc in procs:
+        proc.start()
+
+    tail, compactor = ScoreLog(path), ScoreLog(path)
+    seen, polls = [], []
+    total = writers * scores
+    began = time.perf_counter()
+    start.set()
+    done, latencies, finished = 0, [], 0
+    while finished < writers:
+        # taken as they come: a writer cannot exit until its results are read
+        try:
+            latencies += results.get_nowait()
+            finished += 1
+        except queue.Empty:
+            pass
+        poll = time.perf_counter()
+        rows, reset = tail.read_new()
+        polls.append(time.perf_counter() - poll)
+        seen = rows if reset else seen + rows
+        # compact at even steps through the run
+        if done < compactions and len(seen) >= total * (done + 1) / (compactions + 1):
+            compactor.compact()
+            done += 1
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+
+    rows, reset = tail.read_new()
+    seen = rows if reset else seen + rows
+    check(seen, writers, scores, "tail reader")
+    full = time.perf_counter()
+    rows, _ = ScoreLog(path).read_new()
+    full = time.perf_counter() - full
+    check(rows, writers, scores, "full read")
+    tail.close()
+    compactor.close()
+
+    print(f"{writers:>3} writers  {total / elapsed:>8,.0f} scores/s   latency {quantiles(latencies)}"
+          f"   tail {statistics.mean(polls) * 1000:5.2f} ms/poll vs full read"
+          f" {full * 1000:6.1f} ms   {done} compactions, nothing lost")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stress test the shared score log.')
+    parser.add_argument('--writers', default='1,4,16',
+                        help='Comma-separated numbers of writer processes')
+    parser.add_argument('--scores', type=int, default=500, help='Scores per writer')
+    parser.add_argument('--compactions', type=int, default=3,
+                        help='Compactions during each run')
+    args = parser.parse_args()
+    for count in (int(n) for n in args.writers.split(',')):
+        run(count, args.scores, args.compactions)
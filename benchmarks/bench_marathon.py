@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+bench_marathon.py
+
+Per-keystroke latency and memory of marathon-length prompts. Each run is
+a fresh interpreter with a real TypingScreen under offscreen Qt, so its
+peak RSS is its own; every key is timed including the repaint that
+follows it.
+
+  windowed   the app as it is: prompts over frontend.WINDOW_CHARS are
+             typed line by line, with a window of lines on screen. The
+             whole passage is typed and the last --keys keys reported.
+  full       the whole prompt in the label and the textbox, as before
+             marathons (--full). The textbox is pre-filled to --keys short
+             of the end, as in bench_highlight.py, since typing a long
+             passage this way takes minutes.
+
+Usage:
+  python benchmarks/bench_marathon.py [--lengths 2000,10000,50000,100000] [--keys 500] [--full]
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import os, sys, json, time, resource, statistics
+root, length, keys, windowed = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4] == "1"
+sys.path.insert(0, root)
+from PyQt5.QtWidgets import QApplication, QStackedWidget
+from PyQt5.QtGui import QTextCursor
+app = QApplication([])
+import frontend
+from prompt_generator import get_corpus
+
+if not windowed:
+    frontend.WINDOW_CHARS = float("inf")
+corpus = get_corpus()
+start = corpus.chapters()[0][0]
+text = corpus.slice(start, start + length)
+
+app.setStyleSheet(frontend.APP_STYLE)
+stack = QStackedWidget()
+screen = frontend.TypingScreen(stack)
+stack.addWidget(screen)
+stack.resize(700, 480)
+stack.show()
+app.processEvents()
+screen.load_prompt(("bench", 0, length), text)
+app.processEvents()
+
+# a typo every 50 keys; the last key is never typed, so the test never ends
+first = 0 if windowed else length - 1 - keys
+if first:
+    QTextCursor(screen.document).insertText(text[:first])
+    app.processEvents()
+samples = []
+for i in range(first, length - 1):
+    key = "#" if i % 50 == 7 else text[i]
+    began = time.perf_counter()
+    screen.textbox.insertPlainText(key)
+    app.processEvents()
+    samples.append(time.perf_counter() - began)
+samples = sorted(samples[-keys:])
+print(json.dumps({"p50": samples[len(samples) // 2], "p99": samples[int(len(samples) * 0.99)],
+                  "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+def run(length, keys, windowed):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    out = subprocess.run([sys.executable, "-c", CHILD, ROOT, str(length), str(keys),
+                          "1" if windowed else "0"],
+                         cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode:
+        sys.exit(out.stderr)
+    return json.loads(out.stdout.splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark marathon-length prompts.')
+    parser.add_argument('--lengths', default='2000,10000,50000,100000',
+                        help='Comma-separated prompt lengths in characters')
+    parser.add_argument('--keys', type=int, default=500, help='Keys timed per run')
+    parser.add_argument('--full', action='store_true',
+                        help='Also time the whole prompt on screen at once')
+    args = parser.parse_args()
+
+    print(f"{'prompt':>8}  {'mode':<9} {'p50 us':>9} {'p99 us':>9} {'peak RSS':>10}")
+    for length in (int(n) for n in args.lengths.split(',')):
+        for windowed in (True, False) if args.full else (True,):
+            result = run(length, min(args.keys, length - 2), windowed)
+            print(f"{length:>8}  {'windowed' if windowed else 'full':<9} "
+                  f"{result['p50'] * 1e6:>9.0f} {result['p99'] * 1e6:>9.0f} "
+                  f"{result['rss']:>7.1f} MB")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+bench_prompts.py
+
+Compares prompts-per-second of the precomputed span index against the
+original rejection-sampling loop of get_random_prompt, and times training
+prompts (a scored n-gram index lookup) for a few sets of weak bigrams.
+Difficulty tiers have no loop to compare against; their rate should match
+easy and hard, since all are a pick from a precomputed bucket.
+
+Usage:
+  python benchmarks/bench_prompts.py [--seconds 2]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prompt_generator as pg
+
+def legacy_get_random_prompt(difficulty: str) -> str:
+    """The pre-index implementation, kept here as the baseline."""
+    difficulty = difficulty.lower()
+    for _ in range(1000):
+        start = random.choice(pg.sentence_starts)
+        valid_ends = [e for e in pg.sentence_ends if pg.MIN_LEN <= (e - start) <= pg.MAX_LEN]
+        if not valid_ends:
+            continue
+        end = random.choice(valid_ends)
+        snippet = pg.BODY_TEXT[start:end]
+        if '[[' in snippet or ']]' in snippet:
+            continue
+        has_quote = '"' in snippet or '“' in snippet or '”' in snippet
+        if difficulty == 'hard' and not has_quote:
+            continue
+        if difficulty == 'easy' and has_quote:
+            continue
+        return snippet
+    return pg.fallback_prompt()
+
+def prompts_per_second(fn, difficulty, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn(difficulty)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark prompt generation.')
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='Time budget per measurement')
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'difficulty':<10} {'legacy/s':>12} {'index/s':>12} {'speedup':>9}")
+    for difficulty in ('easy', 'hard'):
+        old = prompts_per_second(legacy_get_random_prompt, difficulty, args.seconds)
+        new = prompts_per_second(pg.get_random_prompt, difficulty, args.seconds)
+        print(f"{difficulty:<10} {old:>12,.0f} {new:>12,.0f} {new / old:>8,.0f}x")
+    for tier in pg.TIERS:
+        new = prompts_per_second(pg.get_random_prompt, tier, args.seconds)
+        print(f"{tier:<12} {'':>10} {new:>12,.0f}")
+
+    print()
+    for weights in ({'th': 1.0}, {'wh': 2.0, 'ing': 1.5, 'q': 1.0},
+                    {g: 1.0 for g in ('th', 'he', 'an', 'er', 'ou', 'ea', 'st', 'nd')}):
+        rate = prompts_per_second(pg.get_training_prompt, weights, args.seconds)
+        print(f"training {','.join(weights):<24} {1e6 / rate:8.1f} us per prompt")
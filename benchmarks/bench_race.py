@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+bench_race.py
+
+Load test for race_server.py: starts a server in a subprocess, connects
+hundreds of simulated racers on localhost and has them all race once.
+Each racer types at its own speed and sends a progress update for every
+character, which is more than the real client sends (it coalesces to
+20 per second).
+
+A handful of racers are probes that decode every tick and report:
+
+  tick interval   time between ticks as received (ideal: 1 / tick rate)
+  latency         from sending a position to seeing it in a tick
+
+plus update and broadcast throughput, the server's CPU time, and a check
+that every finisher was written to the leaderboard.
+
+Usage:
+  python benchmarks/bench_race.py [--clients 300] [--wpm 200] [--tick-rate 10]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from leaderboard_store import LeaderboardStore
+
+PROBES = 8
+
+def cpu_seconds(pid):
+    """User + system CPU time of process `pid` (Linux only, else None)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def quantiles(samples):
+    if len(samples) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return f"p50 {statistics.median(samples) * 1000:7.1f} ms   p99 {cuts[98] * 1000:7.1f} ms"
+
+class Stats:
+    def __init__(self):
+        self.updates = 0
+        self.received = 0
+        self.finished = 0
+        self.intervals = []
+        self.latencies = []
+
+async def racer(n, host, port, wpm, rng, stats, probe):
+    reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+    writer.write(json.dumps({"type": "join", "name": f"racer{n}"}).encode() + b"\n")
+    my_id = None
+    race = text = None
+    while race is None:
+        message = json.loads(await reader.readline())
+        if message["type"] == "welcome":
+            my_id = str(message["id"])
+        elif message["type"] == "race":
+            race, text = message["race"], message["text"]
+
+    sent = {}       # position -> when it was sent (probes only)
+
+    async def type_text():
+        delay = 60 / (wpm * 5)
+        for pos in range(1, len(text) + 1):
+            await asyncio.sleep(delay * rng.uniform(0.5, 1.5))
+            if probe:
+                sent[pos] = time.perf_counter()
+            writer.write(b'{"type":"progress","race":%d,"pos":%d,"mistakes":0}\n' % (race, pos))
+            stats.updates += 1
+        writer.write(b'{"type":"finish","race":%d,"mistakes":0}\n' % race)
+
+    typing = asyncio.create_task(type_text())
+    last_tick = None
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        stats.received += len(line)
+        if line.startswith(b'{"type":"results"'):
+            if my_id in {str(s["id"]) for s in json.loads(line)["standings"]}:
+                stats.finished += 1
+            break
+        if probe and line.startswith(b'{"type":"tick"'):
+            now = time.perf_counter()
+            if last_tick is not None:
+                stats.intervals.append(now - last_tick)
+            last_tick = now
+            pos = json.loads(line)["pos"].get(my_id)
+            if pos in sent:
+                stats.latencies.append(now - sent.pop(pos))
+    await typing
+    writer.close()
+
+async def load_test(host, port, clients, wpm, seed):
+    stats = Stats()
+    rng = random.Random(seed)
+    tasks = [racer(n, host, port, wpm * rng.uniform(0.6, 1.4), random.Random(f"{seed}:{n}"),
+                   stats, n < PROBES)
+             for n in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the race server.')
+    parser.add_argument('--clients', type=int, default=300, help='Simulated racers')
+    parser.add_argument('--wpm', type=float, default=200,
+                        help='Average typing speed of the racers')
+    parser.add_argument('--tick-rate', type=float, default=10.0, help="Server's tick rate")
+    parser.add_argument('--seed', type=int, default=0, help='Seed for typing speeds')
+    args = parser.parse_args()
+
+    db = os.path.join(tempfile.mkdtemp(prefix="bench-race-"), "leaderboard.db")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "race_server.py"), "--port", "0", "--db", db,
+         "--lobby", "0.5", "--min-players", str(args.clients),
+         "--tick-rate", str(args.tick_rate)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        address = server.stdout.readline().split()[-1]
+        host, port = address.rsplit(":", 1)
+        cpu_before = cpu_seconds(server.pid)
+        stats, elapsed = asyncio.run(load_test(host, int(port), args.clients, args.wpm, args.seed))
+        cpu_after = cpu_seconds(server.pid)
+        # results are written while the racers read them, so may still be
+        # on their way when the racers are done
+        store, give_up = LeaderboardStore(db), time.monotonic() + 10
+        while store.count() < stats.finished and time.monotonic() < give_up:
+            time.sleep(0.05)
+        rows = store.count()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"{args.clients} racers, race took {elapsed:.1f} s, {stats.finished} finished, "
+          f"{rows} results written")
+    print(f"tick interval   {quantiles(stats.intervals)}   (target {1000 / args.tick_rate:.0f} ms)")
+    print(f"latency         {quantiles(stats.latencies)}")
+    print(f"updates in      {stats.updates / elapsed:>10,.0f} /s")
+    print(f"broadcast out   {stats.received / elapsed / (1 << 20):>10.2f} MB/s")
+    if cpu_before is not None and cpu_after is not None:
+        print(f"server CPU      {(cpu_after - cpu_before) / elapsed:>10.0%}")
+    if stats.finished != args.clients or rows != args.clients:
+        sys.exit("not every racer finished and was recorded")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+bench_recorder.py
+
+Measures what keystroke recording adds per keystroke: the raw cost of
+KeystrokeRecorder.record(), and the end-to-end cost of a keystroke in a
+real TypingScreen (offscreen Qt) with recording on versus stubbed out.
+Also reports the size of a saved session.
+
+Usage:
+  python benchmarks/bench_recorder.py [--keys 200000]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keystroke_log import KeystrokeRecorder
+
+def ns_per_record(keys):
+    recorder = KeystrokeRecorder()
+    recorder.start("x" * 200, "easy")
+    record = recorder.record
+    start = time.perf_counter()
+    for i in range(keys):
+        record(i & 255, "x", True)
+    elapsed = time.perf_counter() - start
+
+    def noop(position, char, correct):
+        pass
+    start = time.perf_counter()
+    for i in range(keys):
+        noop(i & 255, "x", True)
+    baseline = time.perf_counter() - start
+    return (elapsed - baseline) / keys * 1e9, recorder
+
+def us_per_keystroke(screen, prompt, recording, rounds=5):
+    """Best-of-`rounds` average time to type `prompt` into the screen."""
+    from PyQt5.QtGui import QTextCursor
+    best = float("inf")
+    for _ in range(rounds):
+        screen.prompt_text = prompt + "#"  # never complete the test
+        screen.segment_start, screen.segment_end = 0, len(screen.prompt_text)
+        screen.start_time = None
+        screen.textbox.clear()
+        screen.evaluator.reset(screen.prompt_text)
+        screen.painter.reset()
+        screen.recorder.start(screen.prompt_text, "easy")
+        if not recording:
+            screen.recorder.record = lambda position, char, correct: None
+        screen.start_time = time.time()
+        cursor = QTextCursor(screen.document)
+        start = time.perf_counter()
+        for char in prompt:
+            cursor.insertText(char)
+        best = min(best, (time.perf_counter() - start) / len(prompt) * 1e6)
+        screen.recorder.__dict__.pop("record", None)
+    screen.timer.stop()
+    return best
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark keystroke recording overhead.')
+    parser.add_argument('--keys', type=int, default=200_000, help='record() calls to time')
+    args = parser.parse_args()
+
+    ns, recorder = ns_per_record(args.keys)
+    print(f"record():             {ns:8.0f} ns per keystroke")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = recorder.save(os.path.join(tmp, "session.kss"), 60, 0)
+        print(f"session file:         {os.path.getsize(path) / len(recorder):8.1f} bytes per keystroke")
+
+    from PyQt5.QtWidgets import QApplication, QStackedWidget
+    import frontend
+    app = QApplication(sys.argv)
+    screen = frontend.TypingScreen(QStackedWidget())
+    screen.resize(700, 480)
+    screen.show()
+    prompt = "the whale rose slowly from the grey sea and Ahab watched it. " * 3
+    off = us_per_keystroke(screen, prompt, recording=False)
+    on = us_per_keystroke(screen, prompt, recording=True)
+    print(f"keystroke, no record: {off:8.1f} us")
+    print(f"keystroke, recording: {on:8.1f} us  ({(on - off) / off * 100:+.1f}%)")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+bench_service.py
+
+Load test for scoring_service.py's HTTP server: starts it in a
+subprocess on a temporary database and has a lab of kiosks (threads,
+each with its own keep-alive connection) post one score per request as
+fast as the server answers. It runs twice, once with the server's
+default group commit (every score queued while a transaction runs goes
+into the next one) and once committing every score on its own, and
+reports for each:
+
+  throughput      scores committed per second
+  latency         from sending a score to the server's reply, which
+                  comes only once the score is committed
+
+plus a check that every score was written exactly once.
+
+Usage:
+  python benchmarks/bench_service.py [--kiosks 16] [--scores 200] [--coalesce 0]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.client
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def quantiles(samples):
+    if len(samples) < 2:
+        return "n/a"
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return f"p50 {statistics.median(samples) * 1000:7.1f} ms   p99 {cuts[98] * 1000:7.1f} ms"
+
+def request(conn, method, path, body=None):
+    conn.request(method, path, body=None if body is None else json.dumps(body),
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    reply = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path}: {response.status} {reply}")
+    return reply
+
+def kiosk(n, host, port, scores, latencies):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    for i in range(scores):
+        score = {"name": f"kiosk{n}", "wpm": 40 + i % 80, "mistakes": i % 7,
+                 "difficulty": "easy"}
+        start = time.perf_counter()
+        reply = request(conn, "POST", "/scores", {"scores": [score]})
+        latencies.append(time.perf_counter() - start)
+        if reply["accepted"] != 1:
+            raise RuntimeError(f"score rejected: {reply['rejected']}")
+    conn.close()
+
+def run(label, server_args, kiosks, scores):
+    db = os.path.join(tempfile.mkdtemp(prefix="bench-service-"), "leaderboard.db")
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "scoring_service.py"), "--port", "0", "--db", db,
+         *server_args],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    try:
+        host, port = server.stdout.readline().split()[-1].split("//")[1].rsplit(":", 1)
+        port = int(port)
+        latencies = []
+        threads = [threading.Thread(target=kiosk, args=(n, host, port, scores, latencies))
+                   for n in range(kiosks)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        conn = http.client.HTTPConnection(host, port)
+        rows = request(conn, "GET", "/scores/count")["count"]
+        conn.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    total = kiosks * scores
+    print(f"{label:<18} {total / elapsed:>8,.0f} scores/s   latency {quantiles(latencies)}")
+    if rows != total or len(latencies) != total:
+        sys.exit(f"{label}: expected {total} scores, {rows} written")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the scoring service.')
+    parser.add_argument('--kiosks', type=int, default=16, help='Concurrent kiosks')
+    parser.add_argument('--scores', type=int, default=200, help='Scores posted per kiosk')
+    parser.add_argument('--coalesce', type=float, default=0.0,
+                        help='Seconds a write waits for others in the first run')
+    args = parser.parse_args()
+
+    print(f"{args.kiosks} kiosks x {args.scores} scores, one per request")
+    run(f"group, wait {args.coalesce * 1000:.0f} ms", ["--coalesce", str(args.coalesce)],
+        args.kiosks, args.scores)
+    run("one per commit", ["--coalesce", "0", "--batch", "1"], args.kiosks, args.scores)
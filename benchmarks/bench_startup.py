@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py
+
+Measures the time to load the default corpus with a cold corpus cache
+(deleted before every run) and a warm one. Each run is a fresh
+interpreter so nothing is shared between samples.
+
+Usage:
+  python benchmarks/bench_startup.py [--runs 7]
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import corpus_cache
+from prompt_generator import TXT_PATH
+
+SNIPPET = ("import time; t = time.perf_counter(); import prompt_generator; "
+           "prompt_generator.get_corpus(); print(time.perf_counter() - t)")
+
+def time_import() -> float:
+    out = subprocess.run([sys.executable, "-c", SNIPPET], cwd=ROOT,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip())
+
+def clear_cache():
+    shutil.rmtree(os.path.dirname(corpus_cache.cache_path_for(TXT_PATH)), ignore_errors=True)
+
+def measure(runs, cold):
+    samples = []
+    for _ in range(runs):
+        if cold:
+            clear_cache()
+        samples.append(time_import())
+    return statistics.median(samples)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark corpus startup time.')
+    parser.add_argument('--runs', type=int, default=7, help='Samples per measurement')
+    args = parser.parse_args()
+
+    cold = measure(args.runs, cold=True)
+    time_import()  # make sure the cache exists
+    warm = measure(args.runs, cold=False)
+    print(f"cold start: {cold * 1000:8.1f} ms")
+    print(f"warm start: {warm * 1000:8.1f} ms  ({cold / warm:.1f}x faster)")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+bench_suite.py
+
+Headless end-to-end benchmark of the typing hot path. Simulated typists
+drive a real TypingScreen under offscreen Qt through QTextCursor edits,
+the same signals a keyboard produces, and every edit is timed on its own:
+
+  steady     types the prompt straight through
+  typos      mostly correct, with bursts of wrong keys that are then erased
+  backspace  retypes about half of all words after deleting them
+  paste      pastes the prompt in chunks, then deletes it all and pastes it whole
+
+Also reports prompt generation throughput and startup time (import of the
+GUI module, cold and warm corpus load). Results are written as JSON so two
+commits can be compared:
+
+  QT_QPA_PLATFORM=offscreen python benchmarks/bench_suite.py --output before.json
+  ... change something ...
+  QT_QPA_PLATFORM=offscreen python benchmarks/bench_suite.py --compare before.json
+
+Usage:
+  python benchmarks/bench_suite.py [--sessions 20] [--seconds 1] [--runs 5] [--seed 0]
+                                   [--output PATH] [--compare PATH]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_startup import measure as corpus_startup, time_import
+
+TYPO_KEYS = "#qxz"
+
+# ─── Typists ────────────────────────────────────────────────────────────────
+# Each yields edits: ('type', text) inserts at the end, ('backspace', n)
+# deletes n characters before the end. One edit is one timed event.
+
+def steady(prompt, rng):
+    for ch in prompt:
+        yield 'type', ch
+
+def typos(prompt, rng):
+    i = 0
+    while i < len(prompt):
+        if rng.random() < 0.03:
+            burst = rng.randint(2, 5)
+            for _ in range(burst):
+                yield 'type', rng.choice(TYPO_KEYS)
+            for _ in range(burst):
+                yield 'backspace', 1
+        yield 'type', prompt[i]
+        i += 1
+
+def backspace(prompt, rng):
+    words = prompt.split(" ")
+    for n, word in enumerate(words):
+        word = word + " " if n < len(words) - 1 else word
+        for ch in word:
+            yield 'type', ch
+        if rng.random() < 0.5:
+            for _ in range(len(word)):
+                yield 'backspace', 1
+            for ch in word:
+                yield 'type', ch
+
+def paste(prompt, rng):
+    i = 0
+    while i < len(prompt):
+        chunk = rng.randint(20, 80)
+        yield 'type', prompt[i:i + chunk]
+        i += chunk
+    yield 'backspace', len(prompt)
+    yield 'type', prompt
+
+TYPISTS = {'steady': steady, 'typos': typos, 'backspace': backspace, 'paste': paste}
+
+# ─── Measurements ───────────────────────────────────────────────────────────
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50_us': statistics.median(samples), 'p99_us': cuts[98],
+            'max_us': max(samples), 'events': len(samples)}
+
+def run_typist(screen, typist, prompts, rng):
+    """Microseconds per edit for one typist over all `prompts`."""
+    from PyQt5.QtGui import QTextCursor
+    samples = []
+    for prompt in prompts:
+        # A sentinel past the end keeps the test from completing (which
+        # would save a session and switch screens)
+        screen.prompt_text = prompt + "\0"
+        screen.segment_start, screen.segment_end = 0, len(screen.prompt_text)
+        screen.start_time = None
+        screen.textbox.clear()
+        screen.evaluator.reset(screen.prompt_text)
+        screen.painter.reset()
+        screen.recorder.start(screen.prompt_text, "easy")
+        screen.start_time = time.time()
+        cursor = QTextCursor(screen.document)
+        for action, arg in typist(prompt, rng):
+            cursor.movePosition(QTextCursor.End)
+            start = time.perf_counter()
+            if action == 'type':
+                cursor.insertText(arg)
+            else:
+                cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, arg)
+                cursor.removeSelectedText()
+            samples.append((time.perf_counter() - start) * 1e6)
+    screen.timer.stop()
+    return percentiles(samples)
+
+def prompt_throughput(seconds):
+    import prompt_generator as pg
+    weights = {g: 1.0 for g in ('th', 'he', 'an', 'er', 'ou', 'ea', 'st', 'nd')}
+    cases = {'easy': lambda: pg.get_random_prompt('easy'),
+             'hard': lambda: pg.get_random_prompt('hard'),
+             'training': lambda: pg.get_training_prompt(weights)}
+    results = {}
+    for name, fn in cases.items():
+        count = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            fn()
+            count += 1
+        results[name] = count / (time.perf_counter() - start)
+    return results
+
+def startup(runs):
+    snippet = ("import time; t = time.perf_counter(); import frontend; "
+               "print(time.perf_counter() - t)")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", snippet], cwd=ROOT, capture_output=True,
+                             text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    cold = corpus_startup(runs, cold=True)
+    time_import()  # leave a warm cache behind
+    warm = corpus_startup(runs, cold=False)
+    return {'import_frontend_ms': statistics.median(samples) * 1000,
+            'corpus_cold_ms': cold * 1000, 'corpus_warm_ms': warm * 1000}
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ─── Reporting ──────────────────────────────────────────────────────────────
+
+def flatten(results, prefix=""):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[prefix + key] = value
+    return flat
+
+def compare(old, new):
+    before, after = flatten(old['results']), flatten(new['results'])
+    print(f"\ncompared with {old.get('commit') or 'baseline'}:")
+    for key in sorted(before.keys() & after.keys()):
+        if key.endswith('.events') or not before[key]:
+            continue
+        change = (after[key] - before[key]) / before[key] * 100
+        print(f"  {key:<32} {before[key]:>12,.1f} -> {after[key]:>12,.1f}  ({change:+.1f}%)")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the headless typing benchmark suite.')
+    parser.add_argument('--sessions', type=int, default=20, help='Prompts typed per typist')
+    parser.add_argument('--seconds', type=float, default=1.0,
+                        help='Time budget per prompt throughput measurement')
+    parser.add_argument('--runs', type=int, default=5, help='Samples per startup measurement')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for prompts and typists')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Print changes relative to an earlier JSON result')
+    args = parser.parse_args()
+
+    results = {'startup': startup(args.runs)}
+
+    from PyQt5.QtWidgets import QApplication, QStackedWidget
+    import frontend
+    import prompt_generator as pg
+    app = QApplication(sys.argv)
+    screen = frontend.TypingScreen(QStackedWidget())
+    screen.resize(700, 480)
+    screen.show()
+
+    rng = random.Random(args.seed)
+    prompts = [pg.get_random_prompt(rng.choice(('easy', 'hard'))) for _ in range(args.sessions)]
+    results['keystroke'] = {name: run_typist(screen, typist, prompts, random.Random(args.seed))
+                            for name, typist in TYPISTS.items()}
+    results['prompts_per_second'] = prompt_throughput(args.seconds)
+
+    for name, stats in results['keystroke'].items():
+        print(f"{name:<10} p50 {stats['p50_us']:8.1f} us   p99 {stats['p99_us']:8.1f} us"
+              f"   ({stats['events']:,} edits)")
+    for name, rate in results['prompts_per_second'].items():
+        print(f"prompts {name:<10} {rate:>12,.0f} /s")
+    for name, ms in results['startup'].items():
+        print(f"{name:<20} {ms:8.1f} ms")
+
+    report = {'commit': git_commit(), 'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'sessions': args.sessions, 'seed': args.seed, 'results': results}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.output}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+corpus_cache.py
+
+On-disk cache for a cleaned corpus and its integer index arrays, so the
+Gutenberg cleanup and sentence-boundary scans only run when the source
+text (or the settings that shape the index) change.
+
+A cache file is a small header, the cleaned text stored at a fixed width
+per character (1, 2 or 4 bytes, whichever fits the widest character),
+the named int64 arrays and finally a table locating each array. That
+order lets CacheWriter stream a file front to back: text as it is
+cleaned, arrays spooled to temporary files meanwhile, the table last.
+The file is memory-mapped on load: arrays come back as memoryviews and
+any text slice can be decoded without touching the rest of the file.
+"""
+
+import os
+import mmap
+import shutil
+import struct
+import hashlib
+import tempfile
+from array import array
+
+MAGIC   = b"TECACHE\0"
+VERSION = 2
+
+# magic, version, key digest, char width, text length (chars), array count,
+# table offset
+HEADER = struct.Struct("<8sI32sIQIQ")
+# array name, element count, byte offset
+ENTRY  = struct.Struct("<24sQQ")
+
+CODECS = {1: "latin-1", 2: "utf-16-le", 4: "utf-32-le"}
+ALIGN  = 8
+
+def cache_key(path: str, *settings) -> bytes:
+    """
+    Digest of the source file's size and modification time plus any
+    settings the index depends on. Hashing the contents instead would
+    mean reading every book of a large library on each start.
+    """
+    st = os.stat(path)
+    return hashlib.sha256(repr((VERSION, st.st_size, st.st_mtime_ns) + settings).encode()).digest()
+
+def cache_path_for(source_path: str) -> str:
+    """files/moby_dick.txt -> files/.cache/moby_dick.cache"""
+    folder, name = os.path.split(source_path)
+    return os.path.join(folder, ".cache", os.path.splitext(name)[0] + ".cache")
+
+def fallback_cache_path_for(source_path: str) -> str:
+    """Where to cache a book whose own folder is read-only: the temp directory."""
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    tag = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:8]
+    return os.path.join(tempfile.gettempdir(), "typing-test-cache", f"{name}-{tag}.cache")
+
+def char_width(text: str) -> int:
+    widest = max(text, key=ord, default="\0")
+    return 1 if ord(widest) < 0x100 else 2 if ord(widest) < 0x10000 else 4
+
+def _pad(n: int) -> int:
+    return -n % ALIGN
+
+TEXT_OFFSET = HEADER.size + _pad(HEADER.size)
+
+class CachedCorpus:
+    """A memory-mapped cache file: named arrays plus random access to the text."""
+
+    def __init__(self, mm, width, text_offset, text_len, arrays):
+        self._mm = mm
+        self._view = memoryview(mm)
+        self.width = width
+        self.codec = CODECS[width]
+        self.text_offset = text_offset
+        self.text_len = text_len
+        self.arrays = arrays
+
+    def __len__(self):
+        return self.text_len
+
+    def slice(self, start: int, end: int) -> str:
+        """Decode text[start:end] straight from the mapping."""
+        start = max(0, min(start, self.text_len))
+        end   = max(start, min(end, self.text_len))
+        base  = self.text_offset
+        return str(self._view[base + start * self.width:base + end * self.width], self.codec)
+
+    def text(self) -> str:
+        return self.slice(0, self.text_len)
+
+def load(cache_path: str, key: bytes):
+    """Map `cache_path` and return a CachedCorpus, or None if missing or stale."""
+    try:
+        with open(cache_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, version, digest, width, text_len, count, table = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION or digest != key or width not in CODECS:
+            mm.close()
+            return None
+        if TEXT_OFFSET + text_len * width > len(mm) or table + count * ENTRY.size > len(mm):
+            raise ValueError("truncated cache")
+        view = memoryview(mm)
+        arrays = {}
+        for i in range(count):
+            raw_name, length, offset = ENTRY.unpack_from(mm, table + i * ENTRY.size)
+            if offset + 8 * length > table:
+                raise ValueError("truncated cache")
+            arrays[raw_name.rstrip(b"\0").decode()] = view[offset:offset + 8 * length].cast("q")
+        return CachedCorpus(mm, width, TEXT_OFFSET, text_len, arrays)
+    except (struct.error, ValueError, TypeError):
+        mm.close()
+        return None
+
+class ArraySpool:
+    """An append-only int64 array that spills to a temporary file as it grows."""
+    BUFFER = 1 << 16
+
+    def __init__(self, folder=None):
+        self.file = tempfile.TemporaryFile(dir=folder)
+        self.buffer = array("q")
+        self.spilled = 0
+
+    def __len__(self):
+        return self.spilled + len(self.buffer)
+
+    def append(self, value: int) -> None:
+        self.buffer.append(value)
+        if len(self.buffer) >= self.BUFFER:
+            self._spill()
+
+    def _spill(self):
+        self.buffer.tofile(self.file)
+        self.spilled += len(self.buffer)
+        del self.buffer[:]
+
+    def read(self) -> array:
+        """The whole array in memory; only for arrays known to be small."""
+        self._spill()
+        self.file.seek(0)
+        values = array("q")
+        values.frombytes(self.file.read())
+        return values
+
+    def copy_to(self, f) -> None:
+        self._spill()
+        self.file.seek(0)
+        shutil.copyfileobj(self.file, f, 1 << 20)
+
+    def close(self) -> None:
+        self.file.close()
+
+class CacheWriter:
+    """
+    Writes a cache file front to back. Text goes straight to the file;
+    arrays are either given whole (add_array) or appended to spools while
+    the text is still being written (spool). commit() appends the arrays
+    and the table and renames the file into place, so a reader never sees
+    a half-written cache. Use as a context manager to clean up on errors.
+    """
+
+    def __init__(self, cache_path: str, key: bytes, width: int):
+        self.cache_path = cache_path
+        self.key = key
+        self.width = width
+        self.codec = CODECS[width]
+        self.text_len = 0
+        self.arrays = {}        # name -> array or ArraySpool, in file order
+        folder = os.path.dirname(cache_path)
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.tmp = f"{cache_path}.{os.getpid()}.tmp"
+        self.file = open(self.tmp, "w+b")
+        self.file.write(b"\0" * TEXT_OFFSET)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+    def write_text(self, text: str) -> None:
+        self.file.write(text.encode(self.codec))
+        self.text_len += len(text)
+
+    def read_text(self, start: int = 0, end: int = None) -> str:
+        """
+        text[start:end] of the text written so far; the whole of it only
+        for corpora known to be small.
+        """
+        end = self.text_len if end is None else max(0, min(end, self.text_len))
+        start = max(0, min(start, end))
+        self.file.flush()
+        self.file.seek(TEXT_OFFSET + start * self.width)
+        text = self.file.read((end - start) * self.width).decode(self.codec)
+        self.file.seek(0, os.SEEK_END)
+        return text
+
+    def spool(self, name: str) -> ArraySpool:
+        spool = self.arrays[name] = ArraySpool(self.folder)
+        return spool
+
+    def add_array(self, name: str, values) -> None:
+        self.arrays[name] = array("q", values)
+
+    def commit(self) -> None:
+        f = self.file
+        f.seek(0, os.SEEK_END)
+        table = []
+        for name, values in self.arrays.items():
+            f.write(b"\0" * _pad(f.tell()))
+            offset = f.tell()
+            if isinstance(values, ArraySpool):
+                values.copy_to(f)
+            else:
+                values.tofile(f)
+            table.append(ENTRY.pack(name.encode(), len(values), offset))
+        table_offset = f.tell()
+        f.write(b"".join(table))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, self.key, self.width, self.text_len,
+                            len(table), table_offset))
+        self._close()
+        os.replace(self.tmp, self.cache_path)
+
+    def abort(self) -> None:
+        self._close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+    def _close(self):
+        self.file.close()
+        for values in self.arrays.values():
+            if isinstance(values, ArraySpool):
+                values.close()
+
+def save(cache_path: str, key: bytes, text: str, arrays: dict) -> bool:
+    """
+    Write `text` and `arrays` (name -> sequence of ints) to `cache_path`.
+    Returns False if it could not be written (e.g. a read-only install);
+    callers just skip caching then.
+    """
+    try:
+        with CacheWriter(cache_path, key, char_width(text)) as writer:
+            writer.write_text(text)
+            for name, values in arrays.items():
+                writer.add_array(name, values)
+            writer.commit()
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+corpus_ingest.py
+
+Streams a Gutenberg-style text file into a corpus cache without holding
+the book in memory. The file is memory-mapped and its header and footer
+found with byte searches; the body is then decoded and its whitespace
+collapsed a chunk at a time. Each cleaned chunk goes straight into the
+cache file while its sentence boundaries, quotes and [[ ]] artifacts are
+scanned, and a prompt span is written out as soon as its end is seen.
+Only positions within the last MAX_LEN characters are kept, so peak
+memory depends on the chunk size, not on the size of the book.
+"""
+
+import os
+import re
+import mmap
+import codecs
+import bisect
+
+import corpus_cache
+
+CHUNK_BYTES = 1 << 20
+BUCKETS = ('easy', 'hard', 'clean')
+
+# Gutenberg has used both wordings over the years
+START_RE = re.compile(rb"\*\*\* START OF (?:THE|THIS) PROJECT GUTENBERG EBOOK")
+END_RE   = re.compile(rb"\*\*\* END OF (?:THE|THIS) PROJECT GUTENBERG EBOOK")
+# Any whitespace run other than a lone space; replacing those with " " is
+# the same as collapsing every run, with far fewer substitutions
+WS_RE    = re.compile(r"\s{2,}|[^\S ]")
+
+# In cleaned text every run of whitespace is one space, so a sentence ends
+# at the space after . ! or ?
+BOUNDARY_RE = re.compile(r"[.!?] ")
+QUOTE_RE    = re.compile(r'["“”]')
+ARTIFACT_RE = re.compile(r'\[\[|\]\]')
+
+# ─── Cleaning ────────────────────────────────────────────────────────────────
+
+def _legacy_bytes(error):
+    # Many Gutenberg files are cp1252 or Latin-1 rather than UTF-8; bytes
+    # that are not UTF-8 are read as cp1252 (Latin-1 where it has a gap),
+    # which keeps a stream one pass even if a book mixes encodings
+    bad = error.object[error.start:error.end]
+    return "".join(bytes([b]).decode('cp1252', errors='ignore') or chr(b) for b in bad), error.end
+
+codecs.register_error('typing-legacy', _legacy_bytes)
+
+# A page fault may map in a whole large folio around the faulting page,
+# including pages already dropped; dropping this much behind catches those
+DROP_SLACK = 1 << 21
+
+def _drop(mm, lo, hi):
+    """Tell the kernel we are done with bytes [lo, hi) of a read-only map."""
+    if hasattr(mm, 'madvise') and hi > lo:
+        lo = max(0, lo - DROP_SLACK)
+        lo -= lo % mmap.PAGESIZE
+        mm.madvise(mmap.MADV_DONTNEED, lo, hi - lo)
+
+def _search(data, pattern, start=0, window=CHUNK_BYTES):
+    """pattern.search(data, start) a window at a time, dropping the pages read."""
+    overlap = 128   # longer than any marker, so none is missed across windows
+    pos = start
+    while True:
+        stop = min(pos + window, len(data))
+        m = pattern.search(data, pos, stop)
+        if m or stop == len(data):
+            return m
+        _drop(data, pos, stop - overlap)
+        pos = stop - overlap
+
+def body_range(data):
+    """(start, end) byte offsets of the text between the Gutenberg header and footer."""
+    start = 0
+    m = _search(data, START_RE)
+    if m:
+        start = data.find(b"\n", m.end()) + 1
+    m = _search(data, END_RE, start)
+    end = m.start() if m else len(data)
+    return start, end
+
+def _decoded(path, chunk_bytes):
+    """The body of `path` as str pieces, decoded from a memory map (UTF-8, else cp1252)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start, end = body_range(mm)
+            decoder = codecs.getincrementaldecoder('utf-8')('typing-legacy')
+            for pos in range(start, end, chunk_bytes):
+                stop = min(pos + chunk_bytes, end)
+                yield decoder.decode(mm[pos:stop])
+                _drop(mm, pos, stop)
+            yield decoder.decode(b"", final=True)
+
+def iter_clean(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield the cleaned body text of `path` in non-empty pieces: header and
+    footer removed, whitespace runs collapsed to one space, stripped.
+    A trailing space is held back until the next piece shows whether the
+    text goes on, so runs split between chunks still collapse.
+    """
+    started = pending = False
+    for piece in _decoded(path, chunk_bytes):
+        piece = WS_RE.sub(" ", piece)
+        if not started:
+            piece = piece.lstrip(" ")
+        if not piece:
+            continue
+        if pending and piece[0] != " ":
+            piece = " " + piece
+        pending = piece[-1] == " "
+        if pending:
+            piece = piece[:-1]
+        if piece:
+            started = True
+            yield piece
+
+# ─── Span Scanning ───────────────────────────────────────────────────────────
+
+def _contains(positions, lo, hi):
+    """True if the sorted list `positions` has any value in [lo, hi)."""
+    i = bisect.bisect_left(positions, lo)
+    return i < len(positions) and positions[i] < hi
+
+class SpanScanner:
+    """
+    Finds sentence boundaries and prompt spans in cleaned text fed to it a
+    piece at a time, appending them to the spools of a CacheWriter under
+    the names SpanIndex and Corpus load them by. Spans come out ordered
+    by end, then start.
+    """
+
+    def __init__(self, writer, min_len, max_len):
+        self.min_len = min_len
+        self.max_len = max_len
+        self.sentence_starts = writer.spool('sentence_starts')
+        self.sentence_ends = writer.spool('sentence_ends')
+        self.buckets = {name: (writer.spool(f'{name}_starts'), writer.spool(f'{name}_ends'))
+                        for name in BUCKETS}
+        self.offset = 0         # characters fed so far
+        self.last = ""          # the last of them, for matches across pieces
+        self.artifact_end = 0   # where the last [[ or ]] ended
+        # recent positions a span ending later may still reach
+        self.starts, self.quotes, self.artifacts = [0], [], []
+        self.sentence_starts.append(0)
+
+    def feed(self, piece: str) -> None:
+        base = self.offset
+        joined = self.last + piece
+        shift = base - len(self.last)   # position of joined[0]
+        self.quotes.extend(base + m.start() for m in QUOTE_RE.finditer(piece))
+        # Artifacts don't overlap ("[[[" is one), so resume after the last one
+        for m in ARTIFACT_RE.finditer(joined, max(0, self.artifact_end - shift)):
+            self.artifacts.append(shift + m.start())
+            self.artifact_end = shift + m.end()
+        for m in BOUNDARY_RE.finditer(joined):
+            end = shift + m.end() - 1
+            self._emit(end)
+            self.sentence_ends.append(end)
+            self.sentence_starts.append(end + 1)
+            self.starts.append(end + 1)
+        self.offset += len(piece)
+        self.last = piece[-1:]
+        # Later ends are at or past offset, so nothing before this matters
+        keep = self.offset - self.max_len
+        for positions in (self.starts, self.quotes, self.artifacts):
+            del positions[:bisect.bisect_left(positions, keep)]
+
+    def _emit(self, end):
+        lo = bisect.bisect_left(self.starts, end - self.max_len)
+        hi = bisect.bisect_right(self.starts, end - self.min_len)
+        for start in self.starts[lo:hi]:
+            # an artifact at p spans [p, p + 2), so it must start before end - 1
+            if _contains(self.artifacts, start, end - 1):
+                continue
+            kind = 'hard' if _contains(self.quotes, start, end) else 'easy'
+            for name in (kind, 'clean'):
+                self.buckets[name][0].append(start)
+                self.buckets[name][1].append(end)
+
+# ─── Ingestion ───────────────────────────────────────────────────────────────
+
+def ingest(path, cache_path, key, min_len, max_len, extra=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Build the cache for `path` at `cache_path` in two streaming passes:
+    one for the widest character (which fixes the cache's text width),
+    one to clean and write the text, boundaries and spans. `extra(writer)`
+    may add more arrays before the file is committed. Raises OSError if
+    the cache cannot be written.
+    """
+    # uncleaned text may hold wider whitespace than the result; a wider
+    # cache than needed is still correct
+    widest = max((max(piece, default="\0") for piece in _decoded(path, chunk_bytes)),
+                 default="\0")
+    with corpus_cache.CacheWriter(cache_path, key, corpus_cache.char_width(widest)) as writer:
+        scanner = SpanScanner(writer, min_len, max_len)
+        for piece in iter_clean(path, chunk_bytes):
+            writer.write_text(piece)
+            scanner.feed(piece)
+        if extra is not None:
+            extra(writer)
+        writer.commit()
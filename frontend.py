@@ -1,65 +1,156 @@
 import sys
 import os
+import math
 import random
 import time
-import traceback
-from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout, QSizePolicy,
+import html
+from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout,
+                             QSizePolicy,
                              QLabel, QStackedWidget, QTextEdit, QRadioButton, QCheckBox, 
-                             QLineEdit)
-from PyQt5.QtGui import QTextCursor, QTextCharFormat, QColor, QFont, QIcon
-from PyQt5.QtCore import Qt, QTimer
-from backend import get_random_prompt, save_to_leaderboard
-from PyQt5.QtWidgets import QGraphicsOpacityEffect
+                             QLineEdit, QTableView, QComboBox, QAbstractItemView, QHeaderView,
+                             QMessageBox)
+from PyQt5.QtGui import (QTextCursor, QTextCharFormat, QColor, QFont, QIcon, QKeySequence,
+                         QFontMetrics)
+from PyQt5.QtCore import Qt, QTimer, QAbstractTableModel, QModelIndex
+# backend defers its own heavy imports (the corpus, SQLite, the scoring
+# service) to first use, so importing it costs the first frame nothing
+from backend import (next_prompt, prefetch, prompt_ready, save_to_leaderboard,
+                     leaderboard_page, clear_leaderboard, save_session, typing_stats,
+                     passage_scores, set_marathon_length, user_stats, percentile_rank,
+                     leaderboard_version, SCORING_URL, close_service)
+from typing_engine import KeystrokeEvaluator, HighlightTracker, LineWrapper
+from keystroke_log import KeystrokeRecorder, BACKSPACE
+import metrics
+from metrics import timed
+from PyQt5.QtWidgets import QGraphicsOpacityEffect, QShortcut
 from PyQt5.QtCore import QPropertyAnimation
 
 def fade_in_widget(widget, duration=500):
-    effect = QGraphicsOpacityEffect()
-    widget.setGraphicsEffect(effect)
-
-    animation = QPropertyAnimation(effect, b"opacity")
+    # The effect and animation are made on the first fade and replayed after
+    # that. A finished fade turns the effect off, since while it is on every
+    # repaint of the widget is drawn offscreen first.
+    animation = getattr(widget, "_fade_animation", None)
+    if animation is None:
+        effect = QGraphicsOpacityEffect(widget)
+        widget.setGraphicsEffect(effect)
+        animation = QPropertyAnimation(effect, b"opacity", widget)
+        animation.setStartValue(0)
+        animation.setEndValue(1)
+        animation.finished.connect(lambda: effect.setEnabled(False))
+        widget._fade_animation = animation
+    animation.stop()
     animation.setDuration(duration)
-    animation.setStartValue(0)
-    animation.setEndValue(1)
+    animation.targetObject().setEnabled(True)
     animation.start()
-    widget._fade_animation = animation
-
-
-LEADERBOARD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "files", "leaderboard.txt")
 
 def excepthook(type, value, tb):
+    import traceback
     print("".join(traceback.format_exception(type, value, tb)))
 
 sys.excepthook = excepthook
 
+# One stylesheet for the whole app, set on the QApplication and parsed once;
+# rules for a single screen are scoped by its object name
+APP_STYLE = """
+    QWidget {
+        background-color: #001f3f;
+        color: white;
+    }
+    QPushButton {
+        background-color: white;
+        color: #001f3f;
+        font-size: 16px;
+        padding: 8px;
+        border-radius: 8px;
+    }
+    QPushButton:hover {
+        background-color: #cccccc;
+    }
+    #TypingScreen QLabel, #ResultsScreen QLabel, #LeaderboardScreen QLabel,
+    #StatisticsScreen QLabel {
+        font-size: 16px;
+    }
+    #TitleScreen QPushButton {
+        font-size: 18px;
+        padding: 10px;
+        margin: 5px;
+    }
+    #SettingsScreen QRadioButton, #SettingsScreen QCheckBox {
+        font-size: 16px;
+        padding: 5px;
+    }
+    #SettingsScreen QPushButton {
+        padding: 6px;
+    }
+    #TypingScreen QLabel {
+        padding: 4px;
+    }
+    #TypingScreen QTextEdit {
+        background-color: white;
+        color: black;
+        font-size: 16px;
+        padding: 10px;
+        border-radius: 8px;
+    }
+    QLabel#promptDisplay {
+        color: White;
+        font-size: 18px;
+    }
+    #ResultsScreen QLineEdit {
+        background-color: white;
+        color: black;
+        font-size: 16px;
+        padding: 8px;
+        border-radius: 8px;
+    }
+    #LeaderboardScreen QComboBox, #LeaderboardScreen QTableView {
+        background-color: white;
+        color: black;
+        font-size: 14px;
+        border-radius: 8px;
+    }
+    #LeaderboardScreen QHeaderView::section {
+        background-color: #cccccc;
+        color: #001f3f;
+        font-weight: bold;
+        padding: 4px;
+    }
+    QPushButton#clearButton {
+        background-color: #e74c3c;
+        color: white;
+    }
+"""
+
 # Settings
 settings = {
     "difficulty": "easy",
+    "marathon": 0,          # sentences per marathon, 0 for a whole chapter
     "show_timer": True,
     "show_wpm": True
 }
 
+# Prompts longer than this (marathons) are shown and typed a line at a
+# time: the prompt label holds a window of lines around the caret and the
+# textbox only the line being typed, so a keystroke costs the same in a
+# chapter as in a sentence
+WINDOW_CHARS = 1000
+WINDOW_BEFORE = 1       # typed lines kept in view
+WINDOW_AFTER = 5        # lines shown after the current one
+
+# Difficulty tiers (prompt_generator.TIERS), easiest first; the names are
+# repeated here so that the first frame doesn't wait on importing the corpus
+TIERS = ("novice", "intermediate", "advanced", "expert")
+TIER_ICONS = ("🌱", "🌿", "🌳", "🏔")
+
+REFRESH_MS = 2000       # how often an open leaderboard looks for new scores
+
 class TitleScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="TitleScreen")
     def __init__(self, stacked_widget):
         super().__init__()
         self.stacked_widget = stacked_widget
 
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #001f3f;
-                color: white;
-            }
-            QPushButton {
-                background-color: white;
-                color: #001f3f;
-                font-size: 18px;
-                padding: 10px;
-                margin: 5px;
-                border-radius: 8px;
-            }
-            QPushButton:hover {
-                background-color: #cccccc;
-            }
-        """)
+        self.setObjectName("TitleScreen")    # for its rules in APP_STYLE
 
         layout = QVBoxLayout()
         layout.setSpacing(20)
@@ -73,10 +164,12 @@ class TitleScreen(QWidget):
         self.start_btn = QPushButton("🚀 Start Typing")
         self.settings_btn = QPushButton("⛭ Settings")
         self.history_btn = QPushButton("📜 Leaderboard")
+        self.stats_btn = QPushButton("📊 Statistics")
 
         layout.addWidget(self.start_btn)
         layout.addWidget(self.settings_btn)
         layout.addWidget(self.history_btn)
+        layout.addWidget(self.stats_btn)
 
         self.setLayout(layout)
 
@@ -86,42 +179,36 @@ class TitleScreen(QWidget):
             self.stacked_widget.widget(4).load_scores(),
             self.stacked_widget.setCurrentIndex(4)
         ])
+        self.stats_btn.clicked.connect(lambda: [
+            self.stacked_widget.widget(5).load_stats(),
+            self.stacked_widget.setCurrentIndex(5)
+        ])
 
     def go_to_typing(self):
-        self.stacked_widget.widget(1).load_prompt()
+        try:
+            self.stacked_widget.widget(1).load_prompt()
+        except OSError as e:
+            # prompts come from an unreachable scoring server
+            QMessageBox.warning(self, "No prompt", f"The scoring server is unavailable:\n{e}")
+            return
         self.stacked_widget.setCurrentIndex(1)
     def showEvent(self, event):
         fade_in_widget(self)
+        # Load the book and a few prompts in the background while the title
+        # screen fades in
+        prefetch(settings["difficulty"])
 
 
 
 class SettingsScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="SettingsScreen")
     def __init__(self, stacked_widget):
         super().__init__()
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #001f3f;
-                color: white;
-            }
-            QRadioButton, QCheckBox {
-                font-size: 16px;
-                padding: 5px;
-            }
-            QPushButton {
-                background-color: white;
-                color: #001f3f;
-                font-size: 16px;
-                padding: 6px;
-                border-radius: 8px;
-            }
-            QPushButton:hover {
-                background-color: #cccccc;
-            }
-        """)
+        self.setObjectName("SettingsScreen")
         self.stacked_widget = stacked_widget
 
         layout = QVBoxLayout()
-        layout.setSpacing(15)
+        layout.setSpacing(10)
         layout.setContentsMargins(40, 30, 40, 30)
 
         header = QLabel("⛭ Settings")
@@ -135,10 +222,34 @@ class SettingsScreen(QWidget):
 
         self.easy_radio = QRadioButton("Easy")
         self.hard_radio = QRadioButton("Hard")
+        self.training_radio = QRadioButton("Training (drills your weakest keys)")
+        self.marathon_radio = QRadioButton("Marathon")
+        self.tier_radio = QRadioButton("By level")
+        self.tier_radio.setToolTip("Ranked by punctuation, digits, capitals, word length "
+                                   "and rare words")
         self.easy_radio.setChecked(True)
 
+        self.tier_box = QComboBox()
+        for icon, tier in zip(TIER_ICONS, TIERS):
+            self.tier_box.addItem(f"{icon} {tier.title()}", tier)
+        self.tier_box.setEnabled(False)
+
+        self.marathon_box = QComboBox()
+        self.marathon_box.addItem("A whole chapter", 0)
+        for sentences in (25, 50, 100, 200):
+            self.marathon_box.addItem(f"{sentences} sentences", sentences)
+        self.marathon_box.setEnabled(False)
+
         layout.addWidget(self.easy_radio)
         layout.addWidget(self.hard_radio)
+        layout.addWidget(self.training_radio)
+        for radio, box in ((self.marathon_radio, self.marathon_box),
+                           (self.tier_radio, self.tier_box)):
+            row = QHBoxLayout()
+            radio.setMinimumWidth(120)      # line the two boxes up
+            row.addWidget(radio)
+            row.addWidget(box, 1)
+            layout.addLayout(row)
 
         self.timer_checkbox = QCheckBox("Show Timer")
         self.timer_checkbox.setChecked(True)
@@ -159,6 +270,11 @@ class SettingsScreen(QWidget):
         # Connect signals
         self.easy_radio.toggled.connect(self.update_settings)
         self.hard_radio.toggled.connect(self.update_settings)
+        self.training_radio.toggled.connect(self.update_settings)
+        self.marathon_radio.toggled.connect(self.update_settings)
+        self.marathon_box.currentIndexChanged.connect(self.update_settings)
+        self.tier_radio.toggled.connect(self.update_settings)
+        self.tier_box.currentIndexChanged.connect(self.update_settings)
         self.timer_checkbox.toggled.connect(self.update_settings)
         self.wpm_checkbox.toggled.connect(self.update_settings)
     def showEvent(self, event):
@@ -166,32 +282,29 @@ class SettingsScreen(QWidget):
 
 
     def update_settings(self):
-        settings["difficulty"] = "easy" if self.easy_radio.isChecked() else "hard"
+        if self.training_radio.isChecked():
+            settings["difficulty"] = "training"
+        elif self.marathon_radio.isChecked():
+            settings["difficulty"] = "marathon"
+        elif self.tier_radio.isChecked():
+            settings["difficulty"] = self.tier_box.currentData()
+        else:
+            settings["difficulty"] = "easy" if self.easy_radio.isChecked() else "hard"
         settings["show_timer"] = self.timer_checkbox.isChecked()
         settings["show_wpm"] = self.wpm_checkbox.isChecked()
+        settings["marathon"] = self.marathon_box.currentData()
+        self.marathon_box.setEnabled(self.marathon_radio.isChecked())
+        self.tier_box.setEnabled(self.tier_radio.isChecked())
+        set_marathon_length(settings["marathon"])
+        prefetch(settings["difficulty"])
 
 class TypingScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="TypingScreen")
     def __init__(self, stacked_widget):
         super().__init__()
         self.stacked_widget = stacked_widget
 
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #001f3f;
-                color: white;
-            }
-            QLabel {
-                font-size: 16px;
-                padding: 4px;
-            }
-            QTextEdit {
-                background-color: white;
-                color: black;
-                font-size: 16px;
-                padding: 10px;
-                border-radius: 8px;
-            }
-        """)
+        self.setObjectName("TypingScreen")
 
         self.layout = QVBoxLayout()
         self.layout.setSpacing(15)
@@ -207,37 +320,155 @@ class TypingScreen(QWidget):
         self.time_label = QLabel("Time: 0:00")
         self.time_label.setFont(QFont("Arial", 16))
 
+        self.prompt = None      # PromptHandle of the current passage
         self.prompt_text = ""
         self.typed_text = ""
-        self.error_indices = set()
+        self.evaluator = KeystrokeEvaluator()
+        self.painter = HighlightTracker()
+        # The textbox holds prompt positions [segment_start, segment_end):
+        # all of it, or in windowed mode (see WINDOW_CHARS) line
+        # `line_index` of `lines`
+        self.lines = None
+        self.line_index = 0
+        self.segment_start = 0
+        self.segment_end = 0
+        self.recorder = KeystrokeRecorder()
+        self.fmt_correct = QTextCharFormat()
+        self.fmt_correct.setForeground(QColor("black"))
+        self.fmt_wrong = QTextCharFormat()
+        self.fmt_wrong.setForeground(QColor("red"))
         self.start_time = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_timer)
 
+        # Racing (see join_race): the server's client, the race being typed
+        # and everyone's last known position in it
+        self.race = None
+        self.race_id = None
+        self.racers = {}
+        self.race_positions = {}
+        self.race_timer = QTimer()
+        self.race_timer.timeout.connect(self.poll_race)
+        self.race_label = QLabel()
+        self.race_label.setFont(QFont("Arial", 14))
+        self.race_label.hide()
+
         self.prompt_display = QLabel()
         self.prompt_display.setWordWrap(True)
-        self.prompt_display.setStyleSheet("color: White; font-size: 18px;")
+        self.prompt_display.setObjectName("promptDisplay")
         self.prompt_display.setFont(QFont("Arial", 18, QFont.Bold))
         self.prompt_display.setAlignment(Qt.AlignLeft | Qt.AlignTop)
 
         self.textbox = QTextEdit()
+        self.textbox.setAcceptRichText(False)
+        self.document = self.textbox.document()
+        self.highlighting = False
+        self.document.contentsChange.connect(self.on_contents_change)
         self.textbox.textChanged.connect(self.on_text_changed)
 
         self.layout.addWidget(self.prompt_display)
+        self.layout.addWidget(self.race_label)
         self.layout.addWidget(self.wpm_label)
         self.layout.addWidget(self.time_label)
         self.layout.addWidget(self.textbox)
 
         self.setLayout(self.layout)
 
-    def load_prompt(self):
-        self.prompt_text = get_random_prompt(settings["difficulty"])
-        self.prompt_display.setText(self.prompt_text)
+    def load_prompt(self, prompt=None, text=None):
+        """
+        Start a test on `prompt` (a PromptHandle, to replay a passage) or a
+        new one. `text` is the prompt's text when it is already known (a
+        race prompt, which may come from a book this machine doesn't have).
+        """
+        if prompt is not None:
+            self.prompt = prompt
+        elif prompt_ready(settings["difficulty"]):
+            self.prompt = next_prompt(settings["difficulty"])
+        else:
+            # Nothing prefetched yet (e.g. Start clicked while the book is
+            # still loading); generate one here
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                self.prompt = next_prompt(settings["difficulty"])
+            finally:
+                QApplication.restoreOverrideCursor()
+        self.prompt_text = text if text is not None else self.prompt.text
+        self.start_time = None
         self.textbox.clear()
+        self.evaluator.reset(self.prompt_text)
+        self.painter.reset()
+        if len(self.prompt_text) > WINDOW_CHARS:
+            self.lines = LineWrapper(self.prompt_text, self.window_width())
+            self.show_line(0)
+        else:
+            self.lines = None
+            self.segment_start, self.segment_end = 0, len(self.prompt_text)
+            self.prompt_display.setTextFormat(Qt.PlainText)
+            self.prompt_display.setText(self.prompt_text)
+        # a race's or a server's passage may be from a book this machine lacks
+        self.recorder.start(self.prompt_text, settings["difficulty"], self.prompt,
+                            keep_text=text is not None or bool(SCORING_URL))
         self.start_time = time.time()
-        self.error_indices = set()
         self.timer.start(1000)
 
+    @property
+    def error_indices(self):
+        return self.evaluator.error_indices
+
+    def window_width(self) -> int:
+        # characters that fit on a line of the prompt label; the average
+        # width undercounts capitals and wide letters, hence the margin
+        margins = self.layout.contentsMargins()
+        width = self.width() - margins.left() - margins.right()
+        char_width = QFontMetrics(self.prompt_display.font()).averageCharWidth()
+        return max(20, int(0.85 * width / char_width))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # the first prompt is wrapped before the screen is laid out, and
+        # the window may be resized mid-test
+        if self.lines is not None and self.lines.width != self.window_width():
+            # typed lines stay as they were, and so does the one being typed
+            # once it has text, so the textbox never holds more than its line
+            first = self.line_index + (1 if self.textbox.toPlainText() else 0)
+            self.lines.rewrap(first, self.window_width())
+            self.show_line(self.line_index)
+
+    def show_line(self, i):
+        """Make line i the one typed in the textbox and show the lines around it."""
+        self.line_index = i
+        self.segment_start, self.segment_end = self.lines.line(i)
+        prompt, errors = self.prompt_text, self.evaluator.error_indices
+        red = "<span style='color:#e74c3c'>{}</span>"
+        window = []
+        for k in range(max(0, i - WINDOW_BEFORE), i + WINDOW_AFTER + 1):
+            line = self.lines.line(k)
+            if line is None:
+                break
+            if k < i:
+                # typed: dimmed, with its mistakes in red
+                text = "".join(red.format(html.escape(prompt[j])) if j in errors
+                               else html.escape(prompt[j]) for j in range(*line))
+                text = f"<span style='color:#7f8c9d'>{text}</span>"
+            else:
+                text = html.escape(prompt[line[0]:line[1]])
+                if k == i:
+                    text = f"<u>{text}</u>"
+            window.append(text)
+        self.prompt_display.setTextFormat(Qt.RichText)
+        self.prompt_display.setText("<br>".join(window))
+
+    def next_line(self):
+        # A typed line is final: empty the textbox for the next one without
+        # that counting as an edit
+        self.highlighting = True
+        self.textbox.blockSignals(True)
+        self.textbox.clear()
+        self.textbox.blockSignals(False)
+        self.highlighting = False
+        self.painter.reset()
+        self.show_line(self.line_index + 1)
+
     def update_timer(self):
         if self.start_time:
             elapsed = int(time.time() - self.start_time)
@@ -245,89 +476,148 @@ class TypingScreen(QWidget):
             seconds = elapsed % 60
             self.time_label.setText(f"Time: {minutes}:{seconds:02d}")
 
+    def on_contents_change(self, position, removed, added):
+        # Only remember where the text changed; on_text_changed does the work
+        # once the edit is complete. Our own formatting passes are ignored.
+        if not self.highlighting:
+            self.evaluator.mark(self.segment_start + position, removed, added)
+            self.painter.edit(position, removed, added)
+            if self.start_time:
+                self.record_keys(position, removed, added)
+
+    def record_keys(self, position, removed, added):
+        prompt, offset = self.prompt_text, self.segment_start
+        # Cutting the overflow past the prompt is not a keystroke
+        if removed and offset + position < self.segment_end:
+            self.recorder.record(offset + position, BACKSPACE, True)
+        end = min(position + added, self.document.characterCount() - 1, self.segment_end - offset)
+        for i in range(position, end):
+            char = self.document.characterAt(i)
+            self.recorder.record(offset + i, char, char == prompt[offset + i])
+
+    @timed("typing_text_changed_seconds", "Handling an edit of the typed text")
     def on_text_changed(self):
         if not self.start_time:
             return
-        typed = self.textbox.toPlainText()
-
-        if len(typed) > len(self.prompt_text):
-            self.textbox.blockSignals(True)
-            self.textbox.setPlainText(typed[:len(self.prompt_text)])
-            self.textbox.blockSignals(False)
+        # characterCount() includes the trailing paragraph separator;
+        # `length` counts the lines typed before this one too
+        offset = self.segment_start
+        length = offset + self.document.characterCount() - 1
+
+        if length > self.segment_end:
+            # Drop the overflow; that edit re-enters this handler
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(self.segment_end - offset)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
             return
 
-        self.typed_text = typed
-
-        for i in range(len(typed)):
-            if typed[i] != self.prompt_text[i] and i not in self.error_indices:
-                self.error_indices.add(i)
+        char_at = self.document.characterAt
+        if offset:
+            char_at = lambda i: self.document.characterAt(i - offset)
+        lo, hi = self.evaluator.apply(length, char_at)
 
         elapsed_minutes = max((time.time() - self.start_time) / 60, 0.01)
-        wpm = int((len(typed) / 5) / elapsed_minutes)
+        wpm = int((length / 5) / elapsed_minutes)
         self.wpm_label.setText(f"WPM: {wpm}")
 
-        self.update_highlight()
+        self.update_highlight(lo - offset, hi - offset)
+
+        if self.race_id is not None:
+            self.race.progress(self.race_id, length, len(self.error_indices))
 
-        if len(typed) == len(self.prompt_text):
+        if self.evaluator.complete:
+            self.typed_text = self.textbox.toPlainText()
             self.timer.stop()
             duration = int(time.time() - self.start_time)
+            self.start_time = None  # ignore anything typed after the finish
+            save_session(self.recorder, wpm, len(self.error_indices))
+            racing = self.race_id is not None
+            if racing:
+                # the server times the race and records the result
+                self.race.finish(self.race_id, len(self.error_indices))
+                self.race_id = None
             results_screen = self.stacked_widget.widget(3)
-            results_screen.set_stats(wpm, len(self.error_indices), duration)
+            results_screen.set_stats(wpm, len(self.error_indices), duration, self.prompt, racing,
+                                     self.prompt_text)
             self.stacked_widget.setCurrentIndex(3)
-
-    def update_highlight(self):
+        elif length == self.segment_end:
+            self.next_line()
+
+    def join_race(self, client):
+        """Take part in the races of `client` (a race_client.RaceClient)."""
+        self.race = client
+        self.race_label.setText("🏎 Waiting for the next race...")
+        self.race_label.show()
+        self.race_timer.start(50)
+
+    def poll_race(self):
+        moved = False
+        for message in self.race.poll():
+            kind = message.get("type")
+            if kind == "race":
+                self.race_id = message["race"]
+                self.racers = message["players"]
+                self.race_positions = {}
+                self.stacked_widget.setCurrentIndex(1)
+                from prompt_generator import PromptHandle
+                prompt = PromptHandle(message["corpus"], message["start"], message["end"])
+                self.load_prompt(prompt, message["text"])
+            elif kind == "tick" and message["race"] == self.race_id:
+                self.race_positions.update(message["pos"])
+                moved = True
+            elif kind == "lobby":
+                self.race_label.setText(f"🏎 Next race in {message['starts_in']:.0f} s "
+                                        f"with {message['players']} racers")
+            elif kind == "results":
+                if message["race"] == self.race_id:
+                    self.race_id = None     # over before we finished
+                self.stacked_widget.widget(3).show_race_result(["🏎 Race results"] + [
+                    f"{s['place']}. {s['name']} — {s['wpm']} WPM, {s['mistakes']} mistakes"
+                    for s in message["standings"][:5]])
+                self.race_label.setText("🏎 Waiting for the next race...")
+            elif kind == "rejected":
+                self.stacked_widget.widget(3).show_race_result(
+                    [f"🏎 Not counted: {message['reason']}"])
+            elif kind == "closed":
+                self.race_timer.stop()
+                self.race_id = None
+                self.race_label.setText("🏎 Disconnected from the race server")
+        if moved and self.race_id is not None:
+            leaders = sorted(self.race_positions.items(), key=lambda item: -item[1])[:4]
+            self.race_label.setText("🏎 " + "   ".join(
+                f"{self.racers.get(pid, '?')} {pos * 100 // len(self.prompt_text)}%"
+                for pid, pos in leaders))
+
+    @timed("typing_highlight_seconds", "Repainting mistake colors after an edit")
+    def update_highlight(self, lo, hi):
+        """Repaint the runs in [lo, hi) of the textbox whose mistake color changed."""
+        offset = self.segment_start
+        self.painter.resize(self.evaluator.length - offset)
+        runs = list(self.painter.runs(lo, hi, self.evaluator.error_indices, offset))
+        if not runs:
+            return
+        self.highlighting = True
         self.textbox.blockSignals(True)
-        cursor = self.textbox.textCursor()
+        cursor = QTextCursor(self.document)
         cursor.beginEditBlock()
-
-        text = self.textbox.toPlainText()
-        fmt_correct = QTextCharFormat()
-        fmt_correct.setForeground(QColor("black"))
-
-        fmt_wrong = QTextCharFormat()
-        fmt_wrong.setForeground(QColor("red"))
-
-        cursor.setPosition(0)
-        for i in range(len(text)):
-            cursor.setPosition(i)
-            cursor.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor)
-            fmt = fmt_wrong if i in self.error_indices else fmt_correct
-            cursor.mergeCharFormat(fmt)
-
+        for start, end, wrong in runs:
+            cursor.setPosition(start)
+            cursor.setPosition(end, QTextCursor.KeepAnchor)
+            cursor.mergeCharFormat(self.fmt_wrong if wrong else self.fmt_correct)
         cursor.endEditBlock()
         self.textbox.blockSignals(False)
+        self.highlighting = False
+
+RACE_WAITING = "\n\n🏎 Waiting for the other racers..."
 
 class ResultsScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="ResultsScreen")
     def __init__(self, stacked_widget):
         super().__init__()
         self.stacked_widget = stacked_widget
 
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #001f3f;
-                color: white;
-            }
-            QLabel {
-                font-size: 16px;
-            }
-            QLineEdit {
-                background-color: white;
-                color: black;
-                font-size: 16px;
-                padding: 8px;
-                border-radius: 8px;
-            }
-            QPushButton {
-                background-color: white;
-                color: #001f3f;
-                font-size: 16px;
-                padding: 8px;
-                border-radius: 8px;
-            }
-            QPushButton:hover {
-                background-color: #cccccc;
-            }
-        """)
+        self.setObjectName("ResultsScreen")
 
         layout = QVBoxLayout()
         layout.setSpacing(15)
@@ -347,9 +637,13 @@ class ResultsScreen(QWidget):
         self.name_input.setPlaceholderText("Enter your name...")
         layout.addWidget(self.name_input)
 
-        submit_btn = QPushButton("📋 Submit to Leaderboard")
-        submit_btn.clicked.connect(self.submit_score)
-        layout.addWidget(submit_btn)
+        self.submit_btn = QPushButton("📋 Submit to Leaderboard")
+        self.submit_btn.clicked.connect(self.submit_score)
+        layout.addWidget(self.submit_btn)
+
+        replay_btn = QPushButton("🔁 Same Passage Again")
+        replay_btn.clicked.connect(self.replay)
+        layout.addWidget(replay_btn)
 
         back_btn = QPushButton("🔙 Back to Start")
         back_btn.clicked.connect(self.go_home)
@@ -360,51 +654,172 @@ class ResultsScreen(QWidget):
         self.wpm = 0
         self.mistakes = 0
         self.duration = 0
+        self.prompt = None
+        self.prompt_text = None
     def showEvent(self, event):
         fade_in_widget(self)
 
-    def set_stats(self, wpm, mistakes, duration):
+    def set_stats(self, wpm, mistakes, duration, prompt=None, race=False, prompt_text=None):
         self.wpm = wpm
         self.mistakes = mistakes
         self.duration = duration
-        self.stats_label.setText(
-            f"🎯 Finished!\n\n🕒 Time: {duration} sec\n⌨️ WPM: {wpm}\n❌ Mistakes: {mistakes}"
-        )
+        self.prompt = prompt
+        self.prompt_text = prompt_text
+        text = f"🎯 Finished!\n\n🕒 Time: {duration} sec\n⌨️ WPM: {wpm}\n❌ Mistakes: {mistakes}"
+        try:
+            text += self.leaderboard_lines(wpm, prompt, race)
+        except OSError:
+            # a shared leaderboard's server is unreachable; the result still shows
+            text += "\n\n⚠️ Leaderboard unavailable"
+        if race:
+            text += RACE_WAITING
+        self.stats_label.setText(text)
+        # race results are recorded by the server
+        self.name_input.setVisible(not race)
+        self.submit_btn.setVisible(not race)
+
+    def leaderboard_lines(self, wpm, prompt, race):
+        text = ""
+        best = passage_scores(prompt, 1) if prompt else []
+        if best:
+            name, best_wpm, _, _ = best[0]
+            text += f"\n\n🏅 Best on this passage: {best_wpm} WPM by {name}"
+        if not race:
+            # reads a rollup kept as results are saved, not the results
+            difficulty = settings["difficulty"]
+            rank = percentile_rank(difficulty, wpm)
+            if rank is not None:
+                text += f"\n\n📈 Faster than {rank:.0f}% of {difficulty.title()} results"
+        return text
+
+    def show_race_result(self, lines):
+        text = self.stats_label.text().replace(RACE_WAITING, "")
+        self.stats_label.setText(text + "\n\n" + "\n".join(lines))
 
     def submit_score(self):
+        from scoring_service import ScoreRejected
         name = self.name_input.text().strip() or "Anonymous"
-        save_to_leaderboard(name, self.wpm, self.mistakes, settings["difficulty"])
+        try:
+            save_to_leaderboard(name, self.wpm, self.mistakes, settings["difficulty"], self.prompt)
+        except ScoreRejected as e:
+            self.stats_label.setText(self.stats_label.text() + f"\n\nScore not saved: {e}")
+            self.submit_btn.hide()
+            return
+        # the player's totals with this result in them: the read queues
+        # behind the submission (or, remotely, sends it first)
+        difficulty = settings["difficulty"]
+        text = f"\n\n✅ Saved as {name}"
+        try:
+            stats = user_stats(name, difficulty)
+        except OSError:
+            stats = None
+        if stats:
+            count, mean, best_wpm = stats
+            text += (f"\n👤 Best {best_wpm} WPM, average {mean:.0f} "
+                     f"over {count} {difficulty.title()} tests")
+        self.stats_label.setText(self.stats_label.text() + text)
+        # the next typist may be someone else
         self.name_input.clear()
-        self.go_home()
+        self.name_input.hide()
+        self.submit_btn.hide()
+
+    def replay(self):
+        if self.prompt is None:
+            return
+        # with the text typed, so a race's passage replays without its book
+        self.stacked_widget.widget(1).load_prompt(self.prompt, self.prompt_text)
+        self.stacked_widget.setCurrentIndex(1)
 
     def go_home(self):
-        self.stacked_widget.widget(4).load_scores()
         self.stacked_widget.setCurrentIndex(0)
 
+class LeaderboardModel(QAbstractTableModel):
+    """Leaderboard rows for one difficulty, fetched a page at a time as the view scrolls."""
+    HEADERS = ("#", "Name", "WPM", "Mistakes", "Date")
+    SORT_COLUMNS = {2: "wpm", 3: "mistakes", 4: "created_at"}
+    PAGE_SIZE = 100
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.difficulty = "easy"
+        self.sort_key = "wpm"
+        self.descending = True
+        self.rows = []
+        self.next_key = None
+        self.exhausted = True
+        self.failed = False     # the last page could not be read
+
+    def reload(self, difficulty=None):
+        self.beginResetModel()
+        if difficulty:
+            self.difficulty = difficulty
+        self.rows = []
+        self.next_key = None
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        _, name, wpm, mistakes, created_at = self.rows[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return index.row() + 1
+            if column == 4:
+                return time.strftime("%Y-%m-%d %H:%M", time.localtime(created_at))
+            return (None, name, wpm, mistakes)[column]
+        if role == Qt.TextAlignmentRole and column != 1:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent):
+        if parent.isValid() or self.exhausted:
+            return
+        try:
+            rows, self.next_key = leaderboard_page(self.difficulty, self.sort_key,
+                                                   self.descending, self.next_key, self.PAGE_SIZE)
+        except OSError:
+            # the scoring server is unreachable; called by the view, so no raising
+            self.exhausted = self.failed = True
+            return
+        self.failed = False
+        self.exhausted = self.next_key is None
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Sorting happens in the database; only indexed columns are sortable
+        if column not in self.SORT_COLUMNS:
+            return
+        self.sort_key = self.SORT_COLUMNS[column]
+        self.descending = order == Qt.DescendingOrder
+        self.reload()
+
 class LeaderboardScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="LeaderboardScreen")
     def __init__(self, stacked_widget):
         super().__init__()
         self.stacked_widget = stacked_widget
 
-        self.setStyleSheet("""
-            QWidget {
-                background-color: #001f3f;
-                color: white;
-            }
-            QLabel {
-                font-size: 16px;
-            }
-            QPushButton {
-                background-color: white;
-                color: #001f3f;
-                font-size: 16px;
-                padding: 8px;
-                border-radius: 8px;
-            }
-            QPushButton:hover {
-                background-color: #cccccc;
-            }
-        """)
+        self.setObjectName("LeaderboardScreen")
 
         layout = QVBoxLayout()
         layout.setSpacing(15)
@@ -415,14 +830,37 @@ class LeaderboardScreen(QWidget):
         header.setAlignment(Qt.AlignCenter)
         layout.addWidget(header)
 
-        self.board = QLabel("Scores will load here.")
+        self.difficulty_box = QComboBox()
+        self.difficulty_box.addItem("📗 Easy Mode", "easy")
+        self.difficulty_box.addItem("📘 Hard Mode", "hard")
+        self.difficulty_box.addItem("🎯 Training", "training")
+        self.difficulty_box.addItem("🏃 Marathon", "marathon")
+        for icon, tier in zip(TIER_ICONS, TIERS):
+            self.difficulty_box.addItem(f"{icon} {tier.title()}", tier)
+        # the index is dropped here: with TYPING_METRICS on, load_scores is a
+        # wrapper taking any arguments, and PyQt would pass it along
+        self.difficulty_box.currentIndexChanged.connect(lambda _index: self.load_scores())
+        layout.addWidget(self.difficulty_box)
+
+        self.model = LeaderboardModel(self)
+        self.board = QTableView()
+        self.board.setModel(self.model)
         self.board.setFont(QFont("Courier New", 14))  # Monospaced font for scores
-        self.board.setAlignment(Qt.AlignLeft | Qt.AlignTop)
-        self.board.setWordWrap(True)
+        self.board.verticalHeader().hide()
+        self.board.setSelectionMode(QAbstractItemView.NoSelection)
+        self.board.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.board.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.board.horizontalHeader().setSortIndicator(2, Qt.DescendingOrder)
+        self.board.horizontalHeader().setSortIndicatorShown(True)
+        self.board.horizontalHeader().sectionClicked.connect(self.sort_by)
         layout.addWidget(self.board)
 
+        self.status = QLabel("")
+        self.status.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.status)
+
         clear_btn = QPushButton("🧹 Clear Leaderboard")
-        clear_btn.setStyleSheet("background-color: #e74c3c; color: white;")
+        clear_btn.setObjectName("clearButton")
         clear_btn.clicked.connect(self.clear_leaderboard)
         layout.addWidget(clear_btn)
 
@@ -432,45 +870,227 @@ class LeaderboardScreen(QWidget):
 
         self.setLayout(layout)
 
+        # Scores from other copies of the app sharing the leaderboard show
+        # up while it is open; polling is cheap, a reload only if they changed
+        self.version = None
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    @timed("typing_load_scores_seconds", "Reloading the leaderboard table")
     def load_scores(self):
-        if os.path.exists(LEADERBOARD_FILE):
-            with open(LEADERBOARD_FILE, 'r') as f:
-                lines = [line.strip() for line in f if line.strip()]
-            easy_scores = [line for line in lines if line.lower().startswith("easy")]
-            hard_scores = [line for line in lines if line.lower().startswith("hard")]
-
-            content = ""
-            if easy_scores:
-                content += "📗 Easy Mode:\n" + "\n".join(easy_scores) + "\n\n"
-            if hard_scores:
-                content += "📘 Hard Mode:\n" + "\n".join(hard_scores)
-            self.board.setText(content)
-        else:
-            self.board.setText("Leaderboard is empty.")
+        # Only the first page is read; the view pulls more as it scrolls
+        self.version = leaderboard_version()
+        self.model.reload(self.difficulty_box.currentData())
+        self.status.setText("Leaderboard unavailable." if self.model.failed else
+                            "" if self.model.rows else "Leaderboard is empty.")
+
+    def sort_by(self, column):
+        header = self.board.horizontalHeader()
+        if column not in LeaderboardModel.SORT_COLUMNS:
+            # Put the indicator back on the column the rows are sorted by
+            current = next(c for c, key in LeaderboardModel.SORT_COLUMNS.items()
+                           if key == self.model.sort_key)
+            header.setSortIndicator(current, Qt.DescendingOrder if self.model.descending
+                                    else Qt.AscendingOrder)
+            return
+        if LeaderboardModel.SORT_COLUMNS[column] != self.model.sort_key:
+            # A newly picked column starts in its natural order (best WPM first,
+            # fewest mistakes first, newest first)
+            from leaderboard_store import SORTS
+            natural_desc = SORTS[LeaderboardModel.SORT_COLUMNS[column]][0]
+            header.setSortIndicator(column, Qt.DescendingOrder if natural_desc
+                                    else Qt.AscendingOrder)
+        self.model.sort(column, header.sortIndicatorOrder())
+
+    def refresh(self):
+        version = leaderboard_version()
+        if version is not None and version != self.version:
+            self.load_scores()
+
     def showEvent(self, event):
         fade_in_widget(self)
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
 
     def clear_leaderboard(self):
-        open(LEADERBOARD_FILE, 'w').close()
-        self.board.setText("Leaderboard cleared.")
+        try:
+            clear_leaderboard()
+        except OSError:
+            self.status.setText("Leaderboard unavailable.")
+            return
+        self.load_scores()
+        self.status.setText("Leaderboard cleared.")
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    stacked_widget = QStackedWidget()
+class StatisticsScreen(QWidget):
+    @timed("typing_screen_init_seconds", "Building a screen", screen="StatisticsScreen")
+    def __init__(self, stacked_widget):
+        super().__init__()
+        self.stacked_widget = stacked_widget
 
-    title_screen = TitleScreen(stacked_widget)
-    typing_screen = TypingScreen(stacked_widget)
-    settings_screen = SettingsScreen(stacked_widget)
-    results_screen = ResultsScreen(stacked_widget)
-    leaderboard_screen = LeaderboardScreen(stacked_widget)
+        self.setObjectName("StatisticsScreen")
 
-    stacked_widget.addWidget(title_screen)       # 0
-    stacked_widget.addWidget(typing_screen)      # 1
-    stacked_widget.addWidget(settings_screen)    # 2
-    stacked_widget.addWidget(results_screen)     # 3
-    stacked_widget.addWidget(leaderboard_screen) # 4
+        layout = QVBoxLayout()
+        layout.setSpacing(15)
+        layout.setContentsMargins(40, 30, 40, 30)
+
+        header = QLabel("📊 Statistics")
+        header.setFont(QFont("Arial", 22, QFont.Bold))
+        header.setAlignment(Qt.AlignCenter)
+        layout.addWidget(header)
 
+        self.board = QLabel("Statistics will load here.")
+        self.board.setFont(QFont("Courier New", 14))
+        self.board.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.board.setWordWrap(True)
+        layout.addWidget(self.board)
+
+        back_btn = QPushButton("🔙 Back to Menu")
+        back_btn.clicked.connect(lambda: self.stacked_widget.setCurrentIndex(0))
+        layout.addWidget(back_btn)
+
+        self.setLayout(layout)
+
+    def load_stats(self):
+        try:
+            stats = typing_stats()
+        except ImportError:
+            self.board.setText("Install NumPy to see typing statistics:\n\n    pip install numpy")
+            return
+        except Exception as e:
+            # one bad file must not leave the button doing nothing
+            self.board.setText(f"Statistics could not be loaded:\n\n{e}")
+            return
+        if not stats.sessions:
+            self.board.setText("No finished tests yet. Complete a test to see statistics.")
+            return
+
+        def keys(rows, unit):
+            return ", ".join(f"'{key.replace(' ', '␣')}' {value:{unit}}" for key, value, _ in rows)
+
+        spread = math.sqrt(stats.consistency[-1]) if stats.consistency[-1] >= 0 else 0
+        lines = [
+            f"Tests: {stats.sessions}   Keystrokes: {stats.keystrokes:,}",
+            f"WPM: average {stats.wpm.mean():.0f}, last 10 {stats.wpm_trend(10)[-1]:.0f}, "
+            f"best {stats.wpm.max():.0f}",
+            f"Accuracy: {(1 - stats.error_rate) * 100:.1f}%",
+            f"Rhythm (last test): ±{spread:.0f} ms between keys",
+            "",
+            f"🐢 Slowest keys:  {keys(stats.chars.top('latency'), '.0f')} ms",
+            f"❌ Missed keys:   {keys(stats.chars.top('error_rate'), '.0%')}",
+            f"🐢 Slowest pairs: {keys(stats.bigrams.top('latency'), '.0f')} ms",
+            f"❌ Missed pairs:  {keys(stats.bigrams.top('error_rate'), '.0%')}",
+        ]
+        self.board.setText("\n".join(lines))
+    def showEvent(self, event):
+        fade_in_widget(self)
+
+class LazyStack(QStackedWidget):
+    """
+    A QStackedWidget whose pages are built the first time they are needed:
+    widget(i) and setCurrentIndex(i) build page i from factories[i] (called
+    with the stack) in place of an empty placeholder.
+    """
+
+    def __init__(self, factories):
+        super().__init__()
+        self.factories = list(factories)
+        for _ in self.factories:
+            self.addWidget(QWidget())
+
+    def built(self, index: int) -> bool:
+        return self.factories[index] is None
+
+    def widget(self, index: int):
+        if not self.built(index):
+            factory, self.factories[index] = self.factories[index], None
+            placeholder = super().widget(index)
+            self.insertWidget(index, factory(self))
+            self.removeWidget(placeholder)
+            placeholder.deleteLater()
+        return super().widget(index)
+
+    def setCurrentIndex(self, index: int) -> None:
+        self.widget(index)
+        super().setCurrentIndex(index)
+
+# Page order of the LazyStack; screens refer to each other by these indices
+SCREENS = (TitleScreen,         # 0
+           TypingScreen,        # 1
+           SettingsScreen,      # 2
+           ResultsScreen,       # 3
+           LeaderboardScreen,   # 4
+           StatisticsScreen)    # 5
+
+class MetricsOverlay(QLabel):
+    """Debug overlay toggled with F12: the metrics histograms, refreshed twice a second."""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 200); color: #7fff7f;"
+                           "font-family: monospace; font-size: 11px; padding: 6px;")
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        QShortcut(QKeySequence(Qt.Key_F12), window, self.toggle)
+        self.hide()
+
+    def toggle(self):
+        if self.isVisible():
+            self.timer.stop()
+            self.hide()
+        else:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.timer.start(500)
+
+    def refresh(self):
+        def ms(seconds):
+            return f"{seconds * 1000:8.3f}" if seconds != math.inf else "     inf"
+        lines = [f"{'(ms)':<34}{'calls':>7}{'p50 ≤':>9}{'p99 ≤':>9}{'mean':>9}"]
+        for hist in metrics.histograms():
+            name = hist.name.removeprefix("typing_").removesuffix("_seconds")
+            name += "".join(f" {value}" for value in hist.labels.values())
+            mean = hist.sum / hist.count if hist.count else 0.0
+            lines.append(f"{name[:34]:<34}{hist.count:>7} {ms(hist.quantile(0.5))}"
+                         f" {ms(hist.quantile(0.99))} {ms(mean)}")
+        self.setText("\n".join(lines))
+        self.adjustSize()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Typing Trainer')
+    parser.add_argument('--race', metavar='HOST:PORT',
+                        help='Join the races of a race_server.py on this address')
+    parser.add_argument('--name', default=os.environ.get('USER') or 'Anonymous',
+                        help='Name shown to the other racers')
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
+    app.setStyleSheet(APP_STYLE)
+
+    # Only the title screen is built before the window first shows
+    stacked_widget = LazyStack(SCREENS)
+    stacked_widget.setCurrentIndex(0)
     stacked_widget.resize(700, 480)
+    if metrics.ENABLED:
+        MetricsOverlay(stacked_widget)
+
+    if args.race:
+        from race_client import RaceClient, parse_address
+        stacked_widget.widget(1).join_race(RaceClient(*parse_address(args.race), args.name))
+
+    def save_queued_scores():
+        # submissions are sent in the background; give them a moment, and
+        # say so rather than drop them silently
+        lost = close_service()
+        if lost:
+            QMessageBox.warning(None, "Scores not saved",
+                                f"{lost} score{'s' if lost > 1 else ''} could not reach the "
+                                f"scoring server and {'were' if lost > 1 else 'was'} not saved.")
+    app.aboutToQuit.connect(save_queued_scores)
 
     stacked_widget.show()
     sys.exit(app.exec_())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+keystroke_log.py
+
+Records every keystroke of a typing session as (monotonic timestamp,
+position, char, correct) into preallocated typed arrays, and writes each
+finished session to a compact binary file (13 bytes per keystroke).
+
+Deletions are recorded as BACKSPACE at the position the text was cut.
+
+Session file layout (little-endian):
+  header   magic, version, count, started (unix time), duration, wpm,
+           mistakes, difficulty length, prompt length
+  handle   corpus id length, start, end (version 2 only)
+  strings  difficulty, corpus id, prompt (UTF-8); a session with a handle
+           stores no prompt text unless its book may be missing later (a
+           race's); otherwise it is sliced from the corpus when needed
+  arrays   microseconds since the previous keystroke (uint32; the first
+           is since the session started), positions (uint32), code
+           points (uint32), correct flags (uint8)
+"""
+
+import os
+import sys
+import time
+import struct
+from array import array
+from itertools import accumulate
+
+MAGIC     = b"TESESS\0\0"
+VERSION   = 2
+BACKSPACE = "\b"
+MAX_INTERVAL = 0xFFFFFFFF   # microseconds; intervals are stored as uint32
+
+HEADER = struct.Struct("<8sIIddIIII")
+HANDLE = struct.Struct("<IQQ")
+
+_clock = time.perf_counter
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+class KeystrokeRecorder:
+    """
+    Keystroke buffer for one session. The arrays are allocated up front
+    and only grow (by doubling) when a session outruns them, so record()
+    is a handful of index stores.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.times     = array("d", bytes(8 * capacity))
+        self.positions = array("I", bytes(4 * capacity))
+        self.chars     = array("I", bytes(4 * capacity))
+        self.correct   = bytearray(capacity)
+        self.count = 0
+        self.prompt = ""
+        self.handle = None
+        self.keep_text = False
+        self.difficulty = ""
+        self.started = 0.0
+        self.clock_start = 0.0
+
+    def start(self, prompt: str, difficulty: str, handle=None, keep_text: bool = False) -> None:
+        """
+        Begin a new session, reusing the buffers of the last one. `handle`
+        is the prompt's (corpus id, start, end), saved instead of its text
+        unless `keep_text` (a book this machine may not have, such as a
+        race's).
+        """
+        self.prompt = prompt
+        self.handle = handle
+        self.keep_text = keep_text
+        self.difficulty = difficulty
+        self.count = 0
+        self.started = time.time()
+        self.clock_start = _clock()
+        # Room for typing the prompt plus a fair number of corrections
+        while self.capacity < 2 * len(prompt):
+            self._grow()
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        self.times.extend(self.times)
+        self.positions.extend(self.positions)
+        self.chars.extend(self.chars)
+        self.correct.extend(self.correct)
+        self.capacity *= 2
+
+    def record(self, position: int, char: str, correct: bool) -> None:
+        i = self.count
+        if i == self.capacity:
+            self._grow()
+        self.times[i] = _clock()
+        self.positions[i] = position
+        self.chars[i] = ord(char)
+        self.correct[i] = correct
+        self.count = i + 1
+
+    def save(self, path: str, wpm: int, mistakes: int) -> str:
+        """
+        Write the session to `path` and return it. The file is written
+        beside it and renamed into place, so it is never left half-written.
+        """
+        n = self.count
+        duration = (self.times[n - 1] - self.clock_start) if n else 0.0
+        stamps = [int((t - self.clock_start) * 1e6) for t in self.times[:n]]
+        # a pause over MAX_INTERVAL (71 minutes, e.g. a test left open)
+        # is stored as that long
+        intervals = array("I", (min(b - a, MAX_INTERVAL) for a, b in zip([0] + stamps, stamps)))
+        difficulty = self.difficulty.encode("utf-8")
+        if self.handle:
+            corpus_id, start, end = self.handle
+            corpus_id = corpus_id.encode("utf-8")
+            prompt = self.prompt.encode("utf-8") if self.keep_text else b""
+        else:
+            corpus_id, start, end, prompt = b"", 0, 0, self.prompt.encode("utf-8")
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp = path + ".tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, n, self.started, duration,
+                                    wpm, mistakes, len(difficulty), len(prompt)))
+                f.write(HANDLE.pack(len(corpus_id), start, end))
+                f.write(difficulty)
+                f.write(corpus_id)
+                f.write(prompt)
+                for values in (intervals, self.positions[:n], self.chars[:n]):
+                    _little_endian(values).tofile(f)
+                f.write(self.correct[:n])
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+            raise
+        return path
+
+class Session:
+    """A session read back from disk; arrays are indexed by keystroke."""
+
+    def __init__(self, started, duration, wpm, mistakes, difficulty, prompt,
+                 intervals, positions, chars, correct, handle=None):
+        self.started = started
+        self.duration = duration
+        self.wpm = wpm
+        self.mistakes = mistakes
+        self.difficulty = difficulty
+        self._prompt = prompt
+        self.handle = handle            # (corpus id, start, end) or None
+        self.intervals = intervals      # microseconds since the previous keystroke
+        self.positions = positions
+        self.chars = chars              # code points
+        self.correct = correct
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @property
+    def prompt(self) -> str:
+        if self._prompt is None:
+            from prompt_generator import PromptHandle
+            self._prompt = PromptHandle(*self.handle).text
+        return self._prompt
+
+    @property
+    def offsets(self):
+        """Microseconds from the session start to each keystroke."""
+        return array("Q", accumulate(self.intervals))
+
+def load_session(path: str) -> Session:
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, n, started, duration, wpm, mistakes, dlen, plen = \
+        HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"{path} is not a session file")
+    pos = HEADER.size
+    clen = start = end = 0
+    if version >= 2:
+        clen, start, end = HANDLE.unpack_from(data, pos)
+        pos += HANDLE.size
+    difficulty = data[pos:pos + dlen].decode("utf-8")
+    pos += dlen
+    corpus_id = data[pos:pos + clen].decode("utf-8")
+    pos += clen
+    prompt = data[pos:pos + plen].decode("utf-8")
+    pos += plen
+    handle = (corpus_id, start, end) if corpus_id else None
+    if len(data) < pos + 13 * n:
+        raise ValueError(f"{path} is truncated")
+    columns = []
+    for typecode in ("I", "I", "I"):
+        values = array(typecode)
+        values.frombytes(data[pos:pos + 4 * n])
+        columns.append(_little_endian(values))
+        pos += 4 * n
+    correct = bytearray(data[pos:pos + n])
+    return Session(started, duration, wpm, mistakes, difficulty,
+                   None if handle and not plen else prompt, *columns, correct, handle)
+
+def session_filename(started: float) -> str:
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + \
+        f"-{int(started * 1000) % 1000:03d}.kss"
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+leaderboard_store.py
+
+SQLite-backed leaderboard. Results live in one indexed table so the
+leaderboard screen can ask for the top N of a difficulty directly instead
+of re-reading and filtering a text file, and so it stays fast with
+millions of stored results.
+
+Each result may record the passage it was typed on as a prompt handle
+(corpus id, start, end), which gives every passage its own leaderboard.
+
+Two rollups are kept up to date in the same transaction as each insert,
+so neither is ever recomputed from the results:
+
+  user_stats   count, WPM total and best WPM per name and difficulty
+  wpm_counts   how many results of a difficulty have each WPM, from
+               which percentile() ranks a WPM by summing at most one
+               row per distinct WPM (0-300 once validated), however
+               many results there are
+
+The old files/leaderboard.txt format ("Easy - name - WPM: 65, Mistakes: 0")
+is imported once, the first time a store is opened next to it.
+"""
+
+import os
+import re
+import time
+import sqlite3
+from collections import Counter
+
+LEGACY_LINE_RE = re.compile(r"^(\w+) - (.*) - WPM: (\d+), Mistakes: (\d+)$")
+
+# Sortable columns: (primary column descending by default, tie-break columns).
+# Each matches one index, so a page is an index seek however deep it is.
+SORTS = {
+    "wpm":        (True,  ("mistakes", "created_at", "id")),
+    "mistakes":   (False, ("created_at", "id")),
+    "created_at": (True,  ("id",)),
+}
+
+NO_PROMPT = (None, None, None)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id         INTEGER PRIMARY KEY,
+    name       TEXT    NOT NULL,
+    difficulty TEXT    NOT NULL,
+    wpm        INTEGER NOT NULL,
+    mistakes   INTEGER NOT NULL,
+    created_at REAL    NOT NULL,
+    prompt_corpus TEXT,
+    prompt_start  INTEGER,
+    prompt_end    INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_by_wpm
+    ON results (difficulty, wpm DESC, mistakes, created_at);
+CREATE INDEX IF NOT EXISTS results_by_mistakes
+    ON results (difficulty, mistakes, created_at);
+CREATE INDEX IF NOT EXISTS results_by_date
+    ON results (difficulty, created_at DESC);
+CREATE TABLE IF NOT EXISTS user_stats (
+    name       TEXT    NOT NULL,
+    difficulty TEXT    NOT NULL,
+    count      INTEGER NOT NULL,
+    total_wpm  INTEGER NOT NULL,
+    best_wpm   INTEGER NOT NULL,
+    PRIMARY KEY (name, difficulty)
+);
+CREATE TABLE IF NOT EXISTS wpm_counts (
+    difficulty TEXT    NOT NULL,
+    wpm        INTEGER NOT NULL,
+    count      INTEGER NOT NULL,
+    PRIMARY KEY (difficulty, wpm)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class LeaderboardStore:
+    """A leaderboard database at `path`, created on first use."""
+
+    def __init__(self, path: str):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Databases from before prompt handles lack the passage columns
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(results)")}
+        with self.conn:
+            for column, kind in (("prompt_corpus", "TEXT"), ("prompt_start", "INTEGER"),
+                                 ("prompt_end", "INTEGER")):
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE results ADD COLUMN {column} {kind}")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_by_passage ON results "
+                "(prompt_corpus, prompt_start, prompt_end, wpm DESC, mistakes, created_at) "
+                "WHERE prompt_corpus IS NOT NULL")
+            # Databases from before the rollups: build them from the results once
+            if not self._meta("rollups_built"):
+                self.conn.execute("DELETE FROM user_stats")
+                self.conn.execute("DELETE FROM wpm_counts")
+                self.conn.execute(
+                    "INSERT INTO user_stats SELECT name, difficulty, COUNT(*), SUM(wpm), "
+                    "MAX(wpm) FROM results GROUP BY name, difficulty")
+                self.conn.execute(
+                    "INSERT INTO wpm_counts SELECT difficulty, wpm, COUNT(*) FROM results "
+                    "GROUP BY difficulty, wpm")
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                  ("rollups_built", "1"))
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ── Writes ───────────────────────────────────────────────────────────
+
+    def add(self, name: str, wpm: int, mistakes: int, difficulty: str,
+            created_at: float = None, prompt=None) -> None:
+        self.add_many([(name, wpm, mistakes, difficulty, created_at, prompt)])
+
+    def add_many(self, rows) -> int:
+        """
+        Insert (name, wpm, mistakes, difficulty[, created_at[, prompt]])
+        tuples in a single transaction; prompt is a (corpus id, start, end)
+        handle or None. Returns the number of rows written.
+        """
+        with self.conn:
+            return self._insert(rows)
+
+    def _insert(self, rows) -> int:
+        now = time.time()
+        records = [(name, difficulty.lower(), int(wpm), int(mistakes),
+                    now if not rest or rest[0] is None else rest[0],
+                    *(rest[1] if len(rest) > 1 and rest[1] else NO_PROMPT))
+                   for name, wpm, mistakes, difficulty, *rest in rows]
+        self.conn.executemany(
+            "INSERT INTO results (name, difficulty, wpm, mistakes, created_at, "
+            "prompt_corpus, prompt_start, prompt_end) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+        self._roll_up(records)
+        return len(records)
+
+    def _roll_up(self, records):
+        # summed per key first, so a batch costs one upsert per name and
+        # difficulty and one per distinct WPM, not one per result
+        users = {}
+        for name, difficulty, wpm, *_ in records:
+            count, total, best = users.get((name, difficulty), (0, 0, wpm))
+            users[name, difficulty] = (count + 1, total + wpm, max(best, wpm))
+        self.conn.executemany(
+            "INSERT INTO user_stats (name, difficulty, count, total_wpm, best_wpm) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (name, difficulty) DO UPDATE SET "
+            "count = count + excluded.count, total_wpm = total_wpm + excluded.total_wpm, "
+            "best_wpm = MAX(best_wpm, excluded.best_wpm)",
+            [(*key, *values) for key, values in users.items()])
+        self.conn.executemany(
+            "INSERT INTO wpm_counts (difficulty, wpm, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (difficulty, wpm) DO UPDATE SET count = count + excluded.count",
+            [(*key, count) for key, count in
+             Counter((difficulty, wpm) for _, difficulty, wpm, *_ in records).items()])
+
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM results")
+            self.conn.execute("DELETE FROM user_stats")
+            self.conn.execute("DELETE FROM wpm_counts")
+
+    # ── Reads ────────────────────────────────────────────────────────────
+
+    def top(self, difficulty: str, limit: int = 10):
+        """Best results of a difficulty as (name, wpm, mistakes, created_at) rows."""
+        return self.conn.execute(
+            "SELECT name, wpm, mistakes, created_at FROM results "
+            "WHERE difficulty = ? ORDER BY wpm DESC, mistakes, created_at, id LIMIT ?",
+            (difficulty.lower(), limit)).fetchall()
+
+    def passage_top(self, prompt, limit: int = 10):
+        """Best results on one passage (a (corpus id, start, end) handle), as in top()."""
+        corpus, start, end = prompt
+        return self.conn.execute(
+            "SELECT name, wpm, mistakes, created_at FROM results "
+            "WHERE prompt_corpus = ? AND prompt_start = ? AND prompt_end = ? "
+            "ORDER BY wpm DESC, mistakes, created_at, id LIMIT ?",
+            (corpus, start, end, limit)).fetchall()
+
+    def page(self, difficulty: str, sort: str = "wpm", reverse: bool = False,
+             after=None, limit: int = 50):
+        """
+        One page of a difficulty's results in `sort` order (see SORTS),
+        flipped if `reverse`. Pass the returned key as `after` to get the
+        next page; it is None once there are no more rows. Uses keyset
+        pagination, so deep pages cost the same as the first one.
+        Rows are (id, name, wpm, mistakes, created_at).
+        """
+        descending, ties = SORTS[sort]
+        if reverse:
+            descending = not descending
+        step, tie_step = ("<" if descending else ">"), ("<" if reverse else ">")
+        tie_order = "DESC" if reverse else "ASC"
+
+        where, params = "difficulty = ?", [difficulty.lower()]
+        if after is not None:
+            # The bound on the primary column alone lets SQLite seek the
+            # index; the row-value test then skips past ties already shown
+            where += (f" AND {sort} {step}= ? AND ({sort} {step} ? OR "
+                      f"({', '.join(ties)}) {tie_step} ({', '.join('?' * len(ties))}))")
+            params += [after[0], after[0], *after[1:]]
+        order = f"{sort} {'DESC' if descending else 'ASC'}, " + \
+                ", ".join(f"{col} {tie_order}" for col in ties)
+        rows = self.conn.execute(
+            f"SELECT id, name, wpm, mistakes, created_at FROM results "
+            f"WHERE {where} ORDER BY {order} LIMIT ?", (*params, limit)).fetchall()
+        if len(rows) < limit:
+            return rows, None
+        last = dict(zip(("id", "name", "wpm", "mistakes", "created_at"), rows[-1]))
+        return rows, tuple(last[col] for col in (sort, *ties))
+
+    def user_stats(self, name: str, difficulty: str):
+        """(count, mean WPM, best WPM) of `name`'s results at a difficulty, or None."""
+        row = self.conn.execute(
+            "SELECT count, total_wpm, best_wpm FROM user_stats WHERE name = ? AND difficulty = ?",
+            (name, difficulty.lower())).fetchone()
+        if not row:
+            return None
+        count, total, best = row
+        return count, total / count, best
+
+    def percentile(self, difficulty: str, wpm: int):
+        """Percentage of a difficulty's results slower than `wpm`, or None if it has none."""
+        below, total = self.conn.execute(
+            "SELECT TOTAL(CASE WHEN wpm < ? THEN count END), TOTAL(count) FROM wpm_counts "
+            "WHERE difficulty = ?", (wpm, difficulty.lower())).fetchone()
+        return 100.0 * below / total if total else None
+
+    def count(self, difficulty: str = None) -> int:
+        if difficulty is None:
+            return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM results WHERE difficulty = ?",
+                                 (difficulty.lower(),)).fetchone()[0]
+
+    # ── Legacy import ────────────────────────────────────────────────────
+
+    def import_legacy(self, path: str) -> int:
+        """
+        Import a leaderboard.txt once; later calls for the same store are
+        no-ops. Lines that do not match the old format are skipped.
+        Returns the number of results imported.
+        """
+        if self._meta("legacy_imported") or not os.path.exists(path):
+            return 0
+        # The old format has no dates; the file's mtime stands in for them
+        when = os.path.getmtime(path)
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                m = LEGACY_LINE_RE.match(line.strip())
+                if m:
+                    difficulty, name, wpm, mistakes = m.groups()
+                    rows.append((name, int(wpm), int(mistakes), difficulty, when))
+        # Rows and the "done" marker commit together, so a crash mid-import
+        # cannot leave a half-imported board that is then imported again
+        with self.conn:
+            self._insert(rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                              ("legacy_imported", path))
+        return len(rows)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+
+Opt-in timing of the app's hot paths. Functions decorated with
+@timed(...) record how long each call takes in a fixed-size histogram;
+the histograms can be written out in Prometheus text format or read by
+the frontend's debug overlay (F12).
+
+Timing is off unless the TYPING_METRICS environment variable is set when
+the app starts:
+
+  TYPING_METRICS=1                    time, for the overlay only
+  TYPING_METRICS=/tmp/typing.prom     also write the file every
+                                      DUMP_INTERVAL seconds and on exit
+
+The decision is made when a function is decorated, so with timing off
+@timed returns the function itself and costs nothing per call.
+"""
+
+import os
+import time
+import bisect
+import atexit
+import threading
+import functools
+from time import perf_counter
+
+SETTING = os.environ.get("TYPING_METRICS", "")
+ENABLED = SETTING not in ("", "0")
+DUMP_PATH = SETTING if ENABLED and SETTING != "1" else None
+DUMP_INTERVAL = 10.0
+
+# Bucket upper bounds in seconds, from a fast keystroke to a cold book load
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ─── Histograms ──────────────────────────────────────────────────────────────
+
+class Histogram:
+    """Call durations in BUCKETS, plus their count and total, as Prometheus keeps them."""
+
+    def __init__(self, name: str, help: str, labels: dict):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.counts = [0] * (len(BUCKETS) + 1)     # the last is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last)."""
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        rank, seen = q * count, 0
+        for bound, n in zip(BUCKETS + (float("inf"),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def label_text(self, extra: dict = None) -> str:
+        labels = {**self.labels, **(extra or {})}
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+_histograms = {}        # (name, sorted label items) -> Histogram
+_registry_lock = threading.Lock()
+
+def histogram(name: str, help: str = "", **labels) -> Histogram:
+    """The histogram `name` with these labels, created on first use."""
+    key = (name, tuple(sorted(labels.items())))
+    with _registry_lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(name, help, labels)
+    return hist
+
+def histograms() -> list:
+    with _registry_lock:
+        return sorted(_histograms.values(), key=lambda h: (h.name, h.label_text()))
+
+def timed(name: str, help: str = "", **labels):
+    """
+    Decorator recording each call's duration in histogram(name, help, **labels),
+    or, with timing off, leaving the function as it is.
+    """
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+        hist = histogram(name, help, **labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(perf_counter() - start)
+        return wrapper
+    return decorate
+
+# ─── Export ──────────────────────────────────────────────────────────────────
+
+def render() -> str:
+    """Every histogram in the Prometheus text exposition format."""
+    lines = []
+    seen = set()
+    for hist in histograms():
+        if hist.name not in seen:
+            seen.add(hist.name)
+            lines.append(f"# HELP {hist.name} {hist.help}")
+            lines.append(f"# TYPE {hist.name} histogram")
+        with hist.lock:
+            counts, count, total = list(hist.counts), hist.count, hist.sum
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f"{hist.name}_bucket{hist.label_text({'le': repr(bound)})} {cumulative}")
+        lines.append(f"{hist.name}_bucket{hist.label_text({'le': '+Inf'})} {count}")
+        lines.append(f"{hist.name}_sum{hist.label_text()} {total!r}")
+        lines.append(f"{hist.name}_count{hist.label_text()} {count}")
+    return "\n".join(lines) + "\n"
+
+def dump(path: str) -> None:
+    """Write render() to `path`, replacing it atomically so a scraper never sees half."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+def _dump_quietly():
+    try:
+        dump(DUMP_PATH)
+    except OSError:
+        pass
+
+def _dump_periodically():
+    while True:
+        time.sleep(DUMP_INTERVAL)
+        _dump_quietly()
+
+if DUMP_PATH:
+    threading.Thread(target=_dump_periodically, name="metrics-dump", daemon=True).start()
+    atexit.register(_dump_quietly)
@@ -5,88 +5,747 @@ prompt_generator.py
 Generates a typing prompt by sampling a snippet aligned to full sentences
 (190–210 characters), always starting at a sentence boundary and ending
 exactly at a sentence boundary. “Hard” prompts must contain quotation marks.
+Spans are also ranked into TIERS by a difficulty score computed once per
+book when it is ingested (see span_features.py).
+Training prompts are the spans richest in a given set of bigrams/trigrams.
+Marathon prompts are a whole chapter, or a chosen number of sentences.
+
+A prompt is identified by a PromptHandle (corpus id plus start/end offsets
+into the cleaned text); its text is only sliced out when it is needed.
 
 Usage:
   • Import get_random_prompt(difficulty) in your backend.
+  • Or get_training_prompt({'th': 2.0, 'ing': 1.5}) to drill key combinations.
+  • Or get_marathon_handle() for a chapter, get_marathon_handle(50) for 50 sentences.
   • Or run standalone: python prompt_generator.py --difficulty hard
+                       python prompt_generator.py --difficulty expert
+                       python prompt_generator.py --drill th,wh,ing
+                       python prompt_generator.py --marathon 50
+  • Or in bulk, as JSONL: python prompt_generator.py --count 100000 --seed 7 --workers 4
+  • Sample a folder of books instead of Moby-Dick:
+                       python prompt_generator.py --corpus-dir ~/gutenberg --ingest
+    (or set TYPING_CORPUS_DIR); --ingest builds every book's cache up front.
 """
 
 import os
 import re
+import sys
+import json
+import heapq
+import bisect
 import random
 import argparse
+import threading
+import importlib.util
+from array import array
+from typing import NamedTuple
+from itertools import accumulate
+from collections import Counter
+
+import corpus_cache
+from metrics import timed
+from corpus_ingest import BUCKETS, QUOTE_RE, ARTIFACT_RE, iter_clean, ingest, _contains
 
 # ─── Configuration ─────────────────────────────────────────────────────────
 MIN_LEN = 190
 MAX_LEN = 210
+NGRAM_TOP = 64     # spans kept in each n-gram's posting list
+# The n-gram index is built in memory; books longer than this get none and
+# training prompts from them are ordinary ones
+NGRAM_MAX_CHARS = 4_000_000
+# Marathon prompts: chapters start at a CHAPTER_RE heading and end at the
+# last sentence before the next one. Shorter chapters (tables of contents,
+# mostly) are skipped and longer ones cut at a sentence end; a book with no
+# headings gives MARATHON_SENTENCES sentences instead.
+CHAPTER_RE = re.compile(r"\b(?:CHAPTER|Chapter) (?:\d+|[IVXLC]+)\b")
+MARATHON_MIN_CHARS = 1_000
+MARATHON_MAX_CHARS = 100_000
+MARATHON_SENTENCES = 50
+# Difficulty tiers, easiest first, by span_features.difficulty_scores();
+# TIER_CUTS are the scores between them, set to split Moby-Dick's spans
+# into quarters. Scoring needs NumPy when a book is ingested; without it
+# every tier serves any span.
+TIERS = ('novice', 'intermediate', 'advanced', 'expert')
+TIER_CUTS = (-0.22, 0.03, 0.41)
 
-# Locate the source text
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TXT_PATH = os.path.join(BASE_DIR, "files", "moby_dick.txt")
+# Locate the source text; a corpus id is the name of a .txt file in files/,
+# or in CORPUS_DIR when a library of books is in use
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+CORPUS_ID = "moby_dick"
+TXT_PATH  = os.path.join(BASE_DIR, "files", CORPUS_ID + ".txt")
+CORPUS_ID_RE = re.compile(r"[\w-]+")
+CORPUS_DIR = os.environ.get("TYPING_CORPUS_DIR") or None
 
 # ─── Load & Clean Body Text ─────────────────────────────────────────────────
 
+@timed("typing_load_body_text_seconds", "Reading and cleaning a whole book in memory")
 def load_body_text(path=TXT_PATH):
     """Read and clean the text, stripping Gutenberg headers if present."""
-    with open(path, 'r', encoding='utf-8') as f:
-        raw = f.read()
-    # Strip Gutenberg header
-    start = raw.find("*** START OF THIS PROJECT GUTENBERG EBOOK")
-    if start != -1:
-        raw = raw[raw.find("\n", start) + 1:]
-    # Strip Gutenberg footer
-    end = raw.find("*** END OF THIS PROJECT GUTENBERG EBOOK")
-    if end != -1:
-        raw = raw[:end]
-    # Collapse whitespace
-    text = raw.replace("\r\n", " ").replace("\n", " ")
-    return re.sub(r"\s+", " ", text).strip()
-
-BODY_TEXT = load_body_text()
+    return "".join(iter_clean(path))
 
 # ─── Sentence Boundary Indices ───────────────────────────────────────────────
-# start positions: immediately after . ! or ? plus whitespace
-sentence_starts = [0] + [m.end() for m in re.finditer(r'(?<=[\.\!?])\s+', BODY_TEXT)]
-# end positions: index of punctuation before whitespace
-sentence_ends   = [m.start() for m in re.finditer(r'(?<=[\.\!?])\s+', BODY_TEXT)]
+
+BOUNDARY_RE = re.compile(r'(?<=[\.\!?])\s+')
+
+def find_sentence_bounds(text):
+    """
+    Return (sentence_starts, sentence_ends) in one pass over `text`.
+    Starts sit immediately after . ! or ? plus whitespace (and at 0);
+    ends are the index of the whitespace following that punctuation.
+    """
+    starts, ends = array('l', [0]), array('l')
+    for m in BOUNDARY_RE.finditer(text):
+        ends.append(m.start())
+        starts.append(m.end())
+    return starts, ends
+
+# ─── Span Index ──────────────────────────────────────────────────────────────
+
+class SpanIndex:
+    """
+    Every valid (start, end) prompt span of a corpus, built once and split
+    into buckets: 'easy' (no quotes), 'hard' (has quotes) and 'clean'
+    (either), plus one per TIERS name when the tiers were computed.
+    Spans containing [[ or ]] artifacts are left out entirely.
+    """
+    BUCKETS = BUCKETS
+
+    def __init__(self, buckets):
+        # bucket name -> (array of starts, array of ends)
+        self.buckets = buckets
+
+    def __len__(self):
+        return len(self.buckets['clean'][0])
+
+    def to_arrays(self) -> dict:
+        arrays = {}
+        for name, (starts, ends) in self.buckets.items():
+            arrays[f'{name}_starts'] = starts
+            arrays[f'{name}_ends']   = ends
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        names = cls.BUCKETS + tuple(name for name in TIERS if f'{name}_starts' in arrays)
+        return cls({name: (arrays[f'{name}_starts'], arrays[f'{name}_ends'])
+                    for name in names})
+
+    def count(self, difficulty: str) -> int:
+        return len(self.bucket(difficulty)[0])
+
+    def bucket(self, difficulty: str):
+        return self.buckets.get(difficulty.lower(), self.buckets['clean'])
+
+    def sample(self, difficulty: str, rng=random):
+        """Return a random (start, end) span, or None if the bucket is empty."""
+        starts, ends = self.bucket(difficulty)
+        if not starts:
+            return None
+        i = rng.randrange(len(starts))
+        return starts[i], ends[i]
+
+def build_span_index(text, starts, ends, min_len=MIN_LEN, max_len=MAX_LEN) -> SpanIndex:
+    """Enumerate all spans starting in `starts`, ending in `ends`, within bounds."""
+    quotes    = [m.start() for m in QUOTE_RE.finditer(text)]
+    artifacts = [m.start() for m in ARTIFACT_RE.finditer(text)]
+    buckets = {name: (array('l'), array('l')) for name in SpanIndex.BUCKETS}
+    for start in starts:
+        # sentence_ends is sorted, so the valid ends form one contiguous slice
+        lo = bisect.bisect_left(ends, start + min_len)
+        hi = bisect.bisect_right(ends, start + max_len)
+        for end in ends[lo:hi]:
+            # an artifact at p spans [p, p + 2), so it must start before end - 1
+            if _contains(artifacts, start, end - 1):
+                continue
+            kind = 'hard' if _contains(quotes, start, end) else 'easy'
+            for name in (kind, 'clean'):
+                buckets[name][0].append(start)
+                buckets[name][1].append(end)
+    return SpanIndex(buckets)
+
+# ─── N-gram Index ────────────────────────────────────────────────────────────
+
+def ngram_key(gram: str) -> int:
+    """Pack a bigram or trigram into one int, 21 bits per code point."""
+    key = 0
+    for ch in gram:
+        key = key << 21 | ord(ch)
+    return key
+
+class NgramIndex:
+    """
+    Bigram and trigram counts of every span in the 'clean' bucket, as flat
+    int arrays (span ids are indexes into that bucket):
+
+      keys                    sorted ngram_key()s; an n-gram's id is its index
+      span_offsets/span_grams sparse counts per span: row i holds
+                              (id << 8 | count) sorted by id
+      gram_offsets/postings   per n-gram, its NGRAM_TOP highest-count spans
+                              as (count << 32 | span), highest first
+
+    A lookup only walks the posting lists of the n-grams asked for, then
+    rescores the leading candidates exactly from their rows.
+    """
+    ARRAYS = ('keys', 'span_offsets', 'span_grams', 'gram_offsets', 'postings')
+
+    def __init__(self, keys, span_offsets, span_grams, gram_offsets, postings):
+        self.keys = keys
+        self.span_offsets = span_offsets
+        self.span_grams = span_grams
+        self.gram_offsets = gram_offsets
+        self.postings = postings
+
+    def to_arrays(self) -> dict:
+        return {f'ngram_{name}': getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[f'ngram_{name}'] for name in cls.ARRAYS))
+
+    def gram_id(self, gram: str) -> int:
+        """Id of `gram`, or -1 if it occurs in no span."""
+        key = ngram_key(gram)
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else -1
+
+    def count(self, span: int, gram_id: int) -> int:
+        """Occurrences of n-gram `gram_id` in span `span`."""
+        lo, hi = self.span_offsets[span], self.span_offsets[span + 1]
+        i = bisect.bisect_left(self.span_grams, gram_id << 8, lo, hi)
+        if i < hi and self.span_grams[i] >> 8 == gram_id:
+            return self.span_grams[i] & 0xFF
+        return 0
+
+    def best_spans(self, weights: dict, n: int = 8):
+        """
+        Up to n (score, span) pairs, best first, where a span's score is the
+        sum of weight × occurrences over the n-grams in `weights`.
+        """
+        ids = {}
+        for gram, weight in weights.items():
+            gid = self.gram_id(gram)
+            if gid >= 0 and weight > 0:
+                ids[gid] = ids.get(gid, 0) + weight
+        scores = {}
+        for gid, weight in ids.items():
+            for posting in self.postings[self.gram_offsets[gid]:self.gram_offsets[gid + 1]]:
+                span = posting & 0xFFFFFFFF
+                scores[span] = scores.get(span, 0) + weight * (posting >> 32)
+        # Posting lists are truncated, so the summed scores are lower bounds;
+        # rescore a few more than asked for from the exact per-span counts
+        candidates = heapq.nlargest(4 * n, scores, key=scores.get)
+        exact = [(sum(w * self.count(span, gid) for gid, w in ids.items()), span)
+                 for span in candidates]
+        exact.sort(key=lambda pair: (-pair[0], pair[1]))
+        return exact[:n]
+
+def build_ngram_index(text, starts, ends, top=NGRAM_TOP) -> NgramIndex:
+    """Count the bigrams and trigrams of every (clean) span and invert the counts."""
+    rows = []
+    for start, end in zip(starts, ends):
+        c = [ord(ch) for ch in text[start:end]]
+        pairs = [a << 21 | b for a, b in zip(c, c[1:])]
+        counts = Counter(pairs)
+        counts.update(p << 21 | b for p, b in zip(pairs, c[2:]))
+        if len(c) > 0xFF:
+            counts = Counter({key: min(n, 0xFF) for key, n in counts.items()})
+        rows.append(counts)
+
+    keys = sorted(set().union(*rows))
+    ids = {key: i for i, key in enumerate(keys)}
+    span_offsets, span_grams = array('q', [0]), array('q')
+    entries = []     # (id << 40 | count << 32 | span), to invert with one sort
+    for span, counts in enumerate(rows):
+        row = sorted([gid << 8 | n for gid, n in zip(map(ids.__getitem__, counts), counts.values())])
+        span_grams.extend(row)
+        span_offsets.append(len(span_grams))
+        entries.extend([e << 32 | span for e in row])
+    entries.sort()
+
+    # Each n-gram's entries are now one run in ascending count order; keep
+    # the tail of the run, highest count first
+    gram_offsets, postings = array('q', [0]), array('q')
+    low = (1 << 40) - 1
+    hi = 0
+    for gid in range(len(keys)):
+        lo, hi = hi, bisect.bisect_left(entries, (gid + 1) << 40, hi)
+        postings.extend([e & low for e in reversed(entries[max(lo, hi - top):hi])])
+        gram_offsets.append(len(postings))
+    return NgramIndex(array('q', keys), span_offsets, span_grams, gram_offsets, postings)
+
+# ─── Corpus Loading ──────────────────────────────────────────────────────────
+
+class Corpus:
+    """
+    A loaded corpus: cleaned text, sentence boundaries, span and n-gram
+    indexes. `text` is a str, or a CachedCorpus whose text is only decoded
+    when the whole of it is asked for; slice() reads straight from the map.
+    `ngrams` is None for books over NGRAM_MAX_CHARS.
+    """
+
+    def __init__(self, text, sentence_starts, sentence_ends, spans, ngrams,
+                 corpus_id=CORPUS_ID):
+        self.id = corpus_id
+        self._text = text
+        self.sentence_starts = sentence_starts
+        self.sentence_ends = sentence_ends
+        self.spans = spans
+        self.ngrams = ngrams
+        self._chapters = None
+
+    @property
+    def text(self) -> str:
+        if not isinstance(self._text, str):
+            self._text = self._text.text()
+        return self._text
+
+    def slice(self, start: int, end: int) -> str:
+        if isinstance(self._text, str):
+            return self._text[start:end]
+        return self._text.slice(start, end)
+
+    def __len__(self):
+        return len(self._text)
+
+    def sentence_end_before(self, start: int, limit: int) -> int:
+        """The last sentence end in (start, limit], or limit if there is none."""
+        i = bisect.bisect_right(self.sentence_ends, limit) - 1
+        if i >= 0 and self.sentence_ends[i] > start:
+            return self.sentence_ends[i]
+        return limit
+
+    def _heading_starts(self) -> list:
+        if isinstance(self._text, str):
+            return [m.start() for m in CHAPTER_RE.finditer(self._text)]
+        # scan the map a chunk at a time rather than decoding the whole book;
+        # the overlap catches a heading split across two chunks
+        chunk, overlap, heads = 1 << 20, 64, []
+        for lo in range(0, len(self), chunk):
+            text = self._text.slice(lo, lo + chunk + overlap)
+            heads.extend(lo + m.start() for m in CHAPTER_RE.finditer(text) if m.start() < chunk)
+        return heads
+
+    def chapters(self) -> list:
+        """(start, end) of each chapter long enough for a marathon; found on first use."""
+        if self._chapters is None:
+            heads = self._heading_starts()
+            chapters = []
+            for start, following in zip(heads, heads[1:] + [None]):
+                limit = start + MARATHON_MAX_CHARS
+                if following is None and len(self) <= limit:
+                    end = len(self)     # the last sentence has no whitespace after it
+                else:
+                    end = self.sentence_end_before(start, min(limit, following or limit))
+                if end - start >= MARATHON_MIN_CHARS:
+                    chapters.append((start, end))
+            self._chapters = chapters
+        return self._chapters
+
+    def sentences_span(self, first: int, count: int):
+        """`count` sentences from sentence `first`, cut at MARATHON_MAX_CHARS."""
+        start = self.sentence_starts[first]
+        last = min(first + count, len(self.sentence_ends)) - 1
+        end = self.sentence_ends[last] if last >= first else len(self)
+        return start, self.sentence_end_before(start, min(end, start + MARATHON_MAX_CHARS))
+
+    def fallback_span(self):
+        """First full sentence(s) up to MIN_LEN, used when no span qualifies."""
+        for e in self.sentence_ends:
+            if e >= MIN_LEN:
+                return 0, e
+        return 0, MIN_LEN
+
+    def fallback_prompt(self) -> str:
+        return self.slice(*self.fallback_span())
+
+    def handle(self, span) -> 'PromptHandle':
+        return PromptHandle(self.id, *span)
+
+    def random_span(self, difficulty: str, rng=random):
+        return self.spans.sample(difficulty, rng) or self.fallback_span()
+
+    def training_span(self, weights: dict, rng=random):
+        """A near-best span for the n-gram `weights`; see get_training_prompt."""
+        best = self.ngrams.best_spans(weights) if self.ngrams is not None else None
+        if not best:
+            return self.random_span('clean', rng)
+        top = best[0][0]
+        span = rng.choice([span for score, span in best if score >= 0.8 * top])
+        starts, ends = self.spans.bucket('clean')
+        return starts[span], ends[span]
+
+def corpus_path(corpus_id: str) -> str:
+    # ids come back from session files and the database, so never let one
+    # name a path outside the corpus folders
+    if not CORPUS_ID_RE.fullmatch(corpus_id):
+        raise ValueError(f"invalid corpus id {corpus_id!r}")
+    if CORPUS_DIR:
+        path = os.path.join(CORPUS_DIR, corpus_id + ".txt")
+        if os.path.exists(path):
+            return path
+    return os.path.join(BASE_DIR, "files", corpus_id + ".txt")
+
+def _add_ngrams(writer) -> None:
+    """ingest() hook: append the n-gram index of a book short enough for one."""
+    if writer.text_len > NGRAM_MAX_CHARS:
+        return
+    starts, ends = (writer.arrays[f'clean_{name}'].read() for name in ('starts', 'ends'))
+    ngrams = build_ngram_index(writer.read_text(), starts, ends)
+    for name, values in ngrams.to_arrays().items():
+        writer.add_array(name, values)
+
+def _have_numpy() -> bool:
+    # part of the cache key, so installing NumPy later adds the tiers
+    return importlib.util.find_spec("numpy") is not None
+
+def tier_spans(slice_text, length, starts, ends) -> dict:
+    """TIERS name -> (starts, ends) of the given spans, or {} without NumPy."""
+    try:
+        from span_features import tier_buckets
+    except ImportError:
+        return {}
+    return {name: (array('q', tier_starts.tobytes()), array('q', tier_ends.tobytes()))
+            for name, (tier_starts, tier_ends)
+            in tier_buckets(slice_text, length, starts, ends, TIERS, TIER_CUTS).items()}
+
+def _add_tiers(writer) -> None:
+    """ingest() hook: append the spans of each difficulty tier."""
+    starts, ends = (writer.arrays[f'clean_{name}'].read() for name in ('starts', 'ends'))
+    for name, (tier_starts, tier_ends) in tier_spans(writer.read_text, writer.text_len,
+                                                     starts, ends).items():
+        writer.add_array(f'{name}_starts', tier_starts)
+        writer.add_array(f'{name}_ends', tier_ends)
+
+def _add_indexes(writer) -> None:
+    _add_ngrams(writer)
+    _add_tiers(writer)
+
+def _from_cache(cached, corpus_id) -> Corpus:
+    arrays = cached.arrays
+    ngrams = NgramIndex.from_arrays(arrays) if 'ngram_keys' in arrays else None
+    return Corpus(cached, arrays['sentence_starts'], arrays['sentence_ends'],
+                  SpanIndex.from_arrays(arrays), ngrams, corpus_id)
+
+@timed("typing_load_corpus_seconds", "Loading a book from its cache, or ingesting it")
+def load_corpus(path=TXT_PATH) -> Corpus:
+    """
+    Load the corpus at `path` from its memory-mapped cache, streaming the
+    book into a new cache first if the source or the settings changed.
+    The cache lives next to the book, or in the temp directory if that
+    folder is read-only; failing both, the corpus is built in memory.
+    """
+    key = corpus_cache.cache_key(path, MIN_LEN, MAX_LEN, NGRAM_TOP, NGRAM_MAX_CHARS,
+                                 TIERS, TIER_CUTS, _have_numpy())
+    corpus_id = os.path.splitext(os.path.basename(path))[0]
+    cache_paths = (corpus_cache.cache_path_for(path), corpus_cache.fallback_cache_path_for(path))
+    for cache_path in cache_paths:
+        cached = corpus_cache.load(cache_path, key)
+        if cached is not None:
+            return _from_cache(cached, corpus_id)
+    for cache_path in cache_paths:
+        try:
+            ingest(path, cache_path, key, MIN_LEN, MAX_LEN, extra=_add_indexes)
+        except OSError:
+            continue
+        cached = corpus_cache.load(cache_path, key)
+        if cached is not None:
+            return _from_cache(cached, corpus_id)
+
+    text = load_body_text(path)
+    starts, ends = find_sentence_bounds(text)
+    spans = build_span_index(text, starts, ends)
+    spans.buckets.update(tier_spans(lambda lo, hi: text[lo:hi], len(text),
+                                    *spans.bucket('clean')))
+    ngrams = None
+    if len(text) <= NGRAM_MAX_CHARS:
+        ngrams = build_ngram_index(text, *spans.bucket('clean'))
+    return Corpus(text, starts, ends, spans, ngrams, corpus_id)
+
+class Library:
+    """
+    The corpora prompts are drawn from. Random prompts are uniform over
+    the spans of all books together, so a long book is picked more often
+    than a short one; training prompts are the best spans of any book.
+    """
+
+    def __init__(self, corpora):
+        self.corpora = corpora
+        self._cumulative = {}   # difficulty -> running span counts per corpus
+        self._chapter_counts = None
+
+    def _counts(self, difficulty):
+        counts = self._cumulative.get(difficulty)
+        if counts is None:
+            counts, total = [], 0
+            for corpus in self.corpora:
+                total += corpus.spans.count(difficulty)
+                counts.append(total)
+            self._cumulative[difficulty] = counts
+        return counts
+
+    def random_handle(self, difficulty: str, rng=random) -> 'PromptHandle':
+        counts = self._counts(difficulty)
+        if not counts or not counts[-1]:
+            corpus = self.corpora[0] if self.corpora else get_corpus()
+            return corpus.handle(corpus.fallback_span())
+        i = rng.randrange(counts[-1])
+        k = bisect.bisect_right(counts, i)
+        corpus = self.corpora[k]
+        starts, ends = corpus.spans.bucket(difficulty)
+        i -= counts[k - 1] if k else 0
+        return corpus.handle((starts[i], ends[i]))
+
+    def training_handle(self, weights: dict, rng=random) -> 'PromptHandle':
+        """A near-best span for `weights` over all books; see get_training_prompt."""
+        best = []
+        for k, corpus in enumerate(self.corpora):
+            if corpus.ngrams is not None:
+                best.extend((score, k, span) for score, span in corpus.ngrams.best_spans(weights))
+        if not best:
+            return self.random_handle('clean', rng)
+        best.sort(key=lambda entry: (-entry[0], entry[1], entry[2]))
+        best = best[:8]
+        top = best[0][0]
+        _, k, span = rng.choice([entry for entry in best if entry[0] >= 0.8 * top])
+        corpus = self.corpora[k]
+        starts, ends = corpus.spans.bucket('clean')
+        return corpus.handle((starts[span], ends[span]))
+
+    def marathon_handle(self, sentences: int = 0, rng=random) -> 'PromptHandle':
+        """A chapter of any book, or `sentences` sentences in a row; see get_marathon_handle."""
+        if not sentences:
+            counts = self._chapter_counts
+            if counts is None:
+                counts = self._chapter_counts = list(accumulate(
+                    len(corpus.chapters()) for corpus in self.corpora))
+            if counts and counts[-1]:
+                i = rng.randrange(counts[-1])
+                k = bisect.bisect_right(counts, i)
+                corpus = self.corpora[k]
+                return corpus.handle(corpus.chapters()[i - (counts[k - 1] if k else 0)])
+            sentences = MARATHON_SENTENCES
+        # uniform over every run of `sentences` sentences in the library
+        counts = list(accumulate(max(0, len(corpus.sentence_ends) - sentences + 1)
+                                 for corpus in self.corpora))
+        if not counts or not counts[-1]:
+            corpus = self.corpora[0] if self.corpora else get_corpus()
+            return corpus.handle(corpus.sentences_span(0, sentences))
+        i = rng.randrange(counts[-1])
+        k = bisect.bisect_right(counts, i)
+        corpus = self.corpora[k]
+        return corpus.handle(corpus.sentences_span(i - (counts[k - 1] if k else 0), sentences))
+
+# Corpora are loaded on first use rather than at import, so importing this
+# module (and opening the first window) does not pay for reading the book.
+_corpora = {}
+_library = None
+_corpus_lock = threading.Lock()
+
+def get_corpus(corpus_id: str = CORPUS_ID) -> Corpus:
+    """Return a corpus by id, loading it (or waiting for warm_up) if needed."""
+    corpus = _corpora.get(corpus_id)
+    if corpus is None:
+        with _corpus_lock:
+            corpus = _corpora.get(corpus_id)
+            if corpus is None:
+                corpus = _corpora[corpus_id] = load_corpus(corpus_path(corpus_id))
+    return corpus
+
+def corpus_ready(corpus_id: str = CORPUS_ID) -> bool:
+    return corpus_id in _corpora
+
+def library_ids() -> list:
+    """Ids of the books prompts are drawn from: CORPUS_DIR's .txt files, or the default."""
+    if CORPUS_DIR:
+        ids = sorted(name[:-4] for name in os.listdir(CORPUS_DIR)
+                     if name.endswith(".txt") and CORPUS_ID_RE.fullmatch(name[:-4]))
+        if ids:
+            return ids
+    return [CORPUS_ID]
+
+def get_library() -> Library:
+    """
+    The Library of library_ids(), loading (or ingesting) every book on
+    first use. A book that fails to load is left out, with a warning;
+    if none loads, the library is the default corpus.
+    """
+    global _library
+    library = _library
+    if library is None:
+        corpora = []
+        for corpus_id in library_ids():
+            try:
+                corpora.append(get_corpus(corpus_id))
+            except (OSError, ValueError) as e:
+                print(f"skipping book {corpus_id!r}: {e}", file=sys.stderr)
+        library = Library(corpora or [get_corpus(CORPUS_ID)])
+        with _corpus_lock:
+            _library = _library or library
+            library = _library
+    return library
+
+def use_library(folder) -> None:
+    """Draw prompts from the books in `folder` (None for the default corpus)."""
+    global CORPUS_DIR, _library
+    with _corpus_lock:
+        CORPUS_DIR = folder or None
+        _library = None
+        _corpora.clear()
+
+def warm_up() -> threading.Thread:
+    """Start loading the library on a daemon thread."""
+    thread = threading.Thread(target=get_library, name="corpus-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# Module-level names kept for existing callers; resolved lazily (PEP 562).
+_CORPUS_ATTRS = {
+    'BODY_TEXT':       'text',
+    'sentence_starts': 'sentence_starts',
+    'sentence_ends':   'sentence_ends',
+    'SPAN_INDEX':      'spans',
+    'NGRAM_INDEX':     'ngrams',
+}
+
+def __getattr__(name):
+    if name in _CORPUS_ATTRS:
+        return getattr(get_corpus(), _CORPUS_ATTRS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ─── Prompt Generation ─────────────────────────────────────────────────────
 
+class PromptHandle(NamedTuple):
+    """A prompt as a corpus id and [start, end) offsets into its cleaned text."""
+    corpus: str
+    start: int
+    end: int
+
+    @property
+    def text(self) -> str:
+        return get_corpus(self.corpus).slice(self.start, self.end)
+
+def fallback_prompt() -> str:
+    return get_corpus().fallback_prompt()
+
+@timed("typing_prompt_seconds", "Drawing a prompt", kind="random")
+def get_random_handle(difficulty: str, rng=random) -> PromptHandle:
+    """
+    A random prompt of the given difficulty ('easy', 'hard' or one of
+    TIERS). Starts and ends at sentence boundaries; 'hard' requires at
+    least one quote. Drawn from every book of the library.
+    """
+    return get_library().random_handle(difficulty, rng)
+
+@timed("typing_prompt_seconds", "Drawing a prompt", kind="training")
+def get_training_handle(weights: dict, rng=random) -> PromptHandle:
+    """
+    A prompt that drills the given bigrams/trigrams, e.g. {'th': 2.0,
+    'ing': 1.5}. Spans are scored by weight × occurrences and one of the
+    near-best is picked at random, so the same weaknesses do not always
+    give the same prompt. Any span will do if none of them occur.
+    """
+    return get_library().training_handle(weights, rng)
+
+@timed("typing_prompt_seconds", "Drawing a prompt", kind="marathon")
+def get_marathon_handle(sentences: int = 0, rng=random) -> PromptHandle:
+    """
+    A long-form prompt: with sentences=0 a whole chapter (see CHAPTER_RE)
+    picked uniformly over every book's chapters, otherwise that many
+    consecutive sentences. At most MARATHON_MAX_CHARS characters.
+    """
+    return get_library().marathon_handle(sentences, rng)
+
 def get_random_prompt(difficulty: str) -> str:
+    """Text of get_random_handle(difficulty)."""
+    return get_random_handle(difficulty).text
+
+def get_training_prompt(weights: dict, rng=random) -> str:
+    """Text of get_training_handle(weights)."""
+    return get_training_handle(weights, rng).text
+
+# ─── Bulk Generation ─────────────────────────────────────────────────────────
+
+def _generate_range(job) -> str:
+    """Worker: the JSONL lines for prompt indexes [lo, hi)."""
+    lo, hi, seed, difficulty, weights, corpus_dir = job
+    if corpus_dir != CORPUS_DIR:
+        use_library(corpus_dir)
+    library = get_library()
+    lines = []
+    for i in range(lo, hi):
+        # Every prompt has its own RNG, so the output does not depend on how
+        # the indexes are split between workers
+        rng = random.Random(f"{seed}:{i}")
+        if weights:
+            handle = library.training_handle(weights, rng)
+        else:
+            handle = library.random_handle(difficulty, rng)
+        lines.append(json.dumps({'index': i, 'difficulty': difficulty, 'corpus': handle.corpus,
+                                 'start': handle.start, 'end': handle.end, 'text': handle.text},
+                                ensure_ascii=False))
+    return "".join(line + "\n" for line in lines)
+
+def generate_prompts(count: int, seed: int = 0, difficulty: str = 'easy', weights=None,
+                     workers: int = 1, chunk: int = 2000):
     """
-    Return a random snippet of the given difficulty ('easy' or 'hard').
-    Starts and ends at sentence boundaries; 'hard' requires at least one quote.
+    Yield JSONL text for `count` prompts in index order, one chunk at a
+    time. Workers are processes that memory-map the corpus cache instead
+    of each receiving a copy of the text. The output depends only on
+    `seed`, never on the number of workers.
     """
-    difficulty = difficulty.lower()
-    for _ in range(1000):
-        start = random.choice(sentence_starts)
-        # valid ends give snippet lengths within bounds
-        valid_ends = [e for e in sentence_ends if MIN_LEN <= (e - start) <= MAX_LEN]
-        if not valid_ends:
-            continue
-        end = random.choice(valid_ends)
-        snippet = BODY_TEXT[start:end]
-        # skip artifacts
-        if '[[' in snippet or ']]' in snippet:
-            continue
-        # require quotes for hard, and absence for easy
-        has_quote = '"' in snippet or '“' in snippet or '”' in snippet
-        if difficulty == 'hard' and not has_quote:
-            continue
-        if difficulty == 'easy' and has_quote:
-            continue
-        return snippet
-    # fallback: first full sentence(s) up to MIN_LEN
-    for e in sentence_ends:
-        if e >= MIN_LEN:
-            return BODY_TEXT[:e]
-    return BODY_TEXT[:MIN_LEN]
+    get_library()  # build the caches once, before any worker maps them
+    jobs = [(lo, min(lo + chunk, count), seed, difficulty, weights, CORPUS_DIR)
+            for lo in range(0, count, chunk)]
+    if workers <= 1 or len(jobs) <= 1:
+        yield from map(_generate_range, jobs)
+        return
+    # imported here: it costs more than the rest of a warm start
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(_generate_range, jobs)
 
 # ─── CLI Support ─────────────────────────────────────────────────────────────
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Generate a typing prompt.')
-    parser.add_argument('--difficulty', choices=['easy','hard'], default='easy',
+    parser.add_argument('--difficulty', choices=['easy', 'hard', *TIERS], default='easy',
                         help='Choose prompt difficulty')
+    parser.add_argument('--drill', metavar='NGRAMS',
+                        help='Comma-separated bigrams/trigrams to practice, e.g. th,wh,ing')
+    parser.add_argument('--marathon', metavar='SENTENCES', type=int, nargs='?', const=0,
+                        help='Print a marathon prompt: a whole chapter, or this many sentences')
+    parser.add_argument('--count', type=int,
+                        help='Write this many prompts as JSONL (text, offsets, difficulty)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for --count; the same seed gives the same output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes for --count (default: one per core)')
+    parser.add_argument('--output', help='JSONL file for --count (default: stdout)')
+    parser.add_argument('--corpus-dir', default=CORPUS_DIR,
+                        help='Draw prompts from the .txt books in this folder')
+    parser.add_argument('--ingest', action='store_true',
+                        help='Build the cache of every book and report the library size')
     args = parser.parse_args()
-    print(get_random_prompt(args.difficulty))
+    if args.corpus_dir != CORPUS_DIR:
+        use_library(args.corpus_dir)
+    weights = {gram: 1.0 for gram in args.drill.split(',') if gram} if args.drill else None
+
+    if args.ingest:
+        library = get_library()
+        spans = sum(corpus.spans.count('clean') for corpus in library.corpora)
+        print(f"{len(library.corpora)} corpora, {spans:,} spans", file=sys.stderr)
+    elif args.count is not None:
+        difficulty = 'training' if weights else args.difficulty
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for chunk in generate_prompts(args.count, args.seed, difficulty, weights, args.workers):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    elif args.marathon is not None:
+        print(get_marathon_handle(args.marathon).text)
+    elif weights:
+        print(get_training_prompt(weights))
+    else:
+        print(get_random_prompt(args.difficulty))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+prompt_pool.py
+
+A small queue of ready prompts (PromptHandles) per difficulty, kept filled by one daemon
+thread, so starting or restarting a test pops a prompt instead of
+generating it (or waiting for the corpus to load) on the GUI thread.
+
+Only the difficulty last asked for is refilled; prompts already queued
+for others are kept until they are used or discarded.
+"""
+
+import threading
+from collections import deque
+
+class PromptPool:
+    """
+    Prefetches PromptHandles with `generate(difficulty)`. get() never waits on
+    the worker: with nothing queued it generates on the calling thread.
+    """
+
+    def __init__(self, generate, depth: int = 3):
+        self.generate = generate
+        self.depth = depth
+        self.queues = {}        # difficulty -> deque of PromptHandles
+        self.epochs = {}        # bumped by discard() to drop prompts in flight
+        self.active = None      # the difficulty the worker keeps filled
+        self.stalled = False    # generate() failed; wait for the next request
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def prefer(self, difficulty: str) -> None:
+        """Start keeping `difficulty` filled (e.g. when the setting changes)."""
+        with self.cond:
+            self.active = difficulty
+            self.stalled = False
+            self.cond.notify()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="prompt-prefetch",
+                                               daemon=True)
+                self.thread.start()
+
+    def ready(self, difficulty: str) -> bool:
+        with self.cond:
+            return bool(self.queues.get(difficulty))
+
+    def get(self, difficulty: str) -> 'PromptHandle':
+        """Pop a prefetched prompt's handle, or generate one now if none is ready."""
+        with self.cond:
+            queue = self.queues.get(difficulty)
+            prompt = queue.popleft() if queue else None
+        self.prefer(difficulty)
+        return prompt if prompt is not None else self.generate(difficulty)
+
+    def discard(self, difficulty: str) -> None:
+        """Drop queued prompts of `difficulty`, e.g. when their inputs changed."""
+        with self.cond:
+            self.queues.pop(difficulty, None)
+            self.epochs[difficulty] = self.epochs.get(difficulty, 0) + 1
+            self.cond.notify()
+
+    def _wanted(self):
+        return (self.active is not None and not self.stalled
+                and len(self.queues.get(self.active, ())) < self.depth)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self._wanted():
+                    self.cond.wait()
+                difficulty = self.active
+                epoch = self.epochs.get(difficulty, 0)
+            try:
+                prompt = self.generate(difficulty)
+            except Exception:
+                # get() generates on the caller's thread and surfaces the error
+                with self.cond:
+                    self.stalled = True
+                continue
+            with self.cond:
+                if self.epochs.get(difficulty, 0) == epoch:
+                    self.queues.setdefault(difficulty, deque()).append(prompt)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+race_client.py
+
+Client side of race_server.py for the Qt frontend, which must never
+block on the network. A reader thread queues incoming messages for
+poll(); a writer thread sends outgoing ones. Progress updates that
+arrive faster than SEND_INTERVAL replace each other instead of queuing
+up, so typing quickly never builds a backlog on a slow connection.
+"""
+
+import json
+import queue
+import socket
+import threading
+from collections import deque
+
+from race_server import PORT, encode
+
+SEND_INTERVAL = 0.05
+
+def parse_address(address: str):
+    """'host:port', 'host' or ':port' -> (host, port)."""
+    host, _, port = address.rpartition(":") if ":" in address else (address, "", "")
+    return host or "127.0.0.1", int(port) if port else PORT
+
+class RaceClient:
+    def __init__(self, host: str, port: int, name: str, timeout: float = 5.0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.settimeout(None)
+        self.inbox = queue.SimpleQueue()
+        self.cond = threading.Condition()
+        self.outbox = deque()   # encoded messages, in order
+        self.pending = None     # the latest unsent progress update
+        self.closed = False
+        self.outbox.append(encode({"type": "join", "name": name}))
+        threading.Thread(target=self._read, name="race-reader", daemon=True).start()
+        threading.Thread(target=self._write, name="race-writer", daemon=True).start()
+
+    def progress(self, race: int, pos: int, mistakes: int) -> None:
+        with self.cond:
+            self.pending = {"type": "progress", "race": race, "pos": pos, "mistakes": mistakes}
+            self.cond.notify()
+
+    def finish(self, race: int, mistakes: int) -> None:
+        with self.cond:
+            self._flush_pending()
+            self.outbox.append(encode({"type": "finish", "race": race, "mistakes": mistakes}))
+            self.cond.notify()
+
+    def poll(self) -> list:
+        """Messages received since the last call; {'type': 'closed'} once disconnected."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self) -> None:
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _flush_pending(self):
+        if self.pending is not None:
+            self.outbox.append(encode(self.pending))
+            self.pending = None
+
+    def _read(self):
+        try:
+            with self.sock.makefile("r", encoding="utf-8") as lines:
+                for line in lines:
+                    self.inbox.put(json.loads(line))
+        except (OSError, ValueError):
+            pass
+        self.inbox.put({"type": "closed"})
+
+    def _write(self):
+        while True:
+            with self.cond:
+                while not (self.outbox or self.pending or self.closed):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                sent_progress = self.pending is not None
+                self._flush_pending()
+                data = b"".join(self.outbox)
+                self.outbox.clear()
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return
+            if sent_progress:
+                # let further updates coalesce into the next send
+                with self.cond:
+                    self.cond.wait_for(lambda: self.closed or self.outbox, SEND_INTERVAL)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+race_server.py
+
+A local multiplayer race server. Everyone in a race types the same
+prompt at the same time. Clients report their position as they type;
+the server keeps only the latest one per player and broadcasts the
+positions that changed at a fixed tick rate, so what each client
+receives does not grow with how fast the others type. Finished races
+go to the leaderboard in one transaction.
+
+The protocol is one JSON object per line over TCP:
+
+  client -> server
+    {"type": "join", "name": "ann"}
+    {"type": "progress", "race": 3, "pos": 57, "mistakes": 2}
+    {"type": "finish", "race": 3, "mistakes": 2}
+
+  server -> client
+    {"type": "welcome", "id": 7}
+    {"type": "lobby", "players": 4, "starts_in": 5.0}
+    {"type": "race", "race": 3, "difficulty": "easy", "corpus": "moby_dick",
+     "start": 1040, "end": 1238, "text": "...", "players": {"7": "ann", ...}}
+    {"type": "tick", "race": 3, "t": 4.2, "pos": {"7": 57}, "done": {"7": 1}}
+    {"type": "results", "race": 3, "standings": [{"id": 7, "name": "ann",
+     "wpm": 84, "mistakes": 2, "place": 1}, ...]}
+
+WPM is timed by the server, from the start of the race to the finish
+message, so a client cannot report a faster time than it typed.
+
+Usage:
+  python race_server.py [--host 127.0.0.1] [--port 8765] [--difficulty easy]
+                        [--tick-rate 10] [--lobby 5] [--min-players 2] [--db PATH]
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from prompt_generator import get_library, get_random_handle
+from scoring_service import ScoringService, MAX_WPM    # faster finishes are rejected
+
+PORT = 8765
+MAX_LINE = 4096          # longest message a client may send
+MAX_BUFFER = 1 << 18     # clients this far behind on reading are dropped
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False).encode() + b"\n"
+
+class Player:
+    def __init__(self, player_id, name, writer):
+        self.id = player_id
+        self.name = name
+        self.writer = writer
+        self.race = None        # Race the player is in, or None while waiting
+        self.pos = 0
+        self.mistakes = 0
+        self.place = None
+        self.wpm = None
+
+    def send(self, data: bytes) -> None:
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_BUFFER:
+            transport.abort()   # not reading; don't buffer for it forever
+            return
+        self.writer.write(data)
+
+class Race:
+    def __init__(self, race_id, handle, text, players):
+        self.id = race_id
+        self.handle = handle
+        self.text = text
+        self.players = players
+        self.started = time.monotonic()
+        self.moved = set()      # ids whose position changed since the last tick
+        self.done = {}          # id -> place, finished since the last tick
+        self.finished = 0
+
+    def running(self) -> bool:
+        return any(p.race is self and p.place is None and not p.writer.transport.is_closing()
+                   for p in self.players)
+
+class RaceServer:
+    """
+    Runs races back to back: once `min_players` are waiting, the lobby
+    stays open `lobby` more seconds, then everyone waiting races until
+    all have finished (or left) or `race_seconds` pass.
+    """
+
+    def __init__(self, difficulty="easy", tick_rate=10.0, lobby=5.0, min_players=2,
+                 race_seconds=300.0, db=None):
+        self.difficulty = difficulty
+        self.interval = 1.0 / tick_rate
+        self.lobby = lobby
+        self.min_players = min_players
+        self.race_seconds = race_seconds
+        if db:
+            self.scores = ScoringService(db)
+        else:
+            from backend import service
+            self.scores = service()
+        self.players = {}
+        self.next_id = 1
+        self.races = 0
+        self.joined = asyncio.Event()
+
+    # ── Connections ──────────────────────────────────────────────────────
+
+    async def handle(self, reader, writer):
+        player = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                kind = message.get("type")
+                if player is None:
+                    if kind != "join":
+                        break
+                    player = self.join(str(message.get("name") or "Anonymous")[:40], writer)
+                elif kind == "progress":
+                    self.progress(player, message)
+                elif kind == "finish":
+                    self.finish(player, message)
+        except (ValueError, TypeError, AttributeError, ConnectionError):
+            pass    # malformed or oversized message, or the client went away
+        finally:
+            if player is not None:
+                self.players.pop(player.id, None)
+            writer.close()
+
+    def join(self, name, writer) -> Player:
+        player = Player(self.next_id, name, writer)
+        self.next_id += 1
+        self.players[player.id] = player
+        player.send(encode({"type": "welcome", "id": player.id}))
+        self.joined.set()
+        return player
+
+    def progress(self, player, message):
+        race = player.race
+        if race is None or race.id != message.get("race") or player.place is not None:
+            return
+        pos = max(0, min(int(message.get("pos", 0)), len(race.text)))
+        player.mistakes = int(message.get("mistakes", player.mistakes))
+        if pos != player.pos:
+            player.pos = pos
+            race.moved.add(player.id)
+
+    def finish(self, player, message):
+        race = player.race
+        if race is None or race.id != message.get("race") or player.place is not None:
+            return
+        if player.pos < len(race.text):
+            # only a player whose progress reached the end has finished
+            player.send(encode({"type": "rejected", "race": race.id, "reason": "not finished"}))
+            player.race = None
+            return
+        minutes = max((time.monotonic() - race.started) / 60, 0.01)
+        wpm = int((len(race.text) / 5) / minutes)
+        if wpm > MAX_WPM:
+            player.send(encode({"type": "rejected", "race": race.id, "reason": "too fast"}))
+            player.race = None
+            return
+        race.finished += 1
+        player.place, player.wpm, player.pos = race.finished, wpm, len(race.text)
+        player.mistakes = int(message.get("mistakes", player.mistakes))
+        race.moved.add(player.id)
+        race.done[player.id] = player.place
+
+    def waiting(self):
+        return [p for p in self.players.values() if p.race is None]
+
+    def broadcast(self, players, message: dict) -> None:
+        data = encode(message)      # encoded once, however many receive it
+        for player in players:
+            player.send(data)
+
+    # ── Races ────────────────────────────────────────────────────────────
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, get_library)   # load the corpus before anyone waits
+        while True:
+            while len(self.waiting()) < self.min_players:
+                self.joined.clear()
+                await self.joined.wait()
+            self.broadcast(self.waiting(), {"type": "lobby", "players": len(self.waiting()),
+                                            "starts_in": self.lobby})
+            await asyncio.sleep(self.lobby)
+            players = self.waiting()
+            if players:
+                await self.run_race(players)
+
+    async def run_race(self, players):
+        handle = get_random_handle(self.difficulty)
+        self.races += 1
+        race = Race(self.races, handle, handle.text, players)
+        for player in players:
+            player.race, player.pos, player.mistakes, player.place, player.wpm = race, 0, 0, None, None
+        self.broadcast(players, {
+            "type": "race", "race": race.id, "difficulty": self.difficulty,
+            "corpus": handle.corpus, "start": handle.start, "end": handle.end,
+            "text": race.text, "players": {str(p.id): p.name for p in players}})
+
+        # Fixed-rate ticks: a late tick does not push back the ones after it
+        deadline = race.started + self.race_seconds
+        next_tick = race.started
+        while race.running() and time.monotonic() < deadline:
+            next_tick += self.interval
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            self.tick(race)
+        self.tick(race)
+
+        standings = sorted((p for p in players if p.place is not None), key=lambda p: p.place)
+        # queued before anyone sees the results, written while they read them
+        saved = self.scores.submit_many(
+            [(p.name, p.wpm, p.mistakes, self.difficulty, handle) for p in standings], [])
+        self.broadcast(players, {"type": "results", "race": race.id, "standings": [
+            {"id": p.id, "name": p.name, "wpm": p.wpm, "mistakes": p.mistakes, "place": p.place}
+            for p in standings]})
+        for player in players:
+            player.race = None
+        await asyncio.wrap_future(saved)
+
+    def tick(self, race):
+        if not race.moved:
+            return
+        players = race.players
+        message = {"type": "tick", "race": race.id,
+                   "t": round(time.monotonic() - race.started, 3),
+                   "pos": {str(p.id): p.pos for p in players if p.id in race.moved}}
+        if race.done:
+            message["done"] = {str(pid): place for pid, place in race.done.items()}
+        race.moved, race.done = set(), {}
+        self.broadcast(players, message)
+
+async def serve(host="127.0.0.1", port=PORT, **options):
+    server = RaceServer(**options)
+    listener = await asyncio.start_server(server.handle, host, port, limit=MAX_LINE)
+    address = listener.sockets[0].getsockname()
+    print(f"race server listening on {address[0]}:{address[1]}", flush=True)
+    async with listener:
+        await server.run()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local typing race server.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='Port (0 picks a free one)')
+    parser.add_argument('--difficulty', choices=['easy', 'hard'], default='easy')
+    parser.add_argument('--tick-rate', type=float, default=10.0,
+                        help='Position broadcasts per second')
+    parser.add_argument('--lobby', type=float, default=5.0,
+                        help='Seconds to wait for more players once enough have joined')
+    parser.add_argument('--min-players', type=int, default=2, help='Players needed to start')
+    parser.add_argument('--race-seconds', type=float, default=300.0,
+                        help='Longest a race may run')
+    parser.add_argument('--db', help='Leaderboard database (default: the app\'s own)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, difficulty=args.difficulty,
+                          tick_rate=args.tick_rate, lobby=args.lobby,
+                          min_players=args.min_players, race_seconds=args.race_seconds,
+                          db=args.db))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+score_log.py
+
+An append-only log of scores that several copies of the app can share:
+a leaderboard on a lab's network drive, with no server. Each copy tails
+the log into its own in-memory leaderboard (see ScoringService's
+log_path), so a refresh reads only what was appended since the last one.
+
+Log layout:
+  header   MAGIC
+  records  sync marker, payload length (uint32), CRC-32 of the payload
+           (uint32), payload: a JSON array [name, wpm, mistakes,
+           difficulty, created_at, corpus, start, end]
+
+Writers append whole batches under an exclusive flock() and fsync before
+returning, so records from different processes never interleave and an
+acknowledged score survives a crash. A writer killed mid-append leaves a
+torn record; readers skip it by its checksum and resume at the next sync
+marker, which cannot occur inside a payload (JSON escapes control
+characters).
+
+Clearing and compacting never truncate the log in place: the new log is
+written beside it and renamed over it while the old one is locked, so a
+reader sees either all of the old log or the new one. Writers waiting on
+the old log's lock notice it was replaced and append to the new one.
+
+Sharing needs fcntl's locks and renaming over a file others have open,
+neither of which Windows has; there (SUPPORTED is False) a ScoreLog
+refuses to open rather than share without them.
+"""
+
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SUPPORTED = fcntl is not None
+
+MAGIC  = b"TESCLOG\0"
+SYNC   = b"SCR\x01"
+RECORD = struct.Struct("<4sII")
+MAX_PAYLOAD = 1 << 16
+
+@contextmanager
+def _locked(fd, exclusive: bool):
+    fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+def _write_all(fd, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _encode(row) -> bytes:
+    name, wpm, mistakes, difficulty, created_at, prompt = row
+    corpus, start, end = prompt or (None, None, None)
+    payload = json.dumps([name, wpm, mistakes, difficulty, created_at, corpus, start, end],
+                         separators=(",", ":")).encode()
+    return RECORD.pack(SYNC, len(payload), zlib.crc32(payload)) + payload
+
+def _decode(payload: bytes):
+    name, wpm, mistakes, difficulty, created_at, corpus, start, end = json.loads(payload)
+    return (name, wpm, mistakes, difficulty, created_at,
+            None if corpus is None else (corpus, start, end))
+
+def parse(buf: bytes, final: bool = False):
+    """
+    The scores in `buf` (log bytes after the header) and how many bytes
+    they used; the rest is an unfinished record to parse again with more.
+    A record that does not check out is skipped up to the next sync marker,
+    and so is an unfinished one once one follows it or if `final`.
+    """
+    rows, pos = [], 0
+    while len(buf) - pos >= RECORD.size:
+        marker, length, crc = RECORD.unpack_from(buf, pos)
+        end = pos + RECORD.size + length
+        if marker == SYNC and length <= MAX_PAYLOAD:
+            if end <= len(buf) and zlib.crc32(buf[pos + RECORD.size:end]) == crc:
+                try:
+                    rows.append(_decode(buf[pos + RECORD.size:end]))
+                except (ValueError, TypeError):
+                    pass
+                pos = end
+                continue
+            if end > len(buf) and not final and buf.find(SYNC, pos + 1) < 0:
+                break   # still being written, or torn with nothing after it yet
+        following = buf.find(SYNC, pos + 1)
+        if following < 0:
+            # keep a tail that may be the start of the next marker
+            pos = len(buf) if final else max(pos + 1, len(buf) - len(SYNC) + 1)
+            break
+        pos = following
+    return rows, len(buf) if final else pos
+
+class ScoreLog:
+    """
+    The score log at `path`, created on first use. Not thread-safe; use
+    one per thread (ScoringService uses it from its writer thread only).
+    """
+
+    def __init__(self, path: str, sync: bool = True):
+        if not SUPPORTED:
+            raise OSError("shared score logs need fcntl file locking, "
+                          "which this platform lacks")
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self.path = path
+        self.sync = sync
+        self.writer = None      # O_APPEND descriptor
+        self.reader = None      # file object positioned after what was read
+        self.pending = b""      # an unfinished record at the end of what was read
+
+    def close(self) -> None:
+        if self.writer is not None:
+            os.close(self.writer)
+            self.writer = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    # ── Writes ───────────────────────────────────────────────────────────
+
+    def append(self, rows) -> None:
+        """
+        Append (name, wpm, mistakes, difficulty, created_at, prompt) rows
+        as one write; prompt is a (corpus id, start, end) handle or None.
+        Returns once they are on disk (unless sync=False).
+        """
+        data = b"".join(map(_encode, rows))
+        if data:
+            self._holding_lock(lambda fd: self._write(fd, data))
+
+    def clear(self) -> None:
+        """Replace the log with an empty one."""
+        self._holding_lock(lambda fd: self._swap(b""))
+
+    def compact(self) -> int:
+        """
+        Rewrite the log without torn records and garbage. Returns the
+        number of scores kept.
+        """
+        def rewrite(fd):
+            with open(self.path, "rb") as f:
+                f.seek(len(MAGIC))
+                rows, _ = parse(f.read(), final=True)
+            self._swap(b"".join(map(_encode, rows)))
+            return len(rows)
+        return self._holding_lock(rewrite)
+
+    def _holding_lock(self, action):
+        # run `action` on the log holding its lock, first making sure that
+        # what is locked is still the file at self.path
+        while True:
+            if self.writer is None:
+                self.writer = self._open(os.O_WRONLY | os.O_APPEND)
+            with _locked(self.writer, exclusive=True):
+                if self._current(self.writer):
+                    return action(self.writer)
+            os.close(self.writer)
+            self.writer = None
+
+    def _write(self, fd, data):
+        _write_all(fd, data)
+        if self.sync:
+            os.fsync(fd)
+
+    def _swap(self, records: bytes):
+        # must hold the current log's lock
+        temp = self._temp(MAGIC + records)
+        os.replace(temp, self.path)
+        self._sync_folder()
+
+    def _temp(self, data: bytes) -> str:
+        temp = f"{self.path}.{os.getpid()}.{os.urandom(4).hex()}.tmp"
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            _write_all(fd, data)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        return temp
+
+    def _sync_folder(self):
+        if self.sync and hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _open(self, flags) -> int:
+        while True:
+            try:
+                return os.open(self.path, flags)
+            except FileNotFoundError:
+                pass
+            # a new log appears whole: link() fails if another process
+            # created one first, and then that one is used
+            temp = self._temp(MAGIC)
+            try:
+                os.link(temp, self.path)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(temp)
+
+    def _current(self, fd) -> bool:
+        try:
+            now = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        mine = os.fstat(fd)
+        return (mine.st_dev, mine.st_ino) == (now.st_dev, now.st_ino)
+
+    # ── Reads ────────────────────────────────────────────────────────────
+
+    def read_new(self):
+        """
+        (rows, reset): the scores appended since the last call, as rows
+        for append(). If reset, the log was new to this reader (the first
+        call, or after a clear or compaction) and rows are all of it;
+        whatever was read before should be dropped.
+        """
+        reset = self.reader is None or not self._current(self.reader.fileno())
+        if reset:
+            if self.reader is not None:
+                self.reader.close()
+            self.reader = open(self._open(os.O_RDONLY), "rb")
+            if self.reader.read(len(MAGIC)) != MAGIC:
+                self.reader.close()
+                self.reader = None
+                raise ValueError(f"{self.path} is not a score log")
+            self.pending = b""
+        with _locked(self.reader.fileno(), exclusive=False):
+            data = self.reader.read()
+        if not data:
+            return [], reset
+        buf = self.pending + data
+        rows, used = parse(buf)
+        self.pending = buf[used:]
+        return rows, reset
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check or compact a shared score log.')
+    parser.add_argument('path', help='The log, e.g. the TYPING_SHARED_LEADERBOARD file')
+    parser.add_argument('--compact', action='store_true',
+                        help='Rewrite it without torn records')
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        sys.exit(f"{args.path} does not exist")
+    log = ScoreLog(args.path)
+    size = os.path.getsize(args.path)
+    if args.compact:
+        kept = log.compact()
+        print(f"{kept} scores kept, {size - os.path.getsize(args.path)} bytes dropped")
+    else:
+        rows, _ = log.read_new()
+        print(f"{len(rows)} scores, {size} bytes"
+              + (f", {len(log.pending)} bytes unfinished" if log.pending else ""))
+    log.close()
@@ -0,0 +1,619 @@
+#!/usr/bin/env python3
+"""
+scoring_service.py
+
+The app's prompts and leaderboard behind one API, independent of the Qt
+frontend. ScoringService runs in-process; serve_http() exposes the same
+service as a small JSON-over-HTTP server, and RemoteScoringService is
+its client, so a lab of kiosks can share one leaderboard:
+
+  python scoring_service.py --host 0.0.0.0 --port 8766      (one machine)
+  TYPING_SCORING_URL=http://server:8766 python frontend.py   (each kiosk)
+
+Every write goes through one thread that owns the database. Submissions
+arriving close together (from many kiosks, or many HTTP requests) are
+coalesced into one transaction, and reads and clears queue behind any
+pending writes, so a reader always sees what was submitted before it.
+
+Given a log_path, the leaderboard is a score_log.py log instead, which
+any number of copies of the app can write to at once (a lab sharing a
+network drive rather than a server). Each keeps the log's scores in an
+in-memory database that reads catch up with, reading only what was
+appended since the last read.
+
+Scores are validated before they are queued: names, difficulties,
+ranges and passages are checked, and invalid ones raise ScoreRejected.
+
+HTTP endpoints (all JSON):
+  POST   /prompts         {"difficulty", "weights", "sentences"}
+                            -> {"corpus", "start", "end", "text"}
+  POST   /scores          {"scores": [{"name", "wpm", "mistakes", "difficulty",
+                            "prompt": [corpus, start, end]}, ...]}
+                            -> {"accepted": n, "rejected": [[index, reason], ...]}
+  GET    /scores          ?difficulty=easy&limit=10 -> {"rows": [...]}
+  GET    /scores/page     ?difficulty&sort&descending&after&limit -> {"rows", "next"}
+  GET    /scores/passage  ?corpus&start&end&limit -> {"rows": [...]}
+  GET    /scores/count    ?difficulty -> {"count": n}
+  GET    /scores/percentile
+                          ?difficulty&wpm -> {"percentile": p or null}
+  GET    /stats/user      ?name&difficulty -> {"stats": [count, mean, best] or null}
+  DELETE /scores          -> {"cleared": true}
+"""
+
+import json
+import time
+import queue
+import bisect
+import argparse
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit, parse_qs
+
+from leaderboard_store import LeaderboardStore, SORTS
+import score_log
+from score_log import ScoreLog
+from prompt_generator import (get_random_handle, get_training_handle, get_marathon_handle,
+                              PromptHandle, CORPUS_ID_RE, TIERS)
+
+PORT = 8766
+MAX_WPM = 300
+MAX_NAME = 40
+MAX_PROMPT = 100_000     # longest passage a score may claim (a marathon chapter)
+DIFFICULTIES = ("easy", "hard", "training", "marathon") + TIERS
+
+class ServedPrompt(PromptHandle):
+    """A PromptHandle from a server, with the text it sent: this machine may not have the book."""
+
+    def __new__(cls, corpus, start, end, text):
+        handle = super().__new__(cls, corpus, start, end)
+        handle._text = text
+        return handle
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+class ScoreRejected(ValueError):
+    """A submitted score failed validation; the message says why."""
+
+def normalize_name(name) -> str:
+    """A player's name as scores are saved under it."""
+    return str(name).strip()[:MAX_NAME] or "Anonymous"
+
+def validate(name, wpm, mistakes, difficulty, prompt=None):
+    """Return the score as a normalized (name, wpm, mistakes, difficulty, prompt) row."""
+    name = normalize_name(name)
+    difficulty = str(difficulty).lower()
+    if difficulty not in DIFFICULTIES:
+        raise ScoreRejected(f"unknown difficulty {difficulty!r}")
+    try:
+        wpm, mistakes = int(wpm), int(mistakes)
+    except (TypeError, ValueError):
+        raise ScoreRejected("wpm and mistakes must be integers") from None
+    if not 0 <= wpm <= MAX_WPM:
+        raise ScoreRejected(f"wpm {wpm} outside 0-{MAX_WPM}")
+    if mistakes < 0:
+        raise ScoreRejected("negative mistakes")
+    if prompt is not None:
+        try:
+            prompt = PromptHandle(str(prompt[0]), int(prompt[1]), int(prompt[2]))
+        except (TypeError, ValueError, IndexError):
+            raise ScoreRejected("prompt must be [corpus, start, end]") from None
+        if (not CORPUS_ID_RE.fullmatch(prompt.corpus)
+                or not 0 <= prompt.start < prompt.end <= prompt.start + MAX_PROMPT):
+            raise ScoreRejected("invalid prompt")
+        if mistakes > prompt.end - prompt.start:
+            raise ScoreRejected("more mistakes than characters")
+    return name, wpm, mistakes, difficulty, prompt
+
+_WRITE, _STOP = object(), object()
+
+class ScoringService:
+    """
+    Prompts, score validation and the leaderboard at `db_path`, or kept in
+    the shared score log at `log_path` (db_path is then a cache of it,
+    usually ":memory:", and legacy_path is not imported). Calls are
+    thread-safe; submit() returns at once with a Future that completes
+    when the score's batch is committed.
+    """
+
+    def __init__(self, db_path: str, legacy_path: str = None, coalesce: float = 0.0,
+                 batch: int = 1000, log_path: str = None):
+        if log_path and not score_log.SUPPORTED:
+            # refused here rather than on the worker thread, at the first call
+            raise OSError("a shared score log needs fcntl file locking, "
+                          "which this platform lacks")
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.log_path = log_path
+        # how long a write waits for others to join it; even at 0, writes
+        # that queued while the last transaction ran are written together
+        self.coalesce = coalesce
+        self.batch = batch
+        self.store = None           # opened on the worker thread
+        self.log = None             # likewise, with log_path
+        self.changes = 0            # bumped whenever the scores change
+        self.queue = queue.Queue()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+
+    # ── Prompts ──────────────────────────────────────────────────────────
+
+    def issue_prompt(self, difficulty: str, weights: dict = None,
+                     sentences: int = 0) -> PromptHandle:
+        """
+        A new prompt; 'training' drills `weights` (see get_training_handle),
+        'marathon' is a chapter or `sentences` sentences (get_marathon_handle).
+        """
+        if difficulty == "training":
+            return get_training_handle(weights or {})
+        if difficulty == "marathon":
+            return get_marathon_handle(max(0, int(sentences or 0)))
+        return get_random_handle(difficulty)
+
+    # ── Writes ───────────────────────────────────────────────────────────
+
+    def submit(self, name, wpm, mistakes, difficulty, prompt=None) -> Future:
+        """Validate and queue a score; raises ScoreRejected if it is invalid."""
+        return self.submit_many([(name, wpm, mistakes, difficulty, prompt)])
+
+    def submit_many(self, scores, rejected: list = None) -> Future:
+        """
+        Validate and queue (name, wpm, mistakes, difficulty, prompt) scores
+        together. An invalid score raises ScoreRejected, or if `rejected` is
+        a list, (its index, the reason) is appended there and the rest are
+        still queued. The Future's result is the number queued.
+        """
+        rows = []
+        for i, score in enumerate(scores):
+            try:
+                name, wpm, mistakes, difficulty, prompt = validate(*score)
+            except ScoreRejected as e:
+                if rejected is None:
+                    raise
+                rejected.append((i, str(e)))
+                continue
+            rows.append((name, wpm, mistakes, difficulty, None, prompt))
+        future = Future()
+        if rows:
+            self._put(_WRITE, rows, future)
+        else:
+            future.set_result(0)
+        return future
+
+    def clear(self) -> None:
+        def clear(store):
+            if self.log is not None:
+                self.log.clear()
+            store.clear()
+            self.changes += 1
+        self._call(clear)
+
+    # ── Reads ────────────────────────────────────────────────────────────
+
+    def top(self, difficulty: str, limit: int = 10):
+        return self._call(lambda store: store.top(difficulty, limit))
+
+    def passage_top(self, prompt, limit: int = 10):
+        return self._call(lambda store: store.passage_top(prompt, limit))
+
+    def page(self, difficulty: str, sort: str = "wpm", descending: bool = None,
+             after=None, limit: int = 100):
+        """A keyset page as in LeaderboardStore.page; descending=None keeps the natural order."""
+        if sort not in SORTS:
+            raise ValueError(f"unknown sort {sort!r}")
+        reverse = descending is not None and descending != SORTS[sort][0]
+        return self._call(lambda store: store.page(difficulty, sort, reverse, after, limit))
+
+    def count(self, difficulty: str = None) -> int:
+        return self._call(lambda store: store.count(difficulty))
+
+    def user_stats(self, name: str, difficulty: str):
+        """(count, mean WPM, best WPM) of a player at a difficulty, or None."""
+        name = normalize_name(name)     # as validate() saved it
+        return self._call(lambda store: store.user_stats(name, difficulty))
+
+    def percentile(self, difficulty: str, wpm: int):
+        """Percentage of a difficulty's results slower than `wpm`, or None if it has none."""
+        return self._call(lambda store: store.percentile(difficulty, wpm))
+
+    def version(self) -> int:
+        """
+        A number that changes whenever the leaderboard does, including when
+        other copies of the app add to a shared log; cheap to poll.
+        """
+        return self._call(lambda store: self.changes)
+
+    def flush(self) -> None:
+        """Wait until everything submitted so far is committed."""
+        self._call(lambda store: None)
+
+    def unsent(self) -> int:
+        """Scores submitted but not yet committed."""
+        return sum(len(payload) for kind, payload, _ in list(self.queue.queue)
+                   if kind is _WRITE)
+
+    def close(self) -> None:
+        if self.thread is not None:
+            future = Future()
+            self._put(_STOP, (), future)
+            future.result()
+
+    # ── Worker ───────────────────────────────────────────────────────────
+
+    def _call(self, fn):
+        future = Future()
+        self._put(fn, (), future)
+        return future.result()
+
+    def _put(self, kind, payload, future):
+        with self.thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="scoring-writer",
+                                               daemon=True)
+                self.thread.start()
+        self.queue.put((kind, payload, future))
+
+    def _open(self) -> LeaderboardStore:
+        if self.store is None:
+            store = LeaderboardStore(self.db_path)
+            if self.log_path:
+                self.log = ScoreLog(self.log_path)
+            elif self.legacy_path:
+                store.import_legacy(self.legacy_path)
+            self.store = store
+        return self.store
+
+    def _catch_up(self):
+        # add what was appended to the log since the last call, from this
+        # process or any other; a cleared or compacted log is read afresh
+        if self.log is None:
+            return
+        rows, reset = self.log.read_new()
+        if reset:
+            self.store.clear()
+        if rows:
+            self.store.add_many(rows)
+        if reset or rows:
+            self.changes += 1
+
+    def _run(self):
+        held = None     # a non-write taken off the queue while batching writes
+        while True:
+            kind, payload, future = held or self.queue.get()
+            held = None
+            if kind is _STOP:
+                if self.store is not None:
+                    self.store.close()
+                    self.store = None
+                if self.log is not None:
+                    self.log.close()
+                    self.log = None
+                future.set_result(None)
+                return
+            if kind is not _WRITE:
+                try:
+                    store = self._open()
+                    self._catch_up()
+                    future.set_result(kind(store))
+                except Exception as e:
+                    future.set_exception(e)
+                continue
+            rows, futures = list(payload), [(future, len(payload))]
+            deadline = time.monotonic() + self.coalesce
+            while len(rows) < self.batch:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item[0] is not _WRITE:
+                    held = item
+                    break
+                rows.extend(item[1])
+                futures.append((item[2], len(item[1])))
+            self._commit(rows, futures)
+
+    def _commit(self, rows, futures):
+        """Write `rows` in one transaction, then complete each (future, count)."""
+        try:
+            store = self._open()
+            if self.log is None:
+                store.add_many(rows)
+                self.changes += 1
+            else:
+                # every copy must agree on when a score was made
+                now = time.time()
+                self.log.append([(name, wpm, mistakes, difficulty, now, prompt)
+                                 for name, wpm, mistakes, difficulty, _, prompt in rows])
+                self._catch_up()
+        except Exception as e:
+            for future, _ in futures:
+                future.set_exception(e)
+        else:
+            for future, count in futures:
+                future.set_result(count)
+
+# ─── HTTP Client ─────────────────────────────────────────────────────────────
+
+class RemoteScoringService:
+    """
+    ScoringService's API on a serve_http() server at `url`. Scores are
+    validated here too, then sent in batches every `interval` seconds by a
+    background thread (and before any read), so a kiosk's submit never
+    waits on the network. Batches that fail to send are retried.
+    """
+
+    def __init__(self, url: str, interval: float = 0.2, timeout: float = 5.0):
+        self.url = url.rstrip("/")
+        self.interval = interval
+        self.timeout = timeout
+        self.pending = []           # validated rows not yet sent
+        self.futures = []           # completed once pending is sent
+        self.sending = 0            # rows in the request under way
+        self.cond = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.thread = None
+
+    def _request(self, method, path, body=None, **query):
+        from urllib.request import Request, urlopen
+        from urllib.parse import urlencode
+        query = {k: v for k, v in query.items() if v is not None}
+        url = self.url + path + ("?" + urlencode(query) if query else "")
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(url, data=data, method=method,
+                          headers={"Content-Type": "application/json"})
+        with urlopen(request, timeout=self.timeout) as response:
+            return json.load(response)
+
+    def issue_prompt(self, difficulty: str, weights: dict = None,
+                     sentences: int = 0) -> PromptHandle:
+        reply = self._request("POST", "/prompts", {"difficulty": difficulty, "weights": weights,
+                                                   "sentences": sentences})
+        return ServedPrompt(reply["corpus"], reply["start"], reply["end"], reply["text"])
+
+    def submit(self, name, wpm, mistakes, difficulty, prompt=None) -> Future:
+        return self.submit_many([(name, wpm, mistakes, difficulty, prompt)])
+
+    def submit_many(self, scores, rejected: list = None) -> Future:
+        """
+        As ScoringService.submit_many, except that the Future completes once
+        the scores are sent, with the number the server accepted.
+        """
+        rows = []
+        for i, score in enumerate(scores):
+            try:
+                rows.append(validate(*score))
+            except ScoreRejected as e:
+                if rejected is None:
+                    raise
+                rejected.append((i, str(e)))
+        future = Future()
+        if not rows:
+            future.set_result(0)
+            return future
+        with self.cond:
+            self.pending.append(rows)
+            self.futures.append(future)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="scoring-sender",
+                                               daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return future
+
+    def flush(self) -> None:
+        """Send everything submitted so far; raises OSError if the server is unreachable."""
+        with self.send_lock:
+            with self.cond:
+                batches, self.pending = self.pending, []
+                futures, self.futures = self.futures, []
+            if not batches:
+                return
+            self.sending = sum(map(len, batches))
+            body = {"scores": [{"name": name, "wpm": wpm, "mistakes": mistakes,
+                                "difficulty": difficulty, "prompt": prompt}
+                               for rows in batches
+                               for name, wpm, mistakes, difficulty, prompt in rows]}
+            try:
+                reply = self._request("POST", "/scores", body)
+            except OSError:
+                with self.cond:
+                    # keep them, in order, for the next try
+                    self.pending[:0] = batches
+                    self.futures[:0] = futures
+                raise
+            finally:
+                self.sending = 0
+            rejected = sorted(i for i, _ in reply["rejected"])
+            first = 0
+            for rows, future in zip(batches, futures):
+                last = first + len(rows)
+                lost = bisect.bisect_left(rejected, last) - bisect.bisect_left(rejected, first)
+                future.set_result(len(rows) - lost)
+                first = last
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+            time.sleep(self.interval)   # let more scores join this batch
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        self.flush()
+        self._request("DELETE", "/scores")
+
+    def top(self, difficulty: str, limit: int = 10):
+        self.flush()
+        return [tuple(row) for row in
+                self._request("GET", "/scores", difficulty=difficulty, limit=limit)["rows"]]
+
+    def passage_top(self, prompt, limit: int = 10):
+        self.flush()
+        corpus, start, end = prompt
+        return [tuple(row) for row in self._request(
+            "GET", "/scores/passage", corpus=corpus, start=start, end=end, limit=limit)["rows"]]
+
+    def page(self, difficulty: str, sort: str = "wpm", descending: bool = None,
+             after=None, limit: int = 100):
+        self.flush()
+        reply = self._request(
+            "GET", "/scores/page", difficulty=difficulty, sort=sort, limit=limit,
+            descending=None if descending is None else int(descending),
+            after=None if after is None else json.dumps(list(after)))
+        rows = [tuple(row) for row in reply["rows"]]
+        return rows, None if reply["next"] is None else tuple(reply["next"])
+
+    def count(self, difficulty: str = None) -> int:
+        self.flush()
+        return self._request("GET", "/scores/count", difficulty=difficulty)["count"]
+
+    def user_stats(self, name: str, difficulty: str):
+        self.flush()
+        stats = self._request("GET", "/stats/user", name=name, difficulty=difficulty)["stats"]
+        return None if stats is None else tuple(stats)
+
+    def percentile(self, difficulty: str, wpm: int):
+        self.flush()
+        return self._request("GET", "/scores/percentile", difficulty=difficulty,
+                             wpm=wpm)["percentile"]
+
+    def unsent(self) -> int:
+        """Scores submitted but not yet accepted by the server, sending or not."""
+        with self.cond:
+            return sum(map(len, self.pending)) + self.sending
+
+    def version(self):
+        # not tracked over HTTP; the leaderboard screen then reloads on demand only
+        return None
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+# ─── HTTP Server ─────────────────────────────────────────────────────────────
+
+def serve_http(service: ScoringService, host: str = "127.0.0.1", port: int = PORT):
+    """Serve `service` over HTTP until interrupted; one thread per request."""
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; with Nagle on, the
+        # body waits for the client's delayed ACK of the headers
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass    # one line per request would swamp a busy lab
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def handle_one(self, method):
+            url = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                status, body = route(method, url.path, query, self.body)
+            except (ValueError, KeyError, TypeError) as e:
+                status, body = 400, {"error": str(e)}
+            except Exception as e:
+                status, body = 500, {"error": str(e)}
+            self.reply(status, body)
+
+        def do_GET(self):
+            self.handle_one("GET")
+
+        def do_POST(self):
+            self.handle_one("POST")
+
+        def do_DELETE(self):
+            self.handle_one("DELETE")
+
+    def route(method, path, query, body):
+        limit = int(query.get("limit", 10))
+        if method == "POST" and path == "/prompts":
+            request = body()
+            handle = service.issue_prompt(request.get("difficulty", "easy"),
+                                          request.get("weights"), request.get("sentences"))
+            return 200, {"corpus": handle.corpus, "start": handle.start, "end": handle.end,
+                         "text": handle.text}
+        if method == "POST" and path == "/scores":
+            scores = [(score.get("name", ""), score.get("wpm"), score.get("mistakes"),
+                       score.get("difficulty"), score.get("prompt"))
+                      for score in body().get("scores", [])]
+            rejected = []
+            # reply once the batch is committed
+            accepted = service.submit_many(scores, rejected).result()
+            return 200, {"accepted": accepted, "rejected": rejected}
+        if method == "DELETE" and path == "/scores":
+            service.clear()
+            return 200, {"cleared": True}
+        if method == "GET" and path == "/scores":
+            return 200, {"rows": service.top(query["difficulty"], limit)}
+        if method == "GET" and path == "/scores/passage":
+            prompt = (query["corpus"], int(query["start"]), int(query["end"]))
+            return 200, {"rows": service.passage_top(prompt, limit)}
+        if method == "GET" and path == "/scores/page":
+            descending = query.get("descending")
+            after = query.get("after")
+            rows, key = service.page(query["difficulty"], query.get("sort", "wpm"),
+                                     None if descending is None else bool(int(descending)),
+                                     None if after is None else tuple(json.loads(after)),
+                                     limit)
+            return 200, {"rows": rows, "next": key}
+        if method == "GET" and path == "/scores/count":
+            return 200, {"count": service.count(query.get("difficulty"))}
+        if method == "GET" and path == "/scores/percentile":
+            return 200, {"percentile": service.percentile(query["difficulty"], int(query["wpm"]))}
+        if method == "GET" and path == "/stats/user":
+            return 200, {"stats": service.user_stats(query["name"], query["difficulty"])}
+        return 404, {"error": f"no route for {method} {path}"}
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128    # a whole lab may connect at once; the default is 5
+
+    server = Server((host, port), Handler)
+    address = server.server_address
+    print(f"scoring service listening on http://{address[0]}:{address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the leaderboard and prompts over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='Port (0 picks a free one)')
+    parser.add_argument('--db', help="Leaderboard database (default: the app's own)")
+    parser.add_argument('--coalesce', type=float, default=0.0,
+                        help='Seconds a write waits for others to share its transaction')
+    parser.add_argument('--batch', type=int, default=1000,
+                        help='Most scores written in one transaction')
+    args = parser.parse_args()
+    if args.db:
+        service = ScoringService(args.db, coalesce=args.coalesce, batch=args.batch)
+    else:
+        from backend import LEADERBOARD_DB, LEGACY_LEADERBOARD
+        service = ScoringService(LEADERBOARD_DB, LEGACY_LEADERBOARD, coalesce=args.coalesce,
+                                 batch=args.batch)
+    try:
+        serve_http(service, args.host, args.port)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+span_features.py
+
+Offline difficulty scoring of prompt spans, run once when a book is
+ingested. Each span gets five features:
+
+  punctuation   punctuation marks per character
+  digits        digits per character
+  capitals      capital letters per character
+  word_length   mean length of its words, punctuation aside
+  rarity        mean rarity of its words, log2(words in book / occurrences)
+
+Nothing is computed per span in Python. The text is read a chunk at a
+time and, for every position a span starts or ends at, the running
+totals of each feature up to it are kept (cumulative sums over the
+chunk's characters and over the words split out of it); a span's totals
+are then one subtraction of two rows, for all spans at once. A span's score is the
+mean of its standardized features, and tiers are ranges of the score.
+
+Requires NumPy.
+"""
+
+import re
+from collections import Counter
+
+import numpy as np
+
+FEATURES = ('punctuation', 'digits', 'capitals', 'word_length', 'rarity')
+# Median and spread of each feature over Moby-Dick's spans: a feature
+# counts (value - CENTER) / SPREAD towards the score, so a typical span
+# scores about 0 and every feature weighs the same. Changing these moves
+# every score; pick new prompt_generator.TIER_CUTS with them.
+CENTER = np.array([0.047, 0.0, 0.024, 4.38, 10.27])
+SPREAD = np.array([0.028, 0.011, 0.042, 0.45, 0.81])
+
+CHUNK_CHARS = 1 << 20
+PUNCTUATION = np.array([ord(c) for c in ",;:.!?'\"()[]-—–‘’“”…_*"], dtype=np.uint32)
+# A word is what lies between spaces (the text's only whitespace) once
+# this is removed and the rest lowercased: "Whale’s," counts as "whales"
+NOT_WORD_RE = re.compile(r"[^\w ]+")
+
+def _pieces(slice_text, length):
+    """(offset, text) pieces of the text, each ending before a space so no word is split."""
+    lo = 0
+    while lo < length:
+        piece = slice_text(lo, lo + CHUNK_CHARS)
+        if lo + len(piece) < length:
+            cut = piece.rfind(" ")
+            if cut > 0:
+                piece = piece[:cut]
+        yield lo, piece
+        lo += len(piece)
+
+def _words(piece: str) -> list:
+    return NOT_WORD_RE.sub("", piece.lower()).split(" ")
+
+def word_counts(slice_text, length) -> Counter:
+    counts = Counter()
+    for _, piece in _pieces(slice_text, length):
+        counts.update(filter(None, _words(piece)))
+    return counts
+
+def running_totals(slice_text, length, positions):
+    """
+    For each of the sorted `positions`, the totals over text[:position] of
+    punctuation, digits, capitals, words, word letters and word rarity,
+    as a (len(positions), 6) array.
+    """
+    counts = word_counts(slice_text, length)
+    total_words = sum(counts.values()) or 1
+    rarity = {word: np.log2(total_words / n) for word, n in counts.items()}
+    rarity[""] = 0.0        # all punctuation, e.g. a dash between spaces
+
+    totals = np.zeros((len(positions), 6))
+    carry = np.zeros(6)
+    for lo, piece in _pieces(slice_text, length):
+        first, last = np.searchsorted(positions, [lo, lo + len(piece)])
+        local = positions[first:last] - lo
+
+        codes = np.frombuffer(piece.encode('utf-32-le'), dtype=np.uint32)
+        for column, mask in enumerate((np.isin(codes, PUNCTUATION),
+                                       (codes >= 48) & (codes <= 57),
+                                       (codes >= 65) & (codes <= 90))):
+            before = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+            totals[first:last, column] = before[local] + carry[column]
+            carry[column] += before[-1]
+
+        # the tokens between spaces start one past the end of the last, and
+        # a position counts those starting before it; pieces end before a
+        # space and spans at one, so those tokens are wholly before it too
+        tokens = piece.split(" ")
+        starts = np.concatenate(([0], np.cumsum(np.fromiter(map(len, tokens), np.int64,
+                                                            len(tokens)) + 1)[:-1]))
+        words = _words(piece)
+        letters = np.fromiter(map(len, words), np.int64, len(words))
+        for column, values in ((3, letters > 0), (4, letters),
+                               (5, np.fromiter(map(rarity.__getitem__, words), np.float64,
+                                               len(words)))):
+            before = np.concatenate(([0], np.cumsum(values)))
+            totals[first:last, column] = before[np.searchsorted(starts, local)] + carry[column]
+            carry[column] += before[-1]
+    totals[np.searchsorted(positions, length):] = carry
+    return totals
+
+def span_features(slice_text, length, starts, ends):
+    """A (spans, len(FEATURES)) array of the features of spans [starts[i], ends[i])."""
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    positions = np.unique(np.concatenate([starts, ends]))
+    totals = running_totals(slice_text, length, positions)
+    diff = totals[np.searchsorted(positions, ends)] - totals[np.searchsorted(positions, starts)]
+    chars = np.maximum(ends - starts, 1)[:, None]
+    words = np.maximum(diff[:, 3], 1)[:, None]
+    return np.hstack([diff[:, :3] / chars, diff[:, 4:] / words])
+
+def difficulty_scores(features):
+    return ((features - CENTER) / SPREAD).mean(axis=1)
+
+def tier_buckets(slice_text, length, starts, ends, names, cuts) -> dict:
+    """
+    Split the spans into tiers `names`, easiest first, by score: tier i
+    holds scores in [cuts[i - 1], cuts[i]). Returns name -> (starts, ends),
+    each kept in the order given.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if not len(starts):
+        return {name: (starts, ends) for name in names}
+    scores = difficulty_scores(span_features(slice_text, length, starts, ends))
+    tiers = np.searchsorted(cuts, scores, side='right')
+    return {name: (starts[tiers == i], ends[tiers == i]) for i, name in enumerate(names)}
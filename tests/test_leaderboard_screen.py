@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+test_leaderboard_screen.py
+
+The leaderboard screen with TYPING_METRICS on, where its timed slots are
+wrappers that forward whatever arguments a signal sends. Runs in a child
+interpreter so that metrics are read from the environment at import.
+
+  python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import os, sys, tempfile
+sys.path.insert(0, sys.argv[1])
+import backend
+folder = tempfile.mkdtemp()
+backend.LEADERBOARD_DB = os.path.join(folder, "leaderboard.db")
+backend.LEGACY_LEADERBOARD = os.path.join(folder, "leaderboard.txt")
+backend.SESSIONS_DIR = os.path.join(folder, "sessions")
+from PyQt5.QtWidgets import QApplication, QStackedWidget
+app = QApplication([])
+import frontend
+backend.service().submit("hard player", 80, 0, "hard").result()
+screen = frontend.LeaderboardScreen(QStackedWidget())
+screen.load_scores()
+screen.difficulty_box.setCurrentIndex(screen.difficulty_box.findData("hard"))
+assert screen.model.difficulty == "hard", screen.model.difficulty
+assert [row[1] for row in screen.model.rows] == ["hard player"], screen.model.rows
+print("ok")
+"""
+
+class LeaderboardScreenTest(unittest.TestCase):
+
+    def test_difficulty_change_with_metrics(self):
+        try:
+            import PyQt5  # noqa: F401
+        except ImportError:
+            self.skipTest("PyQt5 is not installed")
+        env = dict(os.environ, TYPING_METRICS="1")
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+        out = subprocess.run([sys.executable, "-c", CHILD, ROOT], cwd=ROOT, env=env,
+                             capture_output=True, text=True, timeout=120)
+        self.assertEqual(out.returncode, 0, out.stderr)
+        self.assertEqual(out.stdout.splitlines()[-1], "ok")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+typing_engine.py
+
+Incremental checking of typed text against a prompt. Instead of re-scanning
+everything typed on every keystroke, the evaluator is told where the text
+changed (the position/removed/added triple QTextDocument.contentsChange
+reports) and only re-checks what that edit could have affected:
+
+  • appending or overwriting in place: just the new characters
+  • inserting or deleting in the middle: the shifted tail after the edit
+
+so normal typing and backspacing are O(1) per keystroke.
+
+LineWrapper splits a long prompt into lines so that only a window of it
+needs to be shown, and typed, at a time.
+"""
+
+from array import array
+
+class KeystrokeEvaluator:
+    """
+    Tracks which typed characters are wrong. `error_indices` keeps every
+    position that has ever been wrong (mistakes are not forgiven by fixing
+    them), `wrong` holds the current state of each position.
+    """
+
+    def __init__(self, prompt: str = ""):
+        self.reset(prompt)
+
+    def reset(self, prompt: str) -> None:
+        self.prompt = prompt
+        self.length = 0
+        self.wrong = bytearray(len(prompt))
+        self.error_indices = set()
+        self._clear_dirty()
+
+    def _clear_dirty(self):
+        self.dirty_lo = None
+        self.dirty_hi = 0
+        self.shifted = False
+
+    def mark(self, position: int, removed: int, added: int) -> None:
+        """Record an edit; several edits may be marked before apply()."""
+        if self.dirty_lo is None or position < self.dirty_lo:
+            self.dirty_lo = position
+        self.dirty_hi = max(self.dirty_hi, position + added)
+        if removed != added:
+            self.shifted = True
+
+    def apply(self, new_length: int, char_at):
+        """
+        Re-check the positions touched by the marked edits, given the text is
+        now `new_length` characters long and `char_at(i)` returns character i.
+        Returns the range (lo, hi) of positions that were re-checked.
+        """
+        prompt, wrong = self.prompt, self.wrong
+        lo = self.dirty_lo if self.dirty_lo is not None else self.length
+        lo = min(lo, new_length)
+        if self.shifted or new_length != self.length:
+            # Everything after the edit moved; Qt may also over-report `added`
+            # by the trailing paragraph separator, so trust the lengths.
+            hi = new_length
+        else:
+            hi = min(self.dirty_hi, new_length)
+        hi = min(hi, len(prompt))
+
+        for i in range(lo, hi):
+            if char_at(i) != prompt[i]:
+                wrong[i] = 1
+                self.error_indices.add(i)
+            else:
+                wrong[i] = 0
+        if new_length < self.length:
+            end = min(self.length, len(prompt))
+            if new_length < end:
+                wrong[new_length:end] = bytes(end - new_length)
+
+        self.length = new_length
+        self._clear_dirty()
+        return lo, max(lo, hi)
+
+    @property
+    def mistakes(self) -> int:
+        return len(self.error_indices)
+
+    @property
+    def complete(self) -> bool:
+        return self.length == len(self.prompt)
+
+UNKNOWN = 2
+
+class HighlightTracker:
+    """
+    Mirrors the color each character of the textbox is currently painted
+    (0 correct, 1 wrong, UNKNOWN) so a repaint only touches characters whose color
+    actually has to change, grouped into runs.
+
+    Plain text typed or pasted into a QTextEdit takes the format of the
+    character before it, so inserted characters are assumed to inherit
+    that color; a correct key typed after a correct character then needs
+    no repaint (and no second relayout of the paragraph) at all.
+    """
+
+    def __init__(self):
+        self.painted = bytearray()
+
+    def reset(self) -> None:
+        self.painted = bytearray()
+
+    def edit(self, position: int, removed: int, added: int) -> None:
+        """Shift the mirror the same way the document just changed."""
+        painted = self.painted
+        if removed:
+            # Replacing a selection takes the format of one of the removed
+            # characters, depending on which way it was selected
+            inherited = UNKNOWN
+        elif 0 < position <= len(painted):
+            inherited = painted[position - 1]
+        elif position == 0 and painted:
+            inherited = painted[0]
+        else:
+            # An emptied document keeps whatever format it last had
+            inherited = UNKNOWN
+        painted[position:position + removed] = bytes([inherited]) * added
+
+    def resize(self, length: int) -> None:
+        # Qt counts the trailing paragraph separator in some edits
+        if len(self.painted) > length:
+            del self.painted[length:]
+        elif len(self.painted) < length:
+            self.painted.extend(bytes([UNKNOWN]) * (length - len(self.painted)))
+
+    def runs(self, lo: int, hi: int, error_indices, offset: int = 0):
+        """
+        Yield (start, end, wrong) runs in [lo, hi) whose painted color
+        differs from the wanted one, and record them as painted. Position i
+        of the textbox is prompt position i + offset in `error_indices`.
+        """
+        painted = self.painted
+        run_start, run_color = None, None
+        for i in range(lo, hi):
+            color = 1 if i + offset in error_indices else 0
+            if painted[i] == color:
+                if run_start is not None:
+                    yield run_start, i, run_color
+                    run_start = None
+                continue
+            painted[i] = color
+            if run_start is not None and color != run_color:
+                yield run_start, i, run_color
+                run_start = None
+            if run_start is None:
+                run_start, run_color = i, color
+        if run_start is not None:
+            yield run_start, hi, run_color
+
+
+class LineWrapper:
+    """
+    Greedy word wrap of `text` into lines of about `width` characters,
+    computed only as far as it has been asked for, so a chapter costs
+    nothing to wrap beyond the lines on screen. A line keeps the space
+    that ends it: typing line i means typing text[start:end] exactly.
+    """
+
+    def __init__(self, text: str, width: int):
+        self.text = text
+        self.width = max(1, width)
+        self.ends = array('l')      # end of each line wrapped so far
+
+    def _wrap_next(self) -> bool:
+        text, start = self.text, (self.ends[-1] if self.ends else 0)
+        if start >= len(text):
+            return False
+        limit = start + self.width
+        if limit >= len(text):
+            end = len(text)
+        else:
+            # break after the last space that fits, or mid-word if none does
+            space = text.rfind(' ', start + 1, limit + 1)
+            end = space + 1 if space >= 0 else limit
+        self.ends.append(end)
+        return True
+
+    def rewrap(self, first: int, width: int) -> None:
+        """Wrap line `first` on at `width`, e.g. after a resize; earlier lines stay."""
+        del self.ends[first:]
+        self.width = max(1, width)
+
+    def line(self, i: int):
+        """(start, end) of line i, or None past the last line."""
+        while len(self.ends) <= i:
+            if not self._wrap_next():
+                return None
+        return (self.ends[i - 1] if i else 0), self.ends[i]
+